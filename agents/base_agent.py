@@ -5,16 +5,27 @@
 
 import logging
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Mapping, Optional, Tuple, Union
 from datetime import datetime
 import asyncio
+import contextvars
+from collections import ChainMap
+from types import MappingProxyType
+
+from .utils import iso_now
 
 logger = logging.getLogger(__name__)
 
+# 标记当前协程是否已持有管理器的并发槽位（嵌套调用不重复占用，避免死锁）
+_holding_slot: contextvars.ContextVar[bool] = contextvars.ContextVar('agent_holding_slot', default=False)
+
 
 class BaseAgent(ABC):
     """智能体基类"""
     
+    # 子类可声明__slots__省去实例字典；未声明的子类仍有__dict__，不受影响
+    __slots__ = ('name', 'config', 'created_at', 'is_active', 'logger', '_version')
+    
     def __init__(self, name: str, config: Dict[str, Any] = None):
         self.name = name
         self.config = config or {}
@@ -22,6 +33,9 @@ class BaseAgent(ABC):
         self.is_active = True
         self.logger = logging.getLogger(f"agent.{name}")
         
+        # 状态版本号，激活/停用/更新配置时递增，用于失效状态缓存
+        self._version = 0
+        
     @abstractmethod
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -60,16 +74,19 @@ class BaseAgent(ABC):
     def activate(self):
         """激活智能体"""
         self.is_active = True
+        self._version += 1
         self.logger.info(f"Agent {self.name} activated")
     
     def deactivate(self):
         """停用智能体"""
         self.is_active = False
+        self._version += 1
         self.logger.info(f"Agent {self.name} deactivated")
     
     def update_config(self, new_config: Dict[str, Any]):
         """更新配置"""
         self.config.update(new_config)
+        self._version += 1
         self.logger.info(f"Agent {self.name} config updated")
     
     async def safe_process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -103,7 +120,7 @@ class BaseAgent(ABC):
                 'error': None,
                 'data': result,
                 'agent': self.name,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': iso_now()
             }
             
         except Exception as e:
@@ -113,38 +130,54 @@ class BaseAgent(ABC):
                 'error': str(e),
                 'data': None,
                 'agent': self.name,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': iso_now()
             }
 
 
 class AgentManager:
     """智能体管理器"""
     
-    def __init__(self):
+    def __init__(self, config: Dict[str, Any] = None):
         self.agents: Dict[str, BaseAgent] = {}
+        self.config = config or {}
         self.logger = logging.getLogger("agent.manager")
+        
+        # 注册表版本号，注册/注销时递增，供调用方判断缓存是否失效
+        self.version = 0
+        self._agent_names: Tuple[str, ...] = ()
+        self._status_cache: Optional[Dict[str, Any]] = None
+        self._status_key: Optional[Tuple[int, int]] = None
+        
+        # 并发控制：限制同时执行的顶层智能体调用数量
+        self.max_concurrency = self.config.get('max_concurrency', 8)
+        self.micro_batch_size = self.config.get('micro_batch_size', self.max_concurrency)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
     
     def register_agent(self, agent: BaseAgent):
         """注册智能体"""
         self.agents[agent.name] = agent
+        self.version += 1
+        self._agent_names = tuple(self.agents)
         self.logger.info(f"Registered agent: {agent.name}")
     
     def unregister_agent(self, agent_name: str):
         """注销智能体"""
         if agent_name in self.agents:
             del self.agents[agent_name]
+            self.version += 1
+            self._agent_names = tuple(self.agents)
             self.logger.info(f"Unregistered agent: {agent_name}")
     
     def get_agent(self, agent_name: str) -> Optional[BaseAgent]:
         """获取智能体"""
         return self.agents.get(agent_name)
     
-    def list_agents(self) -> List[str]:
-        """列出所有智能体"""
-        return list(self.agents.keys())
+    def list_agents(self) -> Tuple[str, ...]:
+        """列出所有智能体（返回共享的只读元组）"""
+        return self._agent_names
     
-    async def process_with_agent(self, agent_name: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """使用指定智能体处理数据"""
+    async def process_with_agent(self, agent_name: str, input_data: Mapping[str, Any]) -> Dict[str, Any]:
+        """使用指定智能体处理数据（智能体只读取input_data，不应修改）"""
         agent = self.get_agent(agent_name)
         if not agent:
             return {
@@ -153,51 +186,128 @@ class AgentManager:
                 'data': None
             }
         
-        return await agent.safe_process(input_data)
+        # 智能体内部的嵌套调用沿用外层槽位
+        if _holding_slot.get():
+            return await agent.safe_process(input_data)
+        
+        async with self._sem:
+            token = _holding_slot.set(True)
+            try:
+                return await agent.safe_process(input_data)
+            finally:
+                _holding_slot.reset(token)
     
-    async def process_pipeline(self, agent_names: List[str], input_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def process_pipeline(self, agent_names: List[Union[str, List[str]]],
+                               input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         使用多个智能体按顺序处理数据
         
+        列表中的嵌套列表表示一个并行阶段：阶段内的智能体互不依赖，
+        会基于同一份输入并发执行，全部成功后按顺序合并结果。
+        各阶段收到的输入是只读视图，其底层数据与上游阶段的结果共享。
+        
         Args:
-            agent_names: 智能体名称列表
+            agent_names: 智能体名称列表，例如 ['tag_agent', ['sentiment_agent', 'memory_agent']]
             input_data: 输入数据
             
         Returns:
             最终处理结果
         """
-        current_data = input_data
+        # 各阶段结果逐层叠加在输入之上，避免每阶段复制合并字典
+        layered = ChainMap({}, input_data)
         results = []
         
-        for agent_name in agent_names:
-            result = await self.process_with_agent(agent_name, current_data)
-            results.append(result)
+        for stage in agent_names:
+            stage_input = MappingProxyType(layered)
+            if isinstance(stage, (list, tuple)):
+                stage_names = list(stage)
+                stage_results = await asyncio.gather(
+                    *[self.process_with_agent(name, stage_input) for name in stage_names],
+                    return_exceptions=True
+                )
+            else:
+                stage_names = [stage]
+                stage_results = [await self.process_with_agent(stage, stage_input)]
             
-            if not result['success']:
-                return {
-                    'success': False,
-                    'error': f'Pipeline failed at agent {agent_name}: {result["error"]}',
-                    'data': None,
-                    'pipeline_results': results
-                }
+            for agent_name, result in zip(stage_names, stage_results):
+                if isinstance(result, Exception):
+                    result = {'success': False, 'error': str(result), 'data': None}
+                results.append(result)
+                
+                if not result['success']:
+                    return {
+                        'success': False,
+                        'error': f'Pipeline failed at agent {agent_name}: {result["error"]}',
+                        'data': None,
+                        'pipeline_results': results
+                    }
             
-            # 将当前结果作为下一个智能体的输入
-            if result['data']:
-                current_data.update(result['data'])
+            # 将当前阶段结果作为下一阶段的输入
+            for result in results[-len(stage_names):]:
+                if result['data']:
+                    layered = layered.new_child(result['data'])
         
         return {
             'success': True,
             'error': None,
-            'data': current_data,
+            'data': dict(layered),
             'pipeline_results': results
         }
     
+    async def process_batch(self, agent_names: List[str],
+                            inputs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        并发处理多个用户的流水线请求
+        
+        以滑动窗口方式调度：最多同时存在 micro_batch_size 个任务，
+        每完成一个即补充一个，实际执行并发度由信号量限制。
+        
+        Args:
+            agent_names: 智能体名称列表
+            inputs: 各用户的输入数据
+            
+        Returns:
+            与输入顺序一致的处理结果列表
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(inputs)
+        pending = set()
+        task_index = {}
+        next_index = 0
+        window = max(1, self.micro_batch_size)
+        
+        while next_index < len(inputs) or pending:
+            # 补充空闲槽位
+            while next_index < len(inputs) and len(pending) < window:
+                task = asyncio.create_task(self.process_pipeline(agent_names, inputs[next_index]))
+                task_index[task] = next_index
+                pending.add(task)
+                next_index += 1
+            
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = task_index.pop(task)
+                try:
+                    results[index] = task.result()
+                except Exception as e:
+                    self.logger.error(f"Pipeline task failed: {e}", exc_info=True)
+                    results[index] = {
+                        'success': False,
+                        'error': str(e),
+                        'data': None
+                    }
+        
+        return results
+    
     def get_all_status(self) -> Dict[str, Any]:
-        """获取所有智能体状态"""
-        return {
-            agent_name: agent.get_status()
-            for agent_name, agent in self.agents.items()
-        }
+        """获取所有智能体状态（注册表及各智能体状态未变化时复用缓存，返回浅拷贝）"""
+        key = (self.version, sum(agent._version for agent in self.agents.values()))
+        if self._status_cache is None or key != self._status_key:
+            self._status_cache = {
+                agent_name: agent.get_status()
+                for agent_name, agent in self.agents.items()
+            }
+            self._status_key = key
+        return dict(self._status_cache)
 
 
 # 全局智能体管理器实例
@@ -0,0 +1,135 @@
+"""
+微批处理
+并发到达的请求在短等待窗口内汇聚成批次，交给批处理函数一次处理，各请求通过future取回自己的结果
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Coroutine, List, Optional, Sequence, Tuple
+
+# 一个批次：[(请求, future), ...]
+Batch = List[Tuple[Any, asyncio.Future]]
+
+
+class MicroBatcher:
+    """
+    微批处理器
+    
+    handler接收一个批次，负责按顺序回填各请求的future；handler抛出异常时，批次中尚未完成的future统一设为该异常。
+    分发协程等待handler完成后再收集下一批，处理期间到达的请求留在队列中直接组成下一批；
+    需要批次并发执行时，handler用spawn把处理放到后台。
+    队列和分发协程绑定到首次提交时的事件循环，事件循环变化（如每次asyncio.run）时重新创建。
+    """
+    
+    def __init__(self, handler: Callable[[Batch], Awaitable[None]],
+                 max_batch: int = 32, max_wait_ms: float = 10.0):
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.logger = logging.getLogger("agent.batching")
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+    
+    async def submit(self, item: Any) -> Any:
+        """提交一个请求，返回批处理后该请求的结果"""
+        self._ensure_dispatcher()
+        future = self._loop.create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+    
+    def spawn(self, coro: Coroutine) -> asyncio.Task:
+        """在后台执行批次处理，close时等待其完成"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+        return task
+    
+    @staticmethod
+    def resolve(batch: Batch, results: Sequence[Any]):
+        """按顺序回填批次结果，结果为异常实例时设为该请求的异常；结果数量不足时其余请求设为异常"""
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        if len(results) != len(batch):
+            MicroBatcher.fail(batch[len(results):], RuntimeError(
+                f"Batch returned {len(results)} results for {len(batch)} requests"
+            ))
+    
+    @staticmethod
+    def fail(batch: Batch, error: BaseException):
+        """批次中尚未完成的请求统一设为异常"""
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+    
+    def _ensure_dispatcher(self):
+        """启动批次分发协程（每个事件循环只启动一次）"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 旧事件循环上的队列和任务不能在新循环中使用，直接丢弃
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._dispatcher = None
+            self._inflight = set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch_loop())
+    
+    async def _dispatch_loop(self):
+        """收集请求并按批次处理"""
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            try:
+                # 在等待窗口内尽量凑满一个批次
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch:
+                    if not queue.empty():
+                        batch.append(queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                
+                await self.handler(batch)
+            except asyncio.CancelledError:
+                # 关闭时已取出的请求一并取消，避免调用方一直等待
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.logger.error(f"Batch handler failed: {e}")
+                self.fail(batch, e)
+    
+    async def close(self):
+        """停止分发，取消排队中的请求并等待后台批次完成"""
+        if self._loop is not None and self._loop is not asyncio.get_running_loop():
+            # 绑定的事件循环已不是当前循环，其上的任务无法等待
+            self._loop = self._queue = self._dispatcher = None
+            self._inflight = set()
+            return
+        
+        if self._dispatcher and not self._dispatcher.done():
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        self._dispatcher = None
+        
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
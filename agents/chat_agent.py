@@ -3,13 +3,18 @@
 基于Langflow集成多个智能体，提供统一的对话接口
 """
 
-import json
 import asyncio
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import lru_cache
+from string import Template
+from typing import Dict, Any, AsyncIterator, FrozenSet, List, Optional, Tuple
 import logging
 
 from .base_agent import BaseAgent, agent_manager
+from .context import ANALYSIS_CONTEXT_KEY, AnalysisContext
+from .llm_client import BatchingLLMClient, OPENAI_AVAILABLE
+from .utils import TTLCache, iso_now, json_dumps, normalize_text, stable_hash
 
 # 尝试导入Langflow相关库
 try:
@@ -28,6 +33,160 @@ except ImportError:
     logging.warning("LangChain not available")
 
 
+SYSTEM_PROMPT_TEMPLATE = Template("""你是一个专业的AI客服助手，具备以下能力：
+1. 理解用户情感和意图
+2. 记住对话历史和用户偏好
+3. 提供准确的产品信息和建议
+4. 根据用户特征调整沟通风格
+
+当前对话阶段：${conversation_state}
+
+智能体分析结果：
+${agent_analysis}
+
+请根据分析结果，以自然、友好的方式回复用户，确保回复：
+- 符合当前对话阶段的目标
+- 考虑用户的情感状态和偏好
+- 利用相关的知识库信息
+- 推进对话向积极方向发展""")
+
+
+class ConversationState(IntEnum):
+    """对话状态，取值即对话流程表的下标"""
+    GREETING = 0
+    INFORMATION_GATHERING = 1
+    PRODUCT_INQUIRY = 2
+    PRODUCT_RECOMMENDATION = 3
+    PRICE_NEGOTIATION = 4
+    ORDER_PROCESSING = 5
+    AFTER_SALES = 6
+    CLOSING = 7
+    KNOWLEDGE_QUERY = 8
+
+
+# 状态名 -> 状态枚举
+STATE_BY_NAME: Dict[str, ConversationState] = {state.name.lower(): state for state in ConversationState}
+
+# 状态判断用的标签位掩码
+TAG_HIGH_INTENT = 1 << 0
+TAG_PRICE_SENSITIVE = 1 << 1
+TAG_COMPLAINT = 1 << 2
+TAG_DISAPPOINTED = 1 << 3
+TAG_BITS: Dict[str, int] = {
+    'high_intent': TAG_HIGH_INTENT,
+    'price_sensitive': TAG_PRICE_SENSITIVE,
+    'complaint': TAG_COMPLAINT,
+    'disappointed': TAG_DISAPPOINTED,
+}
+COMPLAINT_MASK = TAG_COMPLAINT | TAG_DISAPPOINTED
+
+# 情感标签编码（无情感结果或中性为0）
+SENTIMENT_CODES: Dict[str, int] = {'positive': 1, 'negative': -1}
+
+
+def next_state_code(current: int, tag_mask: int, sentiment: int, confidence: float) -> int:
+    """
+    基于整数编码的对话状态转移
+    
+    Args:
+        current: 当前状态（ConversationState取值，未知状态为-1）
+        tag_mask: 标签位掩码
+        sentiment: 情感编码（1积极/-1消极/0其他）
+        confidence: 情感置信度
+        
+    Returns:
+        新状态取值，-1表示保持当前状态
+    """
+    # 购买意向高 -> 产品推荐
+    if tag_mask & TAG_HIGH_INTENT:
+        return ConversationState.PRODUCT_RECOMMENDATION
+    # 价格敏感 -> 价格协商
+    if tag_mask & TAG_PRICE_SENSITIVE and (
+            current == ConversationState.PRODUCT_RECOMMENDATION or current == ConversationState.PRODUCT_INQUIRY):
+        return ConversationState.PRICE_NEGOTIATION
+    # 投诉相关 -> 售后服务
+    if tag_mask & COMPLAINT_MASK:
+        return ConversationState.AFTER_SALES
+    
+    # 负面情感 -> 售后服务
+    if sentiment < 0 and confidence > 0.7:
+        return ConversationState.AFTER_SALES
+    # 积极情感且在推荐阶段 -> 订单处理
+    if sentiment > 0 and current == ConversationState.PRODUCT_RECOMMENDATION:
+        return ConversationState.ORDER_PROCESSING
+    
+    return -1
+
+# 智能体结果中常用字段的键路径
+SENTIMENT_LABEL_PATH = ('sentiment_agent', 'data', 'sentiment', 'label')
+SENTIMENT_CONF_PATH = ('sentiment_agent', 'data', 'sentiment', 'confidence')
+TAGS_PATH = ('tag_agent', 'data', 'tags')
+KNOWLEDGE_ANSWER_PATH = ('knowledge_agent', 'data', 'answer')
+MEMORY_STATE_PATH = ('memory_agent', 'data', 'conversation_state')
+USER_PROFILE_PATH = ('memory_agent', 'data', 'context', 'user_profile')
+
+# 影响知识库检索结果的上下文字段，参与知识缓存键计算
+KNOWLEDGE_CONTEXT_KEYS: Tuple[str, ...] = (
+    'user_profile', 'user_tags', 'intent', 'session_topics', 'recent_queries'
+)
+
+
+def _dig(data: Any, path: Tuple[str, ...], default: Any = None) -> Any:
+    """沿键路径读取嵌套字典，任一层缺失时返回默认值"""
+    for key in path:
+        if not isinstance(data, dict):
+            return default
+        data = data.get(key)
+        if data is None:
+            return default
+    return data
+
+
+def _succeeded(agent_results: Dict[str, Any], agent_name: str) -> bool:
+    """智能体是否成功返回了数据"""
+    result = agent_results.get(agent_name)
+    return bool(result and result.get('success') and result.get('data'))
+
+
+@dataclass(slots=True)
+class AnalysisView:
+    """智能体分析结果的扁平视图，每轮对话只解析一次"""
+    has_sentiment: bool = False
+    sentiment_label: Optional[str] = None
+    sentiment_conf: float = 0.0
+    tags: Tuple[str, ...] = ()
+    tag_set: FrozenSet[str] = frozenset()
+    tag_mask: int = 0
+    knowledge_answer: str = ''
+    memory_state: Optional[str] = None
+    user_profile: Dict[str, Any] = field(default_factory=dict)
+
+
+@lru_cache(maxsize=4096)
+def _render_system_prompt(conversation_state: str, sentiment: Optional[Tuple[str, float]],
+                          tags: Tuple[str, ...], knowledge_answer: str) -> str:
+    """渲染系统提示词（按分析摘要缓存）"""
+    agent_analysis = []
+    
+    # 情感分析
+    if sentiment is not None:
+        label, confidence = sentiment
+        agent_analysis.append(f"情感状态：{label} (置信度: {confidence:.2f})")
+    
+    # 用户标签
+    if tags:
+        agent_analysis.append(f"用户标签：{', '.join(tags)}")
+    
+    # 知识库结果
+    if knowledge_answer:
+        agent_analysis.append(f"知识库回答：{knowledge_answer}...")
+    
+    return SYSTEM_PROMPT_TEMPLATE.substitute(
+        conversation_state=conversation_state,
+        agent_analysis='\n'.join(agent_analysis) if agent_analysis else '暂无分析结果'
+    )
+
+
 class ChatAgent(BaseAgent):
     """聊天智能体 - 整合所有智能体能力"""
     
@@ -39,12 +198,17 @@ class ChatAgent(BaseAgent):
         self.langflow_endpoint = self.langflow_config.get('endpoint', 'http://localhost:7860')
         self.langflow_api_key = self.langflow_config.get('api_key', '')
         self.flow_id = self.langflow_config.get('flow_id', '')
+        self.flow_keepalive_interval = self.langflow_config.get('keepalive_interval', 300)  # 秒
         
         # LLM配置
         self.llm_config = config.get('llm', {})
         self.model_name = self.llm_config.get('model', 'gpt-3.5-turbo')
         self.temperature = self.llm_config.get('temperature', 0.7)
         self.max_tokens = self.llm_config.get('max_tokens', 1000)
+        self.batching_config = self.llm_config.get('batching', {})
+        # 自建推理服务的量化方式（fp8/awq/int8），对应服务端部署的量化模型
+        self.quantization = self.llm_config.get('quantization', 'fp8')
+        self.quantized_model = self.llm_config.get('quantized_model', '')
         
         # 初始化Langflow客户端
         if LANGFLOW_AVAILABLE and self.langflow_api_key:
@@ -60,8 +224,38 @@ class ChatAgent(BaseAgent):
         else:
             self.langflow_client = None
         
-        # 初始化LLM
-        if LANGCHAIN_AVAILABLE:
+        # 预编译并常驻Langflow流程，避免每轮对话冷启动
+        self.compiled_flow = None
+        self._flow_heartbeat_task: Optional[asyncio.Task] = None
+        if self.langflow_client and self.flow_id:
+            try:
+                self.compiled_flow = self.langflow_client.compile_flow(self.flow_id, warm=True)
+                self.logger.info(f"Langflow flow {self.flow_id} compiled and warmed")
+            except Exception as e:
+                self.logger.warning(f"Failed to compile Langflow flow, using per-request run_flow: {e}")
+                self.compiled_flow = None
+        
+        # 初始化LLM（启用批处理时直连OpenAI兼容推理服务）
+        self.batch_client = None
+        if self.batching_config.get('enabled') and OPENAI_AVAILABLE:
+            try:
+                self.batch_client = BatchingLLMClient(
+                    base_url=self.llm_config.get('base_url', 'http://localhost:8000/v1'),
+                    api_key=self.llm_config.get('api_key', ''),
+                    model=self._serving_model_name(),
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    max_batch=self.batching_config.get('max_batch', 32),
+                    max_wait_ms=self.batching_config.get('max_wait_ms', 0)
+                )
+                self.logger.info("Batching LLM client initialized successfully")
+            except Exception as e:
+                self.logger.error(f"Failed to initialize batching LLM client: {e}")
+                self.batch_client = None
+        
+        if self.batch_client is not None:
+            self.llm = None
+        elif LANGCHAIN_AVAILABLE:
             try:
                 self.llm = ChatOpenAI(
                     model_name=self.model_name,
@@ -74,50 +268,6 @@ class ChatAgent(BaseAgent):
         else:
             self.llm = None
         
-        # 对话流程配置
-        self.conversation_flow = {
-            'greeting': {
-                'next_states': ['information_gathering', 'product_inquiry'],
-                'agents': ['tag_agent', 'sentiment_agent', 'memory_agent'],
-                'prompts': self._get_greeting_prompts()
-            },
-            'information_gathering': {
-                'next_states': ['product_recommendation', 'knowledge_query'],
-                'agents': ['tag_agent', 'sentiment_agent', 'memory_agent'],
-                'prompts': self._get_info_gathering_prompts()
-            },
-            'product_inquiry': {
-                'next_states': ['product_recommendation', 'price_negotiation'],
-                'agents': ['knowledge_agent', 'tag_agent', 'sentiment_agent'],
-                'prompts': self._get_product_inquiry_prompts()
-            },
-            'product_recommendation': {
-                'next_states': ['price_negotiation', 'order_processing'],
-                'agents': ['knowledge_agent', 'tag_agent'],
-                'prompts': self._get_recommendation_prompts()
-            },
-            'price_negotiation': {
-                'next_states': ['order_processing', 'product_recommendation'],
-                'agents': ['sentiment_agent', 'tag_agent'],
-                'prompts': self._get_negotiation_prompts()
-            },
-            'order_processing': {
-                'next_states': ['after_sales', 'closing'],
-                'agents': ['memory_agent', 'sentiment_agent'],
-                'prompts': self._get_order_prompts()
-            },
-            'after_sales': {
-                'next_states': ['closing', 'knowledge_query'],
-                'agents': ['knowledge_agent', 'sentiment_agent'],
-                'prompts': self._get_after_sales_prompts()
-            },
-            'closing': {
-                'next_states': ['greeting'],
-                'agents': ['sentiment_agent', 'memory_agent'],
-                'prompts': self._get_closing_prompts()
-            }
-        }
-        
         # 智能体优先级
         self.agent_priority = {
             'sentiment_agent': 1,  # 情感分析最高优先级
@@ -125,6 +275,32 @@ class ChatAgent(BaseAgent):
             'tag_agent': 3,        # 标签分析
             'knowledge_agent': 4   # 知识检索
         }
+        self._ordered_agents = tuple(sorted(self.agent_priority, key=self.agent_priority.get))
+        
+        # 单个分析智能体的超时预算（秒）
+        self.agent_timeout = config.get('agent_timeout', 3.0)
+        
+        # 知识库结果缓存（相同问题在不同用户间高度重复）
+        knowledge_cache_config = config.get('knowledge_cache', {})
+        self._knowledge_cache = TTLCache(
+            maxsize=knowledge_cache_config.get('maxsize', 10000),
+            ttl=knowledge_cache_config.get('ttl', 900)
+        )
+        
+        # 后台进行中的对话历史写入
+        self._pending_writes: set = set()
+        self._session_writes: Dict[str, asyncio.Task] = {}
+        
+        # 已注册的分析智能体（按管理器版本号缓存）
+        self._live_agents: Tuple[str, ...] = ()
+        self._live_agents_version = -1
+    
+    def _serving_model_name(self) -> str:
+        """自建推理服务上实际调用的模型名（配置了量化模型时优先使用）"""
+        if self.quantization and self.quantized_model:
+            self.logger.info(f"Using {self.quantization} quantized model: {self.quantized_model}")
+            return self.quantized_model
+        return self.model_name
     
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """验证输入数据"""
@@ -138,27 +314,31 @@ class ChatAgent(BaseAgent):
         session_id = input_data.get('session_id', 'default')
         context = input_data.get('context', {})
         
+        # 确保同一会话上一轮的历史写入已完成，保证读到最新记忆
+        await self._wait_session_write(user_id, session_id)
+        
         # 1. 并行调用智能体分析
         agent_results = await self._analyze_with_agents(input_data)
+        view = self._view(agent_results)
         
         # 2. 确定对话状态
-        conversation_state = self._determine_conversation_state(agent_results, context)
+        conversation_state = self._determine_conversation_state(view, context)
         
         # 3. 生成回复
         if self.langflow_client:
             response = await self._generate_response_with_langflow(
-                message, agent_results, conversation_state, context
+                message, agent_results, view, conversation_state, context
             )
         else:
             response = await self._generate_response_fallback(
-                message, agent_results, conversation_state, context
+                message, view, conversation_state, context
             )
         
-        # 4. 更新对话历史
-        await self._update_conversation_history(user_id, session_id, message, response, agent_results)
+        # 4. 更新对话历史（后台执行，不阻塞回复）
+        self._schedule_history_update(user_id, session_id, message, response, agent_results)
         
         # 5. 预测下一步动作
-        next_actions = self._predict_next_actions(conversation_state, agent_results)
+        next_actions = self._predict_next_actions(conversation_state, view)
         
         result = {
             'user_id': user_id,
@@ -168,117 +348,253 @@ class ChatAgent(BaseAgent):
             'conversation_state': conversation_state,
             'agent_results': agent_results,
             'next_actions': next_actions,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': iso_now()
         }
         
         self.logger.info(f"Chat processed for user {user_id}: {conversation_state}")
         
         return result
     
+    async def stream_process(self, input_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        流式处理对话消息，回复文本边生成边返回
+        
+        Args:
+            input_data: 与process相同的输入数据
+            
+        Yields:
+            回复文本片段
+        """
+        if not self.validate_input(input_data):
+            raise ValueError('Invalid input data')
+        
+        user_id = input_data['user_id']
+        message = input_data['message']
+        session_id = input_data.get('session_id', 'default')
+        context = input_data.get('context', {})
+        
+        await self._wait_session_write(user_id, session_id)
+        
+        agent_results = await self._analyze_with_agents(input_data)
+        view = self._view(agent_results)
+        conversation_state = self._determine_conversation_state(view, context)
+        
+        chunks = []
+        if self.langflow_client:
+            response = await self._generate_response_with_langflow(
+                message, agent_results, view, conversation_state, context
+            )
+            chunks.append(response)
+            yield response
+        else:
+            async for chunk in self._stream_response_fallback(message, view, conversation_state, context):
+                chunks.append(chunk)
+                yield chunk
+        
+        # 流结束后再写入完整回复
+        self._schedule_history_update(user_id, session_id, message, ''.join(chunks), agent_results)
+    
     async def _analyze_with_agents(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """并行调用多个智能体进行分析"""
-        agent_tasks = []
-        agent_names = []
-        
         # 根据优先级创建任务
-        for agent_name in sorted(self.agent_priority.keys(), key=lambda x: self.agent_priority[x]):
-            if agent_manager.get_agent(agent_name):
-                agent_tasks.append(agent_manager.process_with_agent(agent_name, input_data))
-                agent_names.append(agent_name)
+        agent_names = self._get_live_agents()
         
-        # 并行执行
-        try:
-            results = await asyncio.gather(*agent_tasks, return_exceptions=True)
-        except Exception as e:
-            self.logger.error(f"Error in agent analysis: {e}")
-            results = [{'success': False, 'error': str(e)} for _ in agent_tasks]
+        # 各分析智能体共享同一份消息预处理结果（只分词一次）
+        input_data = {**input_data, ANALYSIS_CONTEXT_KEY: AnalysisContext.from_message(input_data['message'])}
+        
+        # 并行执行，每个智能体单独限时，慢的智能体不拖累其他结果
+        async with asyncio.TaskGroup() as task_group:
+            agent_tasks = [
+                task_group.create_task(self._run_analyzer(agent_name, input_data))
+                for agent_name in agent_names
+            ]
         
         # 整理结果
-        agent_results = {}
-        for i, (agent_name, result) in enumerate(zip(agent_names, results)):
-            if isinstance(result, Exception):
-                agent_results[agent_name] = {'success': False, 'error': str(result)}
-            else:
-                agent_results[agent_name] = result
+        agent_results = {
+            agent_name: task.result()
+            for agent_name, task in zip(agent_names, agent_tasks)
+        }
         
         return agent_results
     
-    def _determine_conversation_state(self, agent_results: Dict[str, Any], context: Dict[str, Any]) -> str:
+    async def _run_analyzer(self, agent_name: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """在超时预算内调用单个分析智能体，错误在此隔离而不影响其他智能体"""
+        if agent_name == 'knowledge_agent':
+            coro = self._query_knowledge(input_data)
+        else:
+            coro = agent_manager.process_with_agent(agent_name, input_data)
+        
+        try:
+            return await asyncio.wait_for(coro, timeout=self.agent_timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Agent {agent_name} timed out after {self.agent_timeout}s")
+            return {'success': False, 'error': 'timeout'}
+        except Exception as e:
+            self.logger.error(f"Error in agent analysis ({agent_name}): {e}")
+            return {'success': False, 'error': str(e)}
+    
+    async def _query_knowledge(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """调用知识库智能体，命中缓存时直接返回"""
+        cache_key = self._knowledge_cache_key(input_data)
+        cached = self._knowledge_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        result = await agent_manager.process_with_agent('knowledge_agent', input_data)
+        if result.get('success'):
+            self._knowledge_cache.set(cache_key, result)
+        return result
+    
+    def _knowledge_cache_key(self, input_data: Dict[str, Any]) -> str:
+        """由归一化问题和用户画像相关上下文生成缓存键"""
+        context = input_data.get('context') or {}
+        profile = {key: context[key] for key in KNOWLEDGE_CONTEXT_KEYS if key in context}
+        query = input_data.get('query', input_data.get('message', ''))
+        return stable_hash('\x1f'.join((
+            normalize_text(query),
+            str(input_data.get('knowledge_base', '')),
+            json_dumps(profile)
+        )))
+    
+    def _get_live_agents(self) -> Tuple[str, ...]:
+        """获取已注册的分析智能体（注册表变化时才重新计算）"""
+        if self._live_agents_version != agent_manager.version:
+            self._live_agents = tuple(
+                agent_name for agent_name in self._ordered_agents
+                if agent_manager.get_agent(agent_name)
+            )
+            self._live_agents_version = agent_manager.version
+        return self._live_agents
+    
+    def _view(self, agent_results: Dict[str, Any]) -> AnalysisView:
+        """将各智能体的嵌套结果解析为扁平视图"""
+        view = AnalysisView()
+        
+        if _succeeded(agent_results, 'sentiment_agent'):
+            view.has_sentiment = True
+            view.sentiment_label = _dig(agent_results, SENTIMENT_LABEL_PATH)
+            view.sentiment_conf = _dig(agent_results, SENTIMENT_CONF_PATH, 0)
+        
+        if _succeeded(agent_results, 'tag_agent'):
+            view.tags = tuple(_dig(agent_results, TAGS_PATH, ()))
+            view.tag_set = frozenset(view.tags)
+            for tag in view.tag_set:
+                view.tag_mask |= TAG_BITS.get(tag, 0)
+        
+        if _succeeded(agent_results, 'knowledge_agent'):
+            view.knowledge_answer = _dig(agent_results, KNOWLEDGE_ANSWER_PATH, '')
+        
+        if _succeeded(agent_results, 'memory_agent'):
+            view.memory_state = _dig(agent_results, MEMORY_STATE_PATH, 'greeting')
+            view.user_profile = _dig(agent_results, USER_PROFILE_PATH, {})
+        
+        return view
+    
+    def _determine_conversation_state(self, view: AnalysisView, context: Dict[str, Any]) -> str:
         """根据智能体分析结果确定对话状态"""
         # 从记忆智能体获取当前状态
-        memory_result = agent_results.get('memory_agent', {})
-        if memory_result.get('success') and memory_result.get('data'):
-            current_state = memory_result['data'].get('conversation_state', 'greeting')
+        if view.memory_state is not None:
+            current_state = view.memory_state
         else:
             current_state = context.get('conversation_state', 'greeting')
         
-        # 根据标签智能体结果调整状态
-        tag_result = agent_results.get('tag_agent', {})
-        if tag_result.get('success') and tag_result.get('data'):
-            tags = tag_result['data'].get('tags', [])
-            
-            # 购买意向高 -> 产品推荐
-            if 'high_intent' in tags:
-                return 'product_recommendation'
-            # 价格敏感 -> 价格协商
-            elif 'price_sensitive' in tags and current_state in ['product_recommendation', 'product_inquiry']:
-                return 'price_negotiation'
-            # 投诉相关 -> 售后服务
-            elif any(tag in tags for tag in ['complaint', 'disappointed']):
-                return 'after_sales'
-        
-        # 根据情感分析调整状态
-        sentiment_result = agent_results.get('sentiment_agent', {})
-        if sentiment_result.get('success') and sentiment_result.get('data'):
-            sentiment = sentiment_result['data'].get('sentiment', {})
-            
-            # 负面情感 -> 售后服务
-            if sentiment.get('label') == 'negative' and sentiment.get('confidence', 0) > 0.7:
-                return 'after_sales'
-            # 积极情感且在推荐阶段 -> 订单处理
-            elif sentiment.get('label') == 'positive' and current_state == 'product_recommendation':
-                return 'order_processing'
+        # 根据标签和情感结果调整状态
+        state = STATE_BY_NAME.get(current_state, -1)
+        sentiment = SENTIMENT_CODES.get(view.sentiment_label, 0) if view.has_sentiment else 0
+        next_state = next_state_code(state, view.tag_mask, sentiment, view.sentiment_conf)
+        if next_state >= 0:
+            return _STATE_NAMES[next_state]
         
         return current_state
     
     async def _generate_response_with_langflow(self, message: str, agent_results: Dict[str, Any],
-                                             conversation_state: str, context: Dict[str, Any]) -> str:
+                                             view: AnalysisView, conversation_state: str,
+                                             context: Dict[str, Any]) -> str:
         """使用Langflow生成回复"""
         try:
             # 构建Langflow输入
             flow_input = {
                 'user_message': message,
                 'conversation_state': conversation_state,
-                'agent_results': json.dumps(agent_results, ensure_ascii=False),
-                'context': json.dumps(context, ensure_ascii=False)
+                'agent_results': json_dumps(agent_results),
+                'context': json_dumps(context)
             }
             
-            # 调用Langflow流程
-            response = await self.langflow_client.run_flow(
-                flow_id=self.flow_id,
-                input_data=flow_input
-            )
+            # 调用Langflow流程（优先使用已预热的流程）
+            if self.compiled_flow is not None:
+                self._ensure_flow_heartbeat()
+                response = await self.compiled_flow.run(input_data=flow_input)
+            else:
+                response = await self.langflow_client.run_flow(
+                    flow_id=self.flow_id,
+                    input_data=flow_input
+                )
             
             if response and 'output' in response:
                 return response['output']
             else:
                 self.logger.warning("Invalid Langflow response, using fallback")
-                return await self._generate_response_fallback(message, agent_results, conversation_state, context)
+                return await self._generate_response_fallback(message, view, conversation_state, context)
                 
         except Exception as e:
             self.logger.error(f"Langflow generation error: {e}")
-            return await self._generate_response_fallback(message, agent_results, conversation_state, context)
+            return await self._generate_response_fallback(message, view, conversation_state, context)
+    
+    def _ensure_flow_heartbeat(self):
+        """在事件循环中启动流程保活任务（仅启动一次）"""
+        if self.flow_keepalive_interval <= 0:
+            return
+        if self._flow_heartbeat_task is None or self._flow_heartbeat_task.done():
+            self._flow_heartbeat_task = asyncio.create_task(self._flow_heartbeat())
     
-    async def _generate_response_fallback(self, message: str, agent_results: Dict[str, Any],
+    async def _flow_heartbeat(self):
+        """定期触达已编译流程，防止其被服务端冷淘汰"""
+        while self.compiled_flow is not None:
+            await asyncio.sleep(self.flow_keepalive_interval)
+            try:
+                await self.compiled_flow.ping()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"Langflow heartbeat failed: {e}")
+    
+    async def shutdown(self):
+        """释放后台任务，并等待未完成的历史写入"""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+        if self._flow_heartbeat_task and not self._flow_heartbeat_task.done():
+            self._flow_heartbeat_task.cancel()
+            try:
+                await self._flow_heartbeat_task
+            except asyncio.CancelledError:
+                pass
+        self._flow_heartbeat_task = None
+        
+        if self.batch_client is not None:
+            await self.batch_client.close()
+    
+    async def _generate_response_fallback(self, message: str, view: AnalysisView,
                                         conversation_state: str, context: Dict[str, Any]) -> str:
         """备用回复生成方法"""
         # 构建系统提示词
-        system_prompt = self._build_system_prompt(conversation_state, agent_results)
+        system_prompt = self._build_system_prompt(conversation_state, view)
         
         # 构建用户消息上下文
-        user_context = self._build_user_context(agent_results, context)
+        user_context = self._build_user_context(view, context)
         
-        if self.llm and LANGCHAIN_AVAILABLE:
+        if self.batch_client is not None:
+            # 使用批处理客户端生成回复
+            try:
+                response = await self.batch_client.generate([
+                    {'role': 'system', 'content': system_prompt},
+                    {'role': 'user', 'content': f"用户上下文：{user_context}\n用户消息：{message}"}
+                ])
+                return response.strip()
+                
+            except Exception as e:
+                self.logger.error(f"LLM generation error: {e}")
+        
+        elif self.llm and LANGCHAIN_AVAILABLE:
             # 使用LangChain LLM生成回复
             try:
                 messages = [
@@ -293,66 +609,62 @@ class ChatAgent(BaseAgent):
                 self.logger.error(f"LLM generation error: {e}")
         
         # 基于规则的备用回复
-        return self._generate_rule_based_response(message, agent_results, conversation_state)
+        return self._generate_rule_based_response(message, view, conversation_state)
     
-    def _build_system_prompt(self, conversation_state: str, agent_results: Dict[str, Any]) -> str:
+    async def _stream_response_fallback(self, message: str, view: AnalysisView,
+                                        conversation_state: str, context: Dict[str, Any]) -> AsyncIterator[str]:
+        """备用回复的流式生成方法"""
+        system_prompt = self._build_system_prompt(conversation_state, view)
+        user_context = self._build_user_context(view, context)
+        user_content = f"用户上下文：{user_context}\n用户消息：{message}"
+        
+        # 已输出部分内容后出错则直接结束，避免拼接出混杂的回复
+        emitted = False
+        try:
+            if self.batch_client is not None:
+                async for chunk in self.batch_client.stream([
+                    {'role': 'system', 'content': system_prompt},
+                    {'role': 'user', 'content': user_content}
+                ]):
+                    emitted = True
+                    yield chunk
+                return
+            
+            if self.llm and LANGCHAIN_AVAILABLE:
+                messages = [
+                    SystemMessage(content=system_prompt),
+                    HumanMessage(content=user_content)
+                ]
+                async for chunk in self.llm.astream(messages):
+                    if chunk.content:
+                        emitted = True
+                        yield chunk.content
+                return
+                
+        except Exception as e:
+            self.logger.error(f"LLM streaming error: {e}")
+            if emitted:
+                return
+        
+        # 基于规则的备用回复
+        yield self._generate_rule_based_response(message, view, conversation_state)
+    
+    def _build_system_prompt(self, conversation_state: str, view: AnalysisView) -> str:
         """构建系统提示词"""
-        base_prompt = """你是一个专业的AI客服助手，具备以下能力：
-1. 理解用户情感和意图
-2. 记住对话历史和用户偏好
-3. 提供准确的产品信息和建议
-4. 根据用户特征调整沟通风格
-
-当前对话阶段：{conversation_state}
-
-智能体分析结果：
-{agent_analysis}
-
-请根据分析结果，以自然、友好的方式回复用户，确保回复：
-- 符合当前对话阶段的目标
-- 考虑用户的情感状态和偏好
-- 利用相关的知识库信息
-- 推进对话向积极方向发展"""
-        
-        # 整理智能体分析结果
-        agent_analysis = []
-        
-        # 情感分析
-        sentiment_result = agent_results.get('sentiment_agent', {})
-        if sentiment_result.get('success'):
-            sentiment_data = sentiment_result.get('data', {}).get('sentiment', {})
-            agent_analysis.append(f"情感状态：{sentiment_data.get('label', '未知')} (置信度: {sentiment_data.get('confidence', 0):.2f})")
-        
-        # 用户标签
-        tag_result = agent_results.get('tag_agent', {})
-        if tag_result.get('success'):
-            tags = tag_result.get('data', {}).get('tags', [])
-            if tags:
-                agent_analysis.append(f"用户标签：{', '.join(tags)}")
-        
-        # 知识库结果
-        knowledge_result = agent_results.get('knowledge_agent', {})
-        if knowledge_result.get('success'):
-            answer = knowledge_result.get('data', {}).get('answer', '')
-            if answer:
-                agent_analysis.append(f"知识库回答：{answer[:200]}...")
-        
-        return base_prompt.format(
-            conversation_state=conversation_state,
-            agent_analysis='\n'.join(agent_analysis) if agent_analysis else '暂无分析结果'
-        )
+        # 提取影响提示词的最小可哈希摘要，复用已渲染结果
+        sentiment = None
+        if view.has_sentiment:
+            sentiment = (view.sentiment_label or '未知', round(view.sentiment_conf, 2))
+        
+        return _render_system_prompt(conversation_state, sentiment, view.tags, view.knowledge_answer[:200])
     
-    def _build_user_context(self, agent_results: Dict[str, Any], context: Dict[str, Any]) -> str:
+    def _build_user_context(self, view: AnalysisView, context: Dict[str, Any]) -> str:
         """构建用户上下文信息"""
         context_parts = []
         
         # 用户画像
-        memory_result = agent_results.get('memory_agent', {})
-        if memory_result.get('success'):
-            memory_data = memory_result.get('data', {})
-            user_profile = memory_data.get('context', {}).get('user_profile', {})
-            if user_profile:
-                context_parts.append(f"用户画像：{json.dumps(user_profile, ensure_ascii=False)}")
+        if view.user_profile:
+            context_parts.append(f"用户画像：{json_dumps(view.user_profile)}")
         
         # 会话历史
         recent_messages = context.get('recent_messages', [])
@@ -362,23 +674,18 @@ class ChatAgent(BaseAgent):
         
         return '\n'.join(context_parts) if context_parts else '无历史上下文'
     
-    def _generate_rule_based_response(self, message: str, agent_results: Dict[str, Any], 
+    def _generate_rule_based_response(self, message: str, view: AnalysisView, 
                                     conversation_state: str) -> str:
         """基于规则的回复生成"""
         # 获取预定义提示词
-        state_prompts = self.conversation_flow.get(conversation_state, {}).get('prompts', [])
+        state = STATE_BY_NAME.get(conversation_state)
+        state_prompts = _STATE_PROMPTS[state] if state is not None else ()
         
         # 根据情感选择合适的回复基调
-        sentiment_result = agent_results.get('sentiment_agent', {})
-        sentiment_label = 'neutral'
-        if sentiment_result.get('success'):
-            sentiment_label = sentiment_result.get('data', {}).get('sentiment', {}).get('label', 'neutral')
+        sentiment_label = (view.sentiment_label or 'neutral') if view.has_sentiment else 'neutral'
         
         # 根据用户标签调整回复风格
-        tag_result = agent_results.get('tag_agent', {})
-        user_tags = []
-        if tag_result.get('success'):
-            user_tags = tag_result.get('data', {}).get('tags', [])
+        user_tags = view.tag_set
         
         # 选择合适的回复模板
         if sentiment_label == 'negative':
@@ -389,11 +696,8 @@ class ChatAgent(BaseAgent):
             response = "我来为您详细介绍一下。"
         
         # 添加知识库信息
-        knowledge_result = agent_results.get('knowledge_agent', {})
-        if knowledge_result.get('success'):
-            knowledge_answer = knowledge_result.get('data', {}).get('answer', '')
-            if knowledge_answer:
-                response += f"\n\n{knowledge_answer}"
+        if view.knowledge_answer:
+            response += f"\n\n{view.knowledge_answer}"
         
         # 根据对话状态添加引导
         if conversation_state == 'product_inquiry':
@@ -406,6 +710,30 @@ class ChatAgent(BaseAgent):
         
         return response
     
+    def _schedule_history_update(self, user_id: str, session_id: str,
+                                 user_message: str, assistant_response: str,
+                                 agent_results: Dict[str, Any]):
+        """在后台更新对话历史"""
+        task = asyncio.create_task(self._update_conversation_history(
+            user_id, session_id, user_message, assistant_response, agent_results
+        ))
+        session_key = f"{user_id}:{session_id}"
+        self._pending_writes.add(task)
+        self._session_writes[session_key] = task
+        
+        def _on_done(done_task: asyncio.Task):
+            self._pending_writes.discard(done_task)
+            if self._session_writes.get(session_key) is done_task:
+                del self._session_writes[session_key]
+        
+        task.add_done_callback(_on_done)
+    
+    async def _wait_session_write(self, user_id: str, session_id: str):
+        """等待指定会话的后台历史写入完成"""
+        task = self._session_writes.get(f"{user_id}:{session_id}")
+        if task is not None and not task.done():
+            await asyncio.shield(task)
+    
     async def _update_conversation_history(self, user_id: str, session_id: str, 
                                          user_message: str, assistant_response: str,
                                          agent_results: Dict[str, Any]):
@@ -419,7 +747,7 @@ class ChatAgent(BaseAgent):
                 'message_type': 'assistant',
                 'metadata': {
                     'agent_results': agent_results,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': iso_now()
                 }
             }
             
@@ -428,95 +756,145 @@ class ChatAgent(BaseAgent):
         except Exception as e:
             self.logger.error(f"Failed to update conversation history: {e}")
     
-    def _predict_next_actions(self, conversation_state: str, agent_results: Dict[str, Any]) -> List[str]:
+    def _predict_next_actions(self, conversation_state: str, view: AnalysisView) -> List[str]:
         """预测下一步可能的动作"""
-        flow_config = self.conversation_flow.get(conversation_state, {})
-        possible_states = flow_config.get('next_states', [])
+        state = STATE_BY_NAME.get(conversation_state)
+        possible_states = _NEXT_STATES[state] if state is not None else ()
         
         # 根据智能体分析结果调整概率
         actions = []
         
-        tag_result = agent_results.get('tag_agent', {})
-        if tag_result.get('success'):
-            tags = tag_result.get('data', {}).get('tags', [])
-            
-            if 'high_intent' in tags and 'order_processing' in possible_states:
-                actions.append('order_processing')
-            elif 'price_sensitive' in tags and 'price_negotiation' in possible_states:
-                actions.append('price_negotiation')
-        
-        sentiment_result = agent_results.get('sentiment_agent', {})
-        if sentiment_result.get('success'):
-            sentiment = sentiment_result.get('data', {}).get('sentiment', {})
-            
-            if sentiment.get('label') == 'negative' and 'after_sales' in possible_states:
-                actions.append('after_sales')
+        tag_set = view.tag_set
+        if 'high_intent' in tag_set and 'order_processing' in possible_states:
+            actions.append('order_processing')
+        elif 'price_sensitive' in tag_set and 'price_negotiation' in possible_states:
+            actions.append('price_negotiation')
+        
+        if view.sentiment_label == 'negative' and 'after_sales' in possible_states:
+            actions.append('after_sales')
         
         # 添加默认可能状态
-        actions.extend([state for state in possible_states if state not in actions])
+        seen = set(actions)
+        actions.extend([state for state in possible_states if state not in seen])
         
         return actions
     
-    def _get_greeting_prompts(self) -> List[str]:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_greeting_prompts() -> Tuple[str, ...]:
         """获取问候阶段提示词"""
-        return [
+        return (
             "欢迎光临！我是您的专属购物助手，有什么可以帮您的吗？",
             "您好！很高兴为您服务，请问您今天想了解什么产品呢？",
             "欢迎！我可以为您提供产品咨询、下单协助等服务，请告诉我您的需求。"
-        ]
+        )
     
-    def _get_info_gathering_prompts(self) -> List[str]:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_info_gathering_prompts() -> Tuple[str, ...]:
         """获取信息收集阶段提示词"""
-        return [
+        return (
             "为了更好地为您推荐，请告诉我您的具体需求或偏好。",
             "您能详细描述一下您想要的产品特点吗？",
             "请问您有什么特殊要求或预算范围吗？"
-        ]
+        )
     
-    def _get_product_inquiry_prompts(self) -> List[str]:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_product_inquiry_prompts() -> Tuple[str, ...]:
         """获取产品咨询阶段提示词"""
-        return [
+        return (
             "这款产品的详细信息如下：",
             "根据您的需求，我为您推荐这款产品：",
             "关于这个产品，我来为您详细介绍："
-        ]
+        )
     
-    def _get_recommendation_prompts(self) -> List[str]:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_recommendation_prompts() -> Tuple[str, ...]:
         """获取推荐阶段提示词"""
-        return [
+        return (
             "基于您的偏好，我推荐以下产品：",
             "这几款产品很适合您：",
             "根据您的需求，建议您考虑："
-        ]
+        )
     
-    def _get_negotiation_prompts(self) -> List[str]:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_negotiation_prompts() -> Tuple[str, ...]:
         """获取价格协商阶段提示词"""
-        return [
+        return (
             "关于价格，我们有以下优惠：",
             "让我为您查询最新的促销活动：",
             "我理解您对价格的关注，我们可以这样："
-        ]
+        )
     
-    def _get_order_prompts(self) -> List[str]:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_order_prompts() -> Tuple[str, ...]:
         """获取订单处理阶段提示词"""
-        return [
+        return (
             "好的，我来为您办理购买手续：",
             "请确认您的订单信息：",
             "我们开始下单流程："
-        ]
+        )
     
-    def _get_after_sales_prompts(self) -> List[str]:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_after_sales_prompts() -> Tuple[str, ...]:
         """获取售后服务阶段提示词"""
-        return [
+        return (
             "我来帮您解决这个问题：",
             "关于您的问题，处理方案如下：",
             "请不要担心，我们会妥善处理："
-        ]
+        )
     
-    def _get_closing_prompts(self) -> List[str]:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_closing_prompts() -> Tuple[str, ...]:
         """获取结束阶段提示词"""
-        return [
+        return (
             "感谢您的咨询，祝您购物愉快！",
             "如有其他问题，随时联系我们！",
             "谢谢您的信任，期待下次为您服务！"
-        ] 
\ No newline at end of file
+        ) 
+
+
+# 对话流程表（按 ConversationState 下标索引的并列元组）
+_STATE_NAMES: Tuple[str, ...] = tuple(state.name.lower() for state in ConversationState)
+
+_NEXT_STATES: Tuple[Tuple[str, ...], ...] = (
+    ('information_gathering', 'product_inquiry'),        # GREETING
+    ('product_recommendation', 'knowledge_query'),       # INFORMATION_GATHERING
+    ('product_recommendation', 'price_negotiation'),     # PRODUCT_INQUIRY
+    ('price_negotiation', 'order_processing'),           # PRODUCT_RECOMMENDATION
+    ('order_processing', 'product_recommendation'),      # PRICE_NEGOTIATION
+    ('after_sales', 'closing'),                          # ORDER_PROCESSING
+    ('closing', 'knowledge_query'),                      # AFTER_SALES
+    ('greeting',),                                       # CLOSING
+    (),                                                  # KNOWLEDGE_QUERY
+)
+
+_STATE_AGENTS: Tuple[Tuple[str, ...], ...] = (
+    ('tag_agent', 'sentiment_agent', 'memory_agent'),    # GREETING
+    ('tag_agent', 'sentiment_agent', 'memory_agent'),    # INFORMATION_GATHERING
+    ('knowledge_agent', 'tag_agent', 'sentiment_agent'), # PRODUCT_INQUIRY
+    ('knowledge_agent', 'tag_agent'),                    # PRODUCT_RECOMMENDATION
+    ('sentiment_agent', 'tag_agent'),                    # PRICE_NEGOTIATION
+    ('memory_agent', 'sentiment_agent'),                 # ORDER_PROCESSING
+    ('knowledge_agent', 'sentiment_agent'),              # AFTER_SALES
+    ('sentiment_agent', 'memory_agent'),                 # CLOSING
+    (),                                                  # KNOWLEDGE_QUERY
+)
+
+_STATE_PROMPTS: Tuple[Tuple[str, ...], ...] = (
+    ChatAgent._get_greeting_prompts(),
+    ChatAgent._get_info_gathering_prompts(),
+    ChatAgent._get_product_inquiry_prompts(),
+    ChatAgent._get_recommendation_prompts(),
+    ChatAgent._get_negotiation_prompts(),
+    ChatAgent._get_order_prompts(),
+    ChatAgent._get_after_sales_prompts(),
+    ChatAgent._get_closing_prompts(),
+    (),
+)
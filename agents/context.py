@@ -0,0 +1,71 @@
+"""
+消息分析上下文
+同一条用户消息的预处理结果（小写文本、分词）在各分析智能体之间共享，每条消息只分词一次
+"""
+
+import os
+import logging
+import jieba
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+# 输入数据中携带分析上下文的键
+ANALYSIS_CONTEXT_KEY = 'analysis_context'
+
+# 进程启动时预加载分词词典，避免首条消息承担加载耗时（WARM_JIEBA=0可关闭）
+if os.getenv('WARM_JIEBA', '1') == '1':
+    jieba.initialize()
+
+_parallel_workers = 0
+
+
+def enable_parallel_cut(workers: int):
+    """
+    开启jieba多进程分词
+    
+    会fork子进程，每个进程只开启一次；jieba按行切分文本分发给子进程，
+    只适合批量处理等单次分词文本较长的场景，应在工作进程启动时调用，不要放在请求路径上。
+    """
+    global _parallel_workers
+    if workers <= 0 or _parallel_workers:
+        return
+    try:
+        jieba.enable_parallel(workers)
+        _parallel_workers = workers
+    except NotImplementedError as e:
+        logging.warning(f"jieba parallel mode not available: {e}")
+
+
+@lru_cache(maxsize=2048)
+def cut_words(text: str) -> Tuple[str, ...]:
+    """精确模式分词（关闭HMM新词发现），相同消息复用分词结果"""
+    return tuple(jieba.cut(text, HMM=False))
+
+
+@dataclass(slots=True)
+class AnalysisContext:
+    """单条消息的共享预处理结果"""
+    message: str
+    message_lower: str
+    _tokens: Optional[Tuple[str, ...]] = field(default=None, repr=False)   # 分词结果，首次访问时计算
+    
+    @classmethod
+    def from_message(cls, message: str) -> 'AnalysisContext':
+        return cls(message, message.lower())
+    
+    @property
+    def tokens(self) -> Tuple[str, ...]:
+        """分词结果（首次访问时计算）"""
+        if self._tokens is None:
+            self._tokens = cut_words(self.message)
+        return self._tokens
+
+
+def get_analysis_context(input_data: Dict[str, Any]) -> AnalysisContext:
+    """取输入数据携带的分析上下文，没有或与消息不一致时新建"""
+    message = input_data['message']
+    context = input_data.get(ANALYSIS_CONTEXT_KEY)
+    if context is None or context.message != message:
+        context = AnalysisContext.from_message(message)
+    return context
@@ -3,14 +3,30 @@
 基于RAGFlow实现知识检索和智能问答
 """
 
-import os
-import json
+import re
+import heapq
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import requests
-from typing import Dict, Any, List, Optional
+from collections import Counter, deque
+from functools import reduce
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import logging
 
 from .base_agent import BaseAgent
+from .semantic_cache import SemanticCache, SEMANTIC_CACHE_AVAILABLE
+from .utils import content_fingerprint, iso_now, json_dumps_bytes, json_loads
+
+# 尝试导入aiohttp（异步HTTP，连接复用）
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+    logging.warning("aiohttp not available, RAGFlow requests will run in worker threads")
 
 # 尝试导入RAGFlow SDK
 try:
@@ -20,6 +36,98 @@ except ImportError:
     RAGFLOW_AVAILABLE = False
     logging.warning("RAGFlow SDK not available, using fallback implementation")
 
+# 查询停用词
+_STOP_WORDS = frozenset({'的', '了', '在', '是', '我', '你', '他', '她', '它', '们', '这', '那', '些', '什么', '怎么', '哪里'})
+
+# 按知识类型的回答前缀
+_ANSWER_PREFIXES = {
+    'faq': '根据常见问题解答：',
+    'product': '关于该产品：',
+    'policy': '根据相关政策：'
+}
+
+
+def _context_features(context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    预计算排序用的上下文特征（每次查询计算一次）
+    
+    Returns:
+        user_tags: 用户标签集合
+        topics: 会话主题元组
+        recent_words: 最近3次查询各自的去重词元组
+    """
+    return {
+        'user_tags': frozenset(context.get('user_tags', ())),
+        'topics': tuple(context.get('session_topics', ())),
+        'recent_words': tuple(
+            tuple(dict.fromkeys(query.split()))
+            for query in context.get('recent_queries', [])[-3:]
+        )
+    }
+
+
+def _rank_results(results: List[Dict[str, Any]], features: Dict[str, Any],
+                  similarity_threshold: float, top_k: int) -> List[Dict[str, Any]]:
+    """
+    过滤、按上下文重新评分、去重并取前top_k个结果
+    
+    纯函数（不依赖智能体实例），可提交到进程池执行。
+    """
+    # 过滤低相关性结果
+    filtered_results = [
+        result for result in results 
+        if result.get('score', 0) >= similarity_threshold
+    ]
+    if not filtered_results:
+        return []
+    
+    # 基于上下文重新评分
+    scores = np.fromiter((result.get('score', 0) for result in filtered_results),
+                         dtype=np.float64, count=len(filtered_results))
+    scores = np.minimum(scores + _context_bonus(filtered_results, features), 1.0).tolist()
+    
+    # 单次遍历去重：相同内容只保留分数最高（同分取靠前）的一条
+    best = {}
+    for index, (result, score) in enumerate(zip(filtered_results, scores)):
+        content_hash = content_fingerprint(result.get('content', ''))
+        current = best.get(content_hash)
+        if current is None or score > current[0]:
+            best[content_hash] = (score, index)
+    
+    # 取前top_k（分数降序，同分保持原顺序），返回带新分数的副本，不改写输入
+    top = heapq.nlargest(top_k, best.values(), key=lambda item: (item[0], -item[1]))
+    return [{**filtered_results[index], 'score': score} for score, index in top]
+
+
+def _context_bonus(results: List[Dict[str, Any]], features: Dict[str, Any]) -> np.ndarray:
+    """批量计算上下文奖励分数"""
+    bonus = np.zeros(len(results))
+    contents = [result.get('content', '') for result in results]
+    
+    # 用户标签匹配
+    user_tags = features['user_tags']
+    
+    if 'price_sensitive' in user_tags:
+        bonus += [0.1 if '价格' in content else 0.0 for content in contents]
+    
+    if 'electronics_lover' in user_tags:
+        bonus += [0.1 if result.get('knowledge_type', '') == 'product' else 0.0 for result in results]
+    
+    # 会话主题匹配（复用入库时的小写内容，外层遍历较短的主题列表）
+    contents = [
+        result['_content_lower'] if '_content_lower' in result else content.lower()
+        for result, content in zip(results, contents)
+    ]
+    
+    for topic in features['topics']:
+        bonus += [0.05 if topic in content else 0.0 for content in contents]
+    
+    # 历史查询相关性（最近3次查询）
+    for words in features['recent_words']:
+        bonus += [0.03 if any(word in content for word in words) else 0.0 for content in contents]
+    
+    return np.minimum(bonus, 0.3)  # 最大奖励0.3
+
 
 class KnowledgeAgent(BaseAgent):
     """知识库智能体"""
@@ -32,6 +140,23 @@ class KnowledgeAgent(BaseAgent):
         self.api_endpoint = self.ragflow_config.get('api_endpoint', 'http://localhost:9380')
         self.api_key = self.ragflow_config.get('api_key', '')
         self.dataset_id = self.ragflow_config.get('dataset_id', '')
+        self.api_timeout = self.ragflow_config.get('timeout', 30)
+        self._headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        
+        # 共享HTTP会话（首次调用时创建，跨请求复用连接）
+        self._http_session = None
+        self._http_lock = asyncio.Lock()
+        
+        # 进程池：候选结果较多时将排序计算移出事件循环线程（0表示不启用）
+        cpu_workers = config.get('cpu_pool_workers', 0)
+        self._cpu_pool = ProcessPoolExecutor(max_workers=cpu_workers) if cpu_workers > 0 else None
+        self.cpu_offload_min_results = config.get('cpu_offload_min_results', 200)
+        
+        # 进行中的检索（相同知识库+查询的并发请求共用一次RAGFlow调用）
+        self._inflight_searches: Dict[Tuple[str, str], asyncio.Future] = {}
         
         # 知识库配置
         self.knowledge_bases = config.get('knowledge_bases', {})
@@ -56,8 +181,28 @@ class KnowledgeAgent(BaseAgent):
         # 本地知识库缓存
         self.local_knowledge_cache = {}
         
-        # 查询历史
-        self.query_history = []
+        # 语义缓存（相近问法复用RAGFlow检索结果）
+        semantic_config = config.get('semantic_cache', {})
+        if semantic_config.get('enabled', False) and SEMANTIC_CACHE_AVAILABLE:
+            self.semantic_cache = SemanticCache(
+                model_name=semantic_config.get('model', 'paraphrase-multilingual-MiniLM-L12-v2'),
+                threshold=semantic_config.get('threshold', 0.85),
+                ttl=semantic_config.get('ttl', 300),
+                max_entries=semantic_config.get('max_entries', 10000),
+                device=semantic_config.get('device') or None,
+                embedding_cache_size=semantic_config.get('embedding_cache_size', 2048),
+                quantize_threshold=semantic_config.get('quantize_threshold', 10000),
+                nlist=semantic_config.get('nlist', 256),
+                pq_m=semantic_config.get('pq_m', 48),
+                nprobe=semantic_config.get('nprobe', 8)
+            )
+        else:
+            self.semantic_cache = None
+        
+        # 查询历史（有界），及按知识库/用户的增量计数
+        self.query_history = deque(maxlen=max(1, config.get('history_max', 10000)))
+        self._kb_counter = Counter()
+        self._user_counter = Counter()
         
         # 知识类型映射
         self.knowledge_type_mapping = {
@@ -66,6 +211,13 @@ class KnowledgeAgent(BaseAgent):
             'policy': ['购买政策', '退换货政策', '服务条款'],
             'script': ['销售话术', '客服话术', '沟通技巧']
         }
+        
+        # 每种知识类型的关键词编译为一个正则选择分支（统一小写，按类型优先级排列）
+        self._type_patterns = tuple(
+            (knowledge_type, re.compile('|'.join(re.escape(keyword.lower()) for keyword in keywords)))
+            for knowledge_type, keywords in self.knowledge_type_mapping.items()
+            if keywords
+        )
     
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """验证输入数据"""
@@ -84,23 +236,30 @@ class KnowledgeAgent(BaseAgent):
             'query': query,
             'user_id': user_id,
             'knowledge_base': knowledge_base,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': time.time_ns()
         }
-        self.query_history.append(query_record)
+        self._record_query(query_record)
         
         # 1. 查询预处理
         processed_query = self._preprocess_query(query, context)
         
         # 2. 知识检索
         if self.ragflow_client:
-            # 使用RAGFlow进行检索
-            search_results = await self._search_with_ragflow(processed_query, knowledge_base)
+            # 使用RAGFlow进行检索（优先查语义缓存）
+            search_results = await self._search_with_cache(processed_query, knowledge_base)
         else:
             # 使用本地知识库
             search_results = await self._search_local_knowledge(processed_query, knowledge_base)
         
-        # 3. 结果排序和过滤
-        filtered_results = self._filter_and_rank_results(search_results, query, context)
+        # 3. 结果排序和过滤（上下文特征只计算一次；结果较多时在进程池中计算）
+        features = _context_features(context)
+        if self._cpu_pool and len(search_results) >= self.cpu_offload_min_results:
+            filtered_results = await asyncio.get_running_loop().run_in_executor(
+                self._cpu_pool, _rank_results,
+                search_results, features, self.similarity_threshold, self.top_k
+            )
+        else:
+            filtered_results = _rank_results(search_results, features, self.similarity_threshold, self.top_k)
         
         # 4. 生成回答
         answer = await self._generate_answer(query, filtered_results, context)
@@ -111,13 +270,16 @@ class KnowledgeAgent(BaseAgent):
         result = {
             'query': query,
             'answer': final_answer,
-            'knowledge_sources': filtered_results,
+            'knowledge_sources': [
+                {key: value for key, value in source.items() if key != '_content_lower'}
+                for source in filtered_results
+            ],
             'knowledge_base': knowledge_base,
             'confidence': self._calculate_confidence(filtered_results, answer),
             'search_stats': {
                 'total_results': len(search_results),
                 'filtered_results': len(filtered_results),
-                'search_time': datetime.now().isoformat()
+                'search_time': iso_now()
             }
         }
         
@@ -125,14 +287,26 @@ class KnowledgeAgent(BaseAgent):
         
         return result
     
+    def _record_query(self, query_record: Dict[str, Any]):
+        """记录查询历史并同步更新计数（淘汰的旧记录同时扣减）"""
+        if len(self.query_history) == self.query_history.maxlen:
+            evicted = self.query_history.popleft()
+            for counter, key in ((self._kb_counter, evicted['knowledge_base']),
+                                 (self._user_counter, evicted['user_id'])):
+                counter[key] -= 1
+                if counter[key] <= 0:
+                    del counter[key]
+        
+        self.query_history.append(query_record)
+        self._kb_counter[query_record['knowledge_base']] += 1
+        self._user_counter[query_record['user_id']] += 1
+    
     def _preprocess_query(self, query: str, context: Dict[str, Any]) -> str:
         """查询预处理"""
         processed_query = query.strip()
         
-        # 移除停用词和无意义词汇
-        stop_words = {'的', '了', '在', '是', '我', '你', '他', '她', '它', '们', '这', '那', '些', '什么', '怎么', '哪里'}
-        words = processed_query.split()
-        words = [word for word in words if word not in stop_words]
+        # 移除停用词和无意义词汇（全部为停用词时保留原查询）
+        processed_query = ' '.join(word for word in processed_query.split() if word not in _STOP_WORDS) or processed_query
         
         # 添加上下文信息
         if context.get('user_tags'):
@@ -153,32 +327,76 @@ class KnowledgeAgent(BaseAgent):
         
         return processed_query
     
+    async def _search_with_cache(self, query: str, knowledge_base: str) -> List[Dict[str, Any]]:
+        """经语义缓存的RAGFlow检索"""
+        if not self.semantic_cache:
+            return await self._search_coalesced(query, knowledge_base)
+        
+        try:
+            embedding = await self.semantic_cache.embed(query)
+        except Exception as e:
+            self.logger.error(f"Semantic cache embedding failed: {e}")
+            return await self._search_coalesced(query, knowledge_base)
+        
+        cached = self.semantic_cache.lookup(knowledge_base, embedding)
+        if cached is not None:
+            self.logger.debug(f"Semantic cache hit: {query[:50]}")
+            return cached
+        
+        results = await self._search_coalesced(query, knowledge_base)
+        if results:
+            self.semantic_cache.store(knowledge_base, embedding, results)
+        return results
+    
+    async def _search_coalesced(self, query: str, knowledge_base: str) -> List[Dict[str, Any]]:
+        """合并并发的相同检索请求"""
+        key = (knowledge_base, query)
+        task = self._inflight_searches.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._search_with_ragflow(query, knowledge_base))
+            self._inflight_searches[key] = task
+            task.add_done_callback(lambda _: self._inflight_searches.pop(key, None))
+        
+        # shield: 单个调用方取消不影响其他等待者
+        return await asyncio.shield(task)
+    
     async def _search_with_ragflow(self, query: str, knowledge_base: str) -> List[Dict[str, Any]]:
         """使用RAGFlow进行知识检索"""
         try:
             # 使用RAGFlow API进行检索
             search_params = {
                 'question': query,
-                'dataset_ids': [self.dataset_id] if self.dataset_id else [],
                 'top_k': self.top_k,
                 'similarity_threshold': self.similarity_threshold
             }
             
-            # 调用RAGFlow检索API
-            response = await self._call_ragflow_api('/v1/retrieval', search_params)
+            # 调用RAGFlow检索API（知识库对应多个数据集时并发检索后合并）
+            dataset_ids = self._resolve_dataset_ids(knowledge_base)
+            if len(dataset_ids) > 1:
+                responses = await asyncio.gather(*[
+                    self._call_ragflow_api('/v1/retrieval', {**search_params, 'dataset_ids': [dataset_id]})
+                    for dataset_id in dataset_ids
+                ])
+            else:
+                responses = [await self._call_ragflow_api('/v1/retrieval', {**search_params, 'dataset_ids': dataset_ids})]
             
-            if response and 'data' in response:
+            responses = [response for response in responses if response and 'data' in response]
+            if responses:
                 results = []
-                for item in response['data']:
-                    result = {
-                        'content': item.get('content', ''),
-                        'title': item.get('title', ''),
-                        'source': item.get('source', ''),
-                        'score': item.get('score', 0.0),
-                        'metadata': item.get('metadata', {}),
-                        'knowledge_type': self._classify_knowledge_type(item.get('content', ''))
-                    }
-                    results.append(result)
+                for response in responses:
+                    for item in response['data']:
+                        content = item.get('content', '')
+                        content_lower = content.lower()
+                        result = {
+                            'content': content,
+                            'title': item.get('title', ''),
+                            'source': item.get('source', ''),
+                            'score': item.get('score', 0.0),
+                            'metadata': item.get('metadata', {}),
+                            'knowledge_type': self._classify_knowledge_type(content, content_lower),
+                            '_content_lower': content_lower  # 供后续阶段复用，输出前移除
+                        }
+                        results.append(result)
                 
                 return results
             
@@ -189,62 +407,131 @@ class KnowledgeAgent(BaseAgent):
             # 回退到本地搜索
             return await self._search_local_knowledge(query, knowledge_base)
     
+    def _resolve_dataset_ids(self, knowledge_base: str) -> List[str]:
+        """
+        解析知识库对应的RAGFlow数据集ID
+        
+        knowledge_bases中的条目可以是数据集ID列表，或包含dataset_ids/dataset_id的配置字典；
+        未配置时使用默认数据集。
+        """
+        entry = self.knowledge_bases.get(knowledge_base)
+        if isinstance(entry, (list, tuple)):
+            dataset_ids = list(entry)
+        elif isinstance(entry, dict):
+            dataset_ids = list(entry.get('dataset_ids') or ([entry['dataset_id']] if entry.get('dataset_id') else []))
+        else:
+            dataset_ids = []
+        
+        if not dataset_ids and self.dataset_id:
+            dataset_ids = [self.dataset_id]
+        return dataset_ids
+    
     async def _call_ragflow_api(self, endpoint: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """调用RAGFlow API"""
         try:
             url = f"{self.api_endpoint}{endpoint}"
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
             
-            response = requests.post(url, json=params, headers=headers, timeout=30)
-            response.raise_for_status()
+            if not AIOHTTP_AVAILABLE:
+                return await asyncio.to_thread(self._post_sync, url, params)
             
-            return response.json()
+            session = await self._get_http_session()
+            async with session.post(url, data=json_dumps_bytes(params), headers=self._headers) as response:
+                response.raise_for_status()
+                return json_loads(await response.read())
             
         except Exception as e:
             self.logger.error(f"RAGFlow API call failed: {e}")
             return None
     
+    def _post_sync(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """同步POST请求（aiohttp不可用时在线程中执行）"""
+        response = requests.post(url, data=json_dumps_bytes(params), headers=self._headers, timeout=self.api_timeout)
+        response.raise_for_status()
+        return json_loads(response.content)
+    
+    async def _get_http_session(self):
+        """获取共享的HTTP会话"""
+        if self._http_session is None or self._http_session.closed:
+            async with self._http_lock:
+                if self._http_session is None or self._http_session.closed:
+                    connector = aiohttp.TCPConnector(limit=64, limit_per_host=32, keepalive_timeout=60)
+                    self._http_session = aiohttp.ClientSession(
+                        connector=connector,
+                        timeout=aiohttp.ClientTimeout(total=self.api_timeout)
+                    )
+        return self._http_session
+    
+    async def close(self):
+        """关闭共享HTTP会话和进程池"""
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
+        if self._cpu_pool:
+            self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self._cpu_pool = None
+    
     async def _search_local_knowledge(self, query: str, knowledge_base: str) -> List[Dict[str, Any]]:
         """本地知识库搜索（备用方案）"""
         results = []
         
         # 从Django模型中获取知识
         try:
-            from backend.apps.knowledge.models import FAQ, Product, Script, Document
+            from django.contrib.postgres.search import SearchQuery, SearchRank
+            from backend.apps.knowledge.models import FAQ, Product, segment_for_search
+            from asgiref.sync import sync_to_async
             
-            # 搜索FAQ
-            faqs = FAQ.objects.filter(
-                question__icontains=query,
+            # 分词后按任一词命中构造全文检索条件（走search_vector的GIN索引）
+            terms = [term for term in segment_for_search(query).split() if term not in _STOP_WORDS]
+            if not terms:
+                return results
+            search_query = reduce(lambda a, b: a | b, (SearchQuery(term, config='simple') for term in terms))
+            rank = SearchRank('search_vector', search_query)
+            
+            # 只取结果用到的列（分类名随主表一次JOIN取出），不实例化模型
+            faq_qs = FAQ.objects.filter(
+                search_vector=search_query,
                 is_active=True
-            ).order_by('-priority')[:self.top_k//2]
+            ).annotate(rank=rank).order_by('-rank', '-priority').values(
+                'id', 'question', 'answer', 'category__name'
+            )[:self.top_k//2]
+            
+            product_qs = Product.objects.filter(
+                search_vector=search_query,
+                status='active'
+            ).annotate(rank=rank).order_by('-rank').values(
+                'id', 'name', 'description', 'price', 'category__name'
+            )[:self.top_k//2]
+            
+            # 两个查询并发执行
+            faqs, products = await asyncio.gather(
+                sync_to_async(list)(faq_qs),
+                sync_to_async(list)(product_qs)
+            )
             
+            # 搜索FAQ
             for faq in faqs:
+                content = f"问题：{faq['question']}\n答案：{faq['answer']}"
                 results.append({
-                    'content': f"问题：{faq.question}\n答案：{faq.answer}",
-                    'title': faq.question,
+                    'content': content,
+                    'title': faq['question'],
                     'source': 'FAQ',
                     'score': 0.8,  # 默认分数
-                    'metadata': {'category': faq.category, 'faq_id': faq.id},
-                    'knowledge_type': 'faq'
+                    'metadata': {'category': faq['category__name'], 'faq_id': faq['id']},
+                    'knowledge_type': 'faq',
+                    '_content_lower': content.lower()
                 })
             
             # 搜索产品信息
-            products = Product.objects.filter(
-                name__icontains=query,
-                status='active'
-            )[:self.top_k//2]
-            
             for product in products:
+                content = f"商品：{product['name']}\n描述：{product['description']}\n价格：{product['price']}"
                 results.append({
-                    'content': f"商品：{product.name}\n描述：{product.description}\n价格：{product.price}",
-                    'title': product.name,
+                    'content': content,
+                    'title': product['name'],
                     'source': 'Product',
                     'score': 0.75,
-                    'metadata': {'category': product.category, 'product_id': product.id},
-                    'knowledge_type': 'product'
+                    'metadata': {'category': product['category__name'], 'product_id': product['id']},
+                    'knowledge_type': 'product',
+                    '_content_lower': content.lower()
                 })
             
         except Exception as e:
@@ -252,12 +539,13 @@ class KnowledgeAgent(BaseAgent):
         
         return results
     
-    def _classify_knowledge_type(self, content: str) -> str:
+    def _classify_knowledge_type(self, content: str, content_lower: Optional[str] = None) -> str:
         """分类知识类型"""
-        content_lower = content.lower()
+        if content_lower is None:
+            content_lower = content.lower()
         
-        for knowledge_type, keywords in self.knowledge_type_mapping.items():
-            if any(keyword in content_lower for keyword in keywords):
+        for knowledge_type, pattern in self._type_patterns:
+            if pattern.search(content_lower):
                 return knowledge_type
         
         return 'general'
@@ -265,64 +553,7 @@ class KnowledgeAgent(BaseAgent):
     def _filter_and_rank_results(self, results: List[Dict[str, Any]], 
                                 query: str, context: Dict[str, Any]) -> List[Dict[str, Any]]:
         """过滤和排序搜索结果"""
-        if not results:
-            return []
-        
-        # 过滤低相关性结果
-        filtered_results = [
-            result for result in results 
-            if result.get('score', 0) >= self.similarity_threshold
-        ]
-        
-        # 基于上下文重新评分
-        for result in filtered_results:
-            original_score = result.get('score', 0)
-            context_bonus = self._calculate_context_bonus(result, context)
-            result['score'] = min(original_score + context_bonus, 1.0)
-        
-        # 按分数排序
-        filtered_results.sort(key=lambda x: x.get('score', 0), reverse=True)
-        
-        # 去重
-        seen_content = set()
-        unique_results = []
-        for result in filtered_results:
-            content_hash = hash(result.get('content', ''))
-            if content_hash not in seen_content:
-                seen_content.add(content_hash)
-                unique_results.append(result)
-        
-        return unique_results[:self.top_k]
-    
-    def _calculate_context_bonus(self, result: Dict[str, Any], context: Dict[str, Any]) -> float:
-        """计算上下文奖励分数"""
-        bonus = 0.0
-        
-        # 用户标签匹配
-        user_tags = context.get('user_tags', [])
-        result_type = result.get('knowledge_type', '')
-        
-        if 'price_sensitive' in user_tags and '价格' in result.get('content', ''):
-            bonus += 0.1
-        
-        if 'electronics_lover' in user_tags and result_type == 'product':
-            bonus += 0.1
-        
-        # 会话主题匹配
-        session_topics = context.get('session_topics', [])
-        content = result.get('content', '').lower()
-        
-        for topic in session_topics:
-            if topic in content:
-                bonus += 0.05
-        
-        # 历史查询相关性
-        recent_queries = context.get('recent_queries', [])
-        for query in recent_queries[-3:]:  # 最近3次查询
-            if any(word in content for word in query.split()):
-                bonus += 0.03
-        
-        return min(bonus, 0.3)  # 最大奖励0.3
+        return _rank_results(results, _context_features(context), self.similarity_threshold, self.top_k)
     
     async def _generate_answer(self, query: str, knowledge_sources: List[Dict[str, Any]], 
                              context: Dict[str, Any]) -> str:
@@ -330,24 +561,12 @@ class KnowledgeAgent(BaseAgent):
         if not knowledge_sources:
             return self._get_fallback_answer(query, context)
         
-        # 构建回答
-        answer_parts = []
-        
-        # 主要回答（来自最相关的知识源）
+        # 主要回答（来自最相关的知识源），根据知识类型添加前缀
         primary_source = knowledge_sources[0]
-        primary_content = primary_source.get('content', '')
-        
-        # 根据知识类型调整回答格式
-        knowledge_type = primary_source.get('knowledge_type', 'general')
-        
-        if knowledge_type == 'faq':
-            answer_parts.append(f"根据常见问题解答：{primary_content}")
-        elif knowledge_type == 'product':
-            answer_parts.append(f"关于该产品：{primary_content}")
-        elif knowledge_type == 'policy':
-            answer_parts.append(f"根据相关政策：{primary_content}")
-        else:
-            answer_parts.append(primary_content)
+        answer_parts = [
+            _ANSWER_PREFIXES.get(primary_source.get('knowledge_type', 'general'), ''),
+            primary_source.get('content', '')
+        ]
         
         # 补充信息（来自其他相关知识源）
         if len(knowledge_sources) > 1:
@@ -358,12 +577,14 @@ class KnowledgeAgent(BaseAgent):
                     supplementary_info.append(content)
             
             if supplementary_info:
-                answer_parts.append(f"\n\n补充信息：\n{'; '.join(supplementary_info)}")
+                answer_parts.append("\n\n补充信息：\n")
+                answer_parts.append('; '.join(supplementary_info))
         
         # 添加建议
         suggestions = self._generate_suggestions(query, knowledge_sources, context)
         if suggestions:
-            answer_parts.append(f"\n\n建议：{suggestions}")
+            answer_parts.append("\n\n建议：")
+            answer_parts.append(suggestions)
         
         return ''.join(answer_parts)
     
@@ -457,7 +678,7 @@ class KnowledgeAgent(BaseAgent):
         knowledge_item = {
             'content': content,
             'metadata': metadata or {},
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': time.time_ns(),
             'type': knowledge_type
         }
         
@@ -471,18 +692,16 @@ class KnowledgeAgent(BaseAgent):
         
         total_queries = len(self.query_history)
         
-        # 统计查询频率
-        from collections import Counter
-        knowledge_base_counts = Counter(q['knowledge_base'] for q in self.query_history)
-        user_counts = Counter(q['user_id'] for q in self.query_history)
-        
-        # 最近查询
-        recent_queries = self.query_history[-10:]
+        # 最近查询（时间戳在此转换为ISO格式）
+        recent_queries = [
+            {**record, 'timestamp': datetime.fromtimestamp(record['timestamp'] / 1e9).isoformat()}
+            for record in list(self.query_history)[-10:]
+        ]
         
         return {
             'total_queries': total_queries,
-            'knowledge_base_distribution': dict(knowledge_base_counts),
-            'top_users': dict(user_counts.most_common(5)),
+            'knowledge_base_distribution': dict(self._kb_counter),
+            'top_users': dict(self._user_counter.most_common(5)),
             'recent_queries': recent_queries,
             'average_queries_per_hour': self._calculate_query_rate()
         }
@@ -492,14 +711,8 @@ class KnowledgeAgent(BaseAgent):
         if len(self.query_history) < 2:
             return 0.0
         
-        try:
-            first_query = datetime.fromisoformat(self.query_history[0]['timestamp'])
-            last_query = datetime.fromisoformat(self.query_history[-1]['timestamp'])
-            
-            hours_diff = (last_query - first_query).total_seconds() / 3600
-            if hours_diff > 0:
-                return len(self.query_history) / hours_diff
-        except:
-            pass
+        hours_diff = (self.query_history[-1]['timestamp'] - self.query_history[0]['timestamp']) / 3.6e12
+        if hours_diff > 0:
+            return len(self.query_history) / hours_diff
         
-        return 0.0 
\ No newline at end of file
+        return 0.0
\ No newline at end of file
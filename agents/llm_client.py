@@ -0,0 +1,114 @@
+"""
+批处理LLM客户端
+将并发会话的生成请求提交给支持连续批处理的OpenAI兼容推理服务（如vLLM），由服务端合批调度
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .batching import Batch, MicroBatcher
+
+try:
+    from openai import AsyncOpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+    logging.warning("OpenAI SDK not available, batching LLM client disabled")
+
+
+class BatchingLLMClient:
+    """
+    批处理LLM客户端
+    
+    默认（max_wait_ms为0）每个请求直接发出，由服务端的连续批处理合批；
+    max_wait_ms大于0时先在客户端等待窗口内汇聚请求再同时发出，只适合按到达时刻调度批次的服务端。
+    """
+    
+    def __init__(self, base_url: str, api_key: str, model: str,
+                 temperature: float = 0.7, max_tokens: int = 1000,
+                 max_batch: int = 32, max_wait_ms: float = 0.0,
+                 extra_body: Optional[Dict[str, Any]] = None):
+        self.client = AsyncOpenAI(base_url=base_url, api_key=api_key or 'EMPTY')
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.extra_body = extra_body or None
+        self.logger = logging.getLogger("agent.llm_client")
+        
+        self._batcher = None
+        if max_wait_ms > 0:
+            self._batcher = MicroBatcher(self._submit_batch, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    
+    async def generate(self, messages: List[Dict[str, str]]) -> str:
+        """
+        提交一次对话生成请求
+        
+        Args:
+            messages: OpenAI格式的消息列表
+        
+        Returns:
+            生成的回复文本
+        """
+        if self._batcher is None:
+            return await self._request(messages)
+        return await self._batcher.submit(messages)
+    
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        流式生成回复，逐段返回文本
+        
+        流式请求不经过批次队列，直接提交，由推理服务的连续批处理与其他请求合批。
+        
+        Args:
+            messages: OpenAI格式的消息列表
+        
+        Yields:
+            增量生成的文本片段
+        """
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            extra_body=self.extra_body,
+            stream=True
+        )
+        async for chunk in response:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+    
+    async def _submit_batch(self, batch: Batch):
+        """同时发出整批请求，由推理服务在同一调度迭代中合批处理"""
+        for messages, future in batch:
+            self._batcher.spawn(self._complete(messages, future))
+        self.logger.debug(f"Submitted LLM batch of {len(batch)} requests")
+    
+    async def _request(self, messages: List[Dict[str, str]]) -> str:
+        """发出单个生成请求"""
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            extra_body=self.extra_body
+        )
+        return response.choices[0].message.content or ''
+    
+    async def _complete(self, messages: List[Dict[str, str]], future: asyncio.Future):
+        """执行单个请求并回填结果"""
+        try:
+            result = await self._request(messages)
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+    
+    async def close(self):
+        """停止分发并关闭底层连接"""
+        if self._batcher is not None:
+            await self._batcher.close()
+        await self.client.close()
@@ -3,13 +3,252 @@
 管理对话历史，维护上下文信息，提供上下文感知的对话能力
 """
 
-import json
-from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+import re
+import sys
+import time
+import heapq
+import bisect
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
 from collections import deque
-import hashlib
+from dataclasses import dataclass, field
+
+import jieba
+import numpy as np
 
 from .base_agent import BaseAgent
+from .utils import KeywordMatcher, TTLCache, record_hash
+
+# 尝试导入Hyperscan（DFA多正则单次扫描，无回溯）
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+    logging.warning("hyperscan not available, using re for entity extraction")
+
+# 实体提取正则（模块加载时编译一次）
+PHONE_RE = re.compile(r'1[3-9]\d{9}')
+EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+MONEY_RE = re.compile(r'(\d+(\.\d{1,2})?)\s*(元|块|万|千)')
+
+# 实体类型及其正则，下标即Hyperscan中的表达式ID
+ENTITY_PATTERNS = (('phone', PHONE_RE), ('email', EMAIL_RE), ('amount', MONEY_RE))
+
+# 礼貌用语及其首字（首字都不出现的消息无需逐词查找）
+POLITE_WORDS = ('请', '谢谢', '不好意思', '麻烦', '劳烦')
+POLITE_FIRST_CHARS = frozenset(word[0] for word in POLITE_WORDS)
+
+def intern_label(value: Any) -> Any:
+    """驻留重复出现的短字符串（消息类型、会话ID等），大量记录共享同一对象"""
+    return sys.intern(value) if type(value) is str else value
+
+
+# 礼貌程度分档（按礼貌用语占比超过0.1、0.3的档数取值）
+POLITENESS_TIERS = ('low', 'medium', 'high')
+
+# 按消息数量划分的对话状态：<=2、<=5、<=10、更多
+STATE_MESSAGE_BOUNDS = (2, 5, 10)
+STATES_BY_MESSAGE_COUNT = ('greeting', 'information_gathering', 'product_recommendation', 'order_processing')
+
+
+class EntityScanner:
+    """
+    实体扫描器
+    
+    Hyperscan可用时先用一次DFA扫描找出可能命中的实体类型（预过滤模式，
+    命中集合是精确结果的超集），再只对这些类型执行re.search确认，
+    结果与逐个re.search完全一致；大多数不含实体的消息只需一次扫描。
+    """
+    
+    def __init__(self):
+        self._database = None
+        self._scratch = None
+        if HYPERSCAN_AVAILABLE:
+            try:
+                database = hyperscan.Database()
+                # UCP使\d、\s按Unicode语义匹配；Unicode \b不受支持，由预过滤模式放宽后交给re确认
+                flags = (hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+                         | hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_SINGLEMATCH)
+                database.compile(
+                    expressions=[pattern.pattern.encode('utf-8') for _, pattern in ENTITY_PATTERNS],
+                    ids=list(range(len(ENTITY_PATTERNS))),
+                    elements=len(ENTITY_PATTERNS),
+                    flags=[flags] * len(ENTITY_PATTERNS)
+                )
+                self._scratch = hyperscan.Scratch(database)
+                self._database = database
+            except hyperscan.error as e:
+                logging.warning(f"Hyperscan compile failed, using re for entity extraction: {e}")
+    
+    def _candidates(self, message: str) -> List[int]:
+        """可能命中的实体正则下标"""
+        if self._database is None:
+            return list(range(len(ENTITY_PATTERNS)))
+        
+        hits = set()
+        
+        def on_match(pattern_id, start, end, flags, context):
+            hits.add(pattern_id)
+        
+        self._database.scan(message.encode('utf-8'), match_event_handler=on_match, scratch=self._scratch)
+        return sorted(hits)
+    
+    def scan(self, message: str) -> Dict[str, str]:
+        """返回 实体类型 -> 首个匹配文本"""
+        entities = {}
+        for pattern_id in self._candidates(message):
+            entity_type, pattern = ENTITY_PATTERNS[pattern_id]
+            match = pattern.search(message)
+            if match:
+                entities[entity_type] = match.group()
+        return entities
+
+
+def index_tokens(text: str) -> frozenset:
+    """分词（搜索引擎模式）并去掉标点和单字，用于长期记忆倒排索引"""
+    return frozenset(
+        token for token in jieba.cut_for_search(text)
+        if len(token) > 1 and any(char.isalnum() for char in token)
+    )
+
+
+class LongMemoryIndex:
+    """单个用户长期记忆的去重哈希表和词项倒排索引"""
+    
+    def __init__(self):
+        self.tokens: Dict[str, frozenset] = {}   # 记录哈希 -> 记录词项
+        self.postings: Dict[str, set] = {}       # 词项 -> 记录哈希
+        self.created: Dict[str, float] = {}      # 记录哈希 -> 写入时间（epoch秒，过期清理用）
+    
+    def __contains__(self, record_hash: str) -> bool:
+        return record_hash in self.tokens
+    
+    def add(self, record: Dict[str, Any], created: float):
+        """索引记录中各条信息的句子内容和关键词"""
+        self.created[record['hash']] = created
+        tokens = set()
+        for items in record['info'].values():
+            for item in items:
+                tokens.update(index_tokens(item['content']))
+                tokens.add(item['keyword'])
+        
+        self.tokens[record['hash']] = frozenset(tokens)
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(record['hash'])
+    
+    def remove(self, record: Dict[str, Any]):
+        """删除记录的索引"""
+        self.created.pop(record['hash'], None)
+        for token in self.tokens.pop(record['hash'], ()):
+            hashes = self.postings.get(token)
+            if hashes is not None:
+                hashes.discard(record['hash'])
+                if not hashes:
+                    del self.postings[token]
+    
+    def search(self, tokens) -> set:
+        """返回包含任一词项的记录哈希"""
+        matched = set()
+        for token in tokens:
+            hashes = self.postings.get(token)
+            if hashes:
+                matched |= hashes
+        return matched
+
+
+# 短期记忆标志位
+FLAG_QUESTION = 1
+FLAG_POLITE = 2
+
+
+class ShortMemory:
+    """
+    用户短期记忆（列式环形缓冲）
+    
+    各字段按列存放，满后覆盖最旧的一条；行为统计只读取数值列做向量归约，
+    需要完整消息记录时再按行组装。
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = max(0, capacity)
+        self.size = 0
+        self.head = 0
+        # 对象列
+        self.messages: List[Optional[str]] = [None] * self.capacity
+        self.types: List[Optional[str]] = [None] * self.capacity
+        self.timestamps: List[Any] = [None] * self.capacity
+        self.session_ids: List[Any] = [None] * self.capacity
+        self.metadata: List[Any] = [None] * self.capacity
+        self.tokens: List[frozenset] = [frozenset()] * self.capacity  # 用户消息的词项
+        # 数值列
+        self.is_user = np.zeros(self.capacity, dtype=np.bool_)
+        self.lengths = np.zeros(self.capacity, dtype=np.int32)
+        self.flags = np.zeros(self.capacity, dtype=np.uint8)
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def append(self, message_record: Dict[str, Any], tokens: frozenset):
+        """写入一条消息，满后覆盖最旧的一条"""
+        if not self.capacity:
+            return
+        
+        slot = self.head
+        message = message_record['message']
+        self.messages[slot] = message
+        self.types[slot] = message_record['type']
+        self.timestamps[slot] = message_record['timestamp']
+        self.session_ids[slot] = message_record['session_id']
+        self.metadata[slot] = message_record['metadata']
+        self.tokens[slot] = tokens
+        
+        self.is_user[slot] = message_record['type'] == 'user'
+        self.lengths[slot] = len(message)
+        flags = 0
+        if '?' in message or '？' in message:
+            flags |= FLAG_QUESTION
+        if not POLITE_FIRST_CHARS.isdisjoint(message) and any(word in message for word in POLITE_WORDS):
+            flags |= FLAG_POLITE
+        self.flags[slot] = flags
+        
+        self.head = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+    
+    def _recent_slots(self, count: int) -> List[int]:
+        """最近 count 条消息的槽位（按时间先后）"""
+        count = min(count, self.size)
+        start = (self.head - count) % self.capacity if count else 0
+        return [(start + offset) % self.capacity for offset in range(count)]
+    
+    def recent(self, count: int) -> List[Dict[str, Any]]:
+        """最近 count 条消息记录"""
+        return [
+            {
+                'message': self.messages[slot],
+                'type': self.types[slot],
+                'timestamp': self.timestamps[slot],
+                'session_id': self.session_ids[slot],
+                'metadata': self.metadata[slot]
+            }
+            for slot in self._recent_slots(count)
+        ]
+    
+    def recent_tokens(self, count: int) -> List[frozenset]:
+        """最近 count 条消息的词项"""
+        return [self.tokens[slot] for slot in self._recent_slots(count)]
+
+
+@dataclass(slots=True)
+class SessionContext:
+    """单个会话的上下文"""
+    start_time: float                  # 会话开始时间（epoch秒）
+    last_update: float                 # 最近一条消息时间（epoch秒）
+    message_count: int = 0
+    topics: Dict[str, None] = field(default_factory=dict)    # 按出现顺序去重的主题（有序集合）
+    entities: Dict[str, str] = field(default_factory=dict)
+    flow: deque = field(default_factory=lambda: deque(maxlen=500))  # (消息类型ID, 时间戳, 主题ID)
 
 
 class MemoryAgent(BaseAgent):
@@ -25,9 +264,21 @@ class MemoryAgent(BaseAgent):
         self.memory_decay_hours = config.get('memory_decay_hours', 24)  # 记忆衰减时间
         
         # 内存存储（实际应用中应该使用数据库）
-        self.short_memory: Dict[str, deque] = {}  # 用户短期记忆
-        self.long_memory: Dict[str, List] = {}    # 用户长期记忆
-        self.session_context: Dict[str, Dict] = {}  # 会话上下文
+        self.short_memory: Dict[str, ShortMemory] = {}  # 用户短期记忆
+        self.long_memory: Dict[str, deque] = {}   # 用户长期记忆（环形缓冲，满后淘汰最旧）
+        self._long_memory_index: Dict[str, LongMemoryIndex] = {}  # 用户长期记忆的去重哈希和倒排索引
+        # 长期记忆过期最小堆：(写入时间, 用户ID, 记录哈希)，已被容量淘汰的条目惰性跳过
+        self._expiry_heap: List[Tuple[float, str, str]] = []
+        self._expiry_compact_at = 1024
+        
+        # 用户画像中来自长期记忆的部分：按长期记忆版本号缓存，长期记忆变化时版本号递增
+        self._long_memory_versions: Dict[str, int] = {}
+        self._profile_cache = TTLCache(maxsize=config.get('profile_cache_size', 1024), ttl=3600)
+        self.session_context: Dict[str, SessionContext] = {}  # 会话上下文
+        self._user_sessions: Dict[str, set] = {}  # 用户ID -> 会话键
+        # 对话流程中的消息类型和主题以整数ID存放
+        self._label_ids: Dict[str, int] = {}
+        self._labels: List[str] = []
         
         # 重要信息关键词
         self.important_keywords = {
@@ -39,6 +290,21 @@ class MemoryAgent(BaseAgent):
             'product_interests': ['关注', '了解', '咨询', '询问', '感兴趣']
         }
         
+        # 主题关键词
+        self.topic_keywords = {
+            'product': ['商品', '产品', '手机', '电脑', '衣服', '鞋子'],
+            'price': ['价格', '多少钱', '便宜', '贵', '优惠', '折扣'],
+            'shipping': ['快递', '配送', '邮费', '运费', '发货', '物流'],
+            'service': ['服务', '客服', '售后', '维修', '保修'],
+            'payment': ['付款', '支付', '结账', '订单', '下单'],
+            'complaint': ['投诉', '问题', '故障', '不满意', '退货']
+        }
+        
+        # 关键词匹配器（初始化时构建一次）
+        self._important_matcher = KeywordMatcher(self.important_keywords)
+        self._topic_matcher = KeywordMatcher(self.topic_keywords)
+        self._entity_scanner = EntityScanner()
+        
         # 会话状态
         self.conversation_states = [
             'greeting', 'information_gathering', 'product_recommendation',
@@ -54,9 +320,14 @@ class MemoryAgent(BaseAgent):
         """处理对话并更新记忆"""
         user_id = input_data['user_id']
         message = input_data['message']
-        session_id = input_data.get('session_id', 'default')
-        message_type = input_data.get('message_type', 'user')  # user/assistant
-        timestamp = input_data.get('timestamp', datetime.now().isoformat())
+        session_id = intern_label(input_data.get('session_id', 'default'))
+        message_type = intern_label(input_data.get('message_type', 'user'))  # user/assistant
+        # 本次处理统一使用同一个时间戳
+        now = time.time()
+        now_iso = datetime.fromtimestamp(now).isoformat()
+        timestamp = input_data.get('timestamp', now_iso)
+        # 小写文本只计算一次，供各提取步骤复用
+        message_lower = message.lower()
         
         # 创建消息记录
         message_record = {
@@ -71,12 +342,12 @@ class MemoryAgent(BaseAgent):
         self._update_short_memory(user_id, message_record)
         
         # 提取并更新重要信息到长期记忆
-        important_info = self._extract_important_info(message, message_type)
+        important_info = self._extract_important_info(message, message_type, now_iso)
         if important_info:
-            self._update_long_memory(user_id, important_info)
+            self._update_long_memory(user_id, important_info, now_iso, now)
         
         # 更新会话上下文
-        self._update_session_context(user_id, session_id, message_record)
+        self._update_session_context(user_id, session_id, message_record, now, message_lower)
         
         # 生成上下文摘要
         context = self._generate_context(user_id, session_id)
@@ -91,7 +362,7 @@ class MemoryAgent(BaseAgent):
             'next_intent': next_intent,
             'conversation_state': self._get_conversation_state(user_id, session_id),
             'memory_stats': self._get_memory_stats(user_id),
-            'updated_at': datetime.now().isoformat()
+            'updated_at': now_iso
         }
         
         self.logger.info(f"Updated memory for user {user_id}, session {session_id}")
@@ -101,35 +372,41 @@ class MemoryAgent(BaseAgent):
     def _update_short_memory(self, user_id: str, message_record: Dict[str, Any]):
         """更新短期记忆"""
         if user_id not in self.short_memory:
-            self.short_memory[user_id] = deque(maxlen=self.max_short_memory)
+            self.short_memory[user_id] = ShortMemory(self.max_short_memory)
         
-        self.short_memory[user_id].append(message_record)
+        # 用户消息写入时分词，供相关历史查找复用
+        tokens = index_tokens(message_record['message']) if message_record['type'] == 'user' else frozenset()
+        self.short_memory[user_id].append(message_record, tokens)
     
-    def _extract_important_info(self, message: str, message_type: str) -> Dict[str, Any]:
+    def _extract_important_info(self, message: str, message_type: str, now_iso: str) -> Dict[str, Any]:
         """提取重要信息"""
         important_info = {}
-        message_lower = message.lower()
         
         # 只处理用户消息
         if message_type != 'user':
             return important_info
         
-        for category, keywords in self.important_keywords.items():
-            for keyword in keywords:
-                if keyword in message_lower:
-                    if category not in important_info:
-                        important_info[category] = []
-                    
-                    # 提取包含关键词的句子
-                    sentences = message.split('。')
-                    for sentence in sentences:
-                        if keyword in sentence:
-                            important_info[category].append({
-                                'content': sentence.strip(),
-                                'keyword': keyword,
-                                'timestamp': datetime.now().isoformat(),
-                                'confidence': self._calculate_info_confidence(sentence, keyword)
-                            })
+        # 句子边界只计算一次，命中位置二分定位到所在句子（关键词均为中文，无需转小写）
+        bounds = [-1] + [i for i, char in enumerate(message) if char == '。'] + [len(message)]
+        hits: Dict[int, set] = {}
+        for end, order, _, _ in self._important_matcher.iter(message):
+            hits.setdefault(order, set()).add(bisect.bisect_left(bounds, end))
+        
+        # 按关键词表顺序输出，同一句子内多次命中只记录一次
+        for order in sorted(hits):
+            category, keyword = self._important_matcher.keywords[order]
+            if category not in important_info:
+                important_info[category] = []
+            
+            # 提取包含关键词的句子
+            for index in sorted(hits[order]):
+                sentence = message[bounds[index - 1] + 1:bounds[index]]
+                important_info[category].append({
+                    'content': sentence.strip(),
+                    'keyword': keyword,
+                    'timestamp': now_iso,
+                    'confidence': self._calculate_info_confidence(sentence, keyword)
+                })
         
         return important_info
     
@@ -153,108 +430,90 @@ class MemoryAgent(BaseAgent):
         
         return min(base_confidence, 1.0)
     
-    def _update_long_memory(self, user_id: str, important_info: Dict[str, Any]):
+    def _update_long_memory(self, user_id: str, important_info: Dict[str, Any], now_iso: str, now: float):
         """更新长期记忆"""
         if user_id not in self.long_memory:
-            self.long_memory[user_id] = []
+            self.long_memory[user_id] = deque(maxlen=self.max_long_memory)
+            self._long_memory_index[user_id] = LongMemoryIndex()
+        records = self.long_memory[user_id]
+        index = self._long_memory_index[user_id]
         
         memory_record = {
             'info': important_info,
-            'timestamp': datetime.now().isoformat(),
-            'hash': hashlib.md5(str(important_info).encode()).hexdigest()
+            'timestamp': now_iso,
+            'hash': record_hash(important_info)
         }
         
         # 检查是否已存在相似信息
-        existing_hashes = [record.get('hash') for record in self.long_memory[user_id]]
-        if memory_record['hash'] not in existing_hashes:
-            self.long_memory[user_id].append(memory_record)
+        if memory_record['hash'] not in index:
+            # 限制长期记忆大小：缓冲区已满时追加会淘汰最旧的记录
+            if len(records) == records.maxlen:
+                index.remove(records[0])
+            records.append(memory_record)
+            index.add(memory_record, now)
+            self._bump_long_memory_version(user_id)
+            heapq.heappush(self._expiry_heap, (now, user_id, memory_record['hash']))
             
-            # 限制长期记忆大小
-            if len(self.long_memory[user_id]) > self.max_long_memory:
-                self.long_memory[user_id] = self.long_memory[user_id][-self.max_long_memory:]
+            # 失效条目过多时按当前索引重建堆
+            if len(self._expiry_heap) > self._expiry_compact_at:
+                self._expiry_heap = [
+                    (created, uid, record_hash)
+                    for uid, user_index in self._long_memory_index.items()
+                    for record_hash, created in user_index.created.items()
+                ]
+                heapq.heapify(self._expiry_heap)
+                self._expiry_compact_at = 2 * len(self._expiry_heap) + 1024
     
-    def _update_session_context(self, user_id: str, session_id: str, message_record: Dict[str, Any]):
+    def _update_session_context(self, user_id: str, session_id: str, message_record: Dict[str, Any],
+                                now: float, message_lower: Optional[str] = None):
         """更新会话上下文"""
         session_key = f"{user_id}:{session_id}"
         
-        if session_key not in self.session_context:
-            self.session_context[session_key] = {
-                'start_time': datetime.now().isoformat(),
-                'message_count': 0,
-                'topics': [],
-                'entities': {},
-                'conversation_flow': []
-            }
+        context = self.session_context.get(session_key)
+        if context is None:
+            context = self.session_context[session_key] = SessionContext(start_time=now, last_update=now)
+            self._user_sessions.setdefault(user_id, set()).add(session_key)
         
-        context = self.session_context[session_key]
-        context['message_count'] += 1
-        context['last_update'] = datetime.now().isoformat()
+        context.message_count += 1
+        context.last_update = now
         
         # 提取主题
-        topics = self._extract_topics(message_record['message'])
+        topics = self._extract_topics(message_record['message'], message_lower)
         for topic in topics:
-            if topic not in context['topics']:
-                context['topics'].append(topic)
+            context.topics.setdefault(topic)
         
         # 提取实体
-        entities = self._extract_entities(message_record['message'])
-        for entity_type, entity_value in entities.items():
-            context['entities'][entity_type] = entity_value
-        
-        # 记录对话流程
-        context['conversation_flow'].append({
-            'type': message_record['type'],
-            'timestamp': message_record['timestamp'],
-            'topic': topics[0] if topics else 'general'
-        })
-    
-    def _extract_topics(self, message: str) -> List[str]:
-        """提取消息主题"""
-        topics = []
+        context.entities.update(self._extract_entities(message_record['message']))
         
-        # 简单的基于关键词的主题提取
-        topic_keywords = {
-            'product': ['商品', '产品', '手机', '电脑', '衣服', '鞋子'],
-            'price': ['价格', '多少钱', '便宜', '贵', '优惠', '折扣'],
-            'shipping': ['快递', '配送', '邮费', '运费', '发货', '物流'],
-            'service': ['服务', '客服', '售后', '维修', '保修'],
-            'payment': ['付款', '支付', '结账', '订单', '下单'],
-            'complaint': ['投诉', '问题', '故障', '不满意', '退货']
-        }
+        # 记录对话流程（只保留最近的部分）
+        context.flow.append((
+            self._label_id(message_record['type']), now, self._label_id(topics[0] if topics else 'general')
+        ))
+    
+    def _label_id(self, label: str) -> int:
+        """消息类型/主题对应的整数ID（首次出现时分配）"""
+        label_id = self._label_ids.get(label)
+        if label_id is None:
+            label_id = self._label_ids[label] = len(self._labels)
+            self._labels.append(label)
+        return label_id
+    
+    def _extract_topics(self, message: str, message_lower: Optional[str] = None) -> List[str]:
+        """提取消息主题"""
+        if message_lower is None:
+            message_lower = message.lower()
         
-        message_lower = message.lower()
-        for topic, keywords in topic_keywords.items():
-            if any(keyword in message_lower for keyword in keywords):
-                topics.append(topic)
+        # 基于关键词的主题提取（单次扫描，按主题表顺序输出）
+        matched = {category for _, _, category, _ in self._topic_matcher.iter(message_lower)}
+        topics = [topic for topic in self.topic_keywords if topic in matched]
         
         return topics or ['general']
     
     def _extract_entities(self, message: str) -> Dict[str, str]:
         """提取命名实体"""
-        entities = {}
-        
         # 简单的实体提取（实际应用中可以使用NER模型）
-        import re
-        
-        # 提取手机号
-        phone_pattern = r'1[3-9]\d{9}'
-        phone_match = re.search(phone_pattern, message)
-        if phone_match:
-            entities['phone'] = phone_match.group()
-        
-        # 提取邮箱
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        email_match = re.search(email_pattern, message)
-        if email_match:
-            entities['email'] = email_match.group()
-        
-        # 提取金额
-        money_pattern = r'(\d+(\.\d{1,2})?)\s*(元|块|万|千)'
-        money_match = re.search(money_pattern, message)
-        if money_match:
-            entities['amount'] = money_match.group()
-        
-        return entities
+        # 提取手机号、邮箱、金额
+        return self._entity_scanner.scan(message)
     
     def _generate_context(self, user_id: str, session_id: str) -> Dict[str, Any]:
         """生成当前对话上下文"""
@@ -267,8 +526,7 @@ class MemoryAgent(BaseAgent):
         
         # 获取最近消息
         if user_id in self.short_memory:
-            recent_messages = list(self.short_memory[user_id])[-self.context_window:]
-            context['recent_messages'] = recent_messages
+            context['recent_messages'] = self.short_memory[user_id].recent(self.context_window)
         
         # 生成用户画像
         context['user_profile'] = self._generate_user_profile(user_id)
@@ -279,47 +537,63 @@ class MemoryAgent(BaseAgent):
             session_data = self.session_context[session_key]
             context['session_summary'] = {
                 'duration_minutes': self._calculate_session_duration(session_data),
-                'message_count': session_data['message_count'],
-                'topics': session_data['topics'],
-                'entities': session_data['entities']
+                'message_count': session_data.message_count,
+                'topics': list(session_data.topics),
+                'entities': session_data.entities
             }
         
         # 相关历史信息
-        context['relevant_history'] = self._get_relevant_history(user_id, context['recent_messages'])
+        context['relevant_history'] = self._get_relevant_history(user_id, len(context['recent_messages']))
         
         return context
     
+    def _bump_long_memory_version(self, user_id: str):
+        """长期记忆变化后递增版本号，使缓存的画像失效"""
+        self._long_memory_versions[user_id] = self._long_memory_versions.get(user_id, 0) + 1
+    
+    def _long_memory_profile(self, user_id: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """从长期记忆汇总偏好和个人信息（长期记忆未变化时复用缓存）"""
+        version = self._long_memory_versions.get(user_id, 0)
+        cached = self._profile_cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        
+        preferences = {}
+        personal_info = {}
+        for record in self.long_memory.get(user_id, ()):
+            info = record['info']
+            
+            # 提取偏好信息
+            if 'preferences' in info:
+                for pref in info['preferences']:
+                    preferences[pref['keyword']] = pref['content']
+            
+            # 提取个人信息
+            if 'personal_info' in info:
+                for personal in info['personal_info']:
+                    personal_info[personal['keyword']] = personal['content']
+        
+        self._profile_cache.set(user_id, (version, preferences, personal_info))
+        return preferences, personal_info
+    
     def _generate_user_profile(self, user_id: str) -> Dict[str, Any]:
         """生成用户画像"""
+        preferences, personal_info = self._long_memory_profile(user_id)
         profile = {
-            'preferences': {},
+            'preferences': dict(preferences),
             'behavior_patterns': {},
             'interaction_style': 'unknown',
             'purchase_history': []
         }
-        
-        if user_id in self.long_memory:
-            for record in self.long_memory[user_id]:
-                info = record['info']
-                
-                # 提取偏好信息
-                if 'preferences' in info:
-                    for pref in info['preferences']:
-                        profile['preferences'][pref['keyword']] = pref['content']
-                
-                # 提取个人信息
-                if 'personal_info' in info:
-                    for personal in info['personal_info']:
-                        profile[personal['keyword']] = personal['content']
+        profile.update(personal_info)
         
         # 分析行为模式
         if user_id in self.short_memory:
-            messages = list(self.short_memory[user_id])
-            profile['behavior_patterns'] = self._analyze_behavior_patterns(messages)
+            profile['behavior_patterns'] = self._analyze_behavior_patterns(self.short_memory[user_id])
         
         return profile
     
-    def _analyze_behavior_patterns(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _analyze_behavior_patterns(self, memory: ShortMemory) -> Dict[str, Any]:
         """分析用户行为模式"""
         patterns = {
             'avg_message_length': 0,
@@ -328,67 +602,62 @@ class MemoryAgent(BaseAgent):
             'politeness_level': 'medium'
         }
         
-        if not messages:
+        if not memory.size:
             return patterns
         
-        user_messages = [msg for msg in messages if msg['type'] == 'user']
+        # 只统计用户消息（环形缓冲中的有效部分）
+        user_mask = memory.is_user[:memory.size]
+        flags = memory.flags[:memory.size][user_mask]
+        user_count = len(flags)
         
-        if user_messages:
+        if user_count:
             # 平均消息长度
-            total_length = sum(len(msg['message']) for msg in user_messages)
-            patterns['avg_message_length'] = total_length / len(user_messages)
+            total_length = int(memory.lengths[:memory.size][user_mask].sum())
+            patterns['avg_message_length'] = total_length / user_count
             
             # 问题频率
-            question_count = sum(1 for msg in user_messages if '?' in msg['message'] or '？' in msg['message'])
-            patterns['question_frequency'] = question_count / len(user_messages)
+            question_count = int(np.count_nonzero(flags & FLAG_QUESTION))
+            patterns['question_frequency'] = question_count / user_count
             
             # 礼貌程度
-            polite_words = ['请', '谢谢', '不好意思', '麻烦', '劳烦']
-            polite_count = sum(1 for msg in user_messages 
-                             if any(word in msg['message'] for word in polite_words))
-            politeness_ratio = polite_count / len(user_messages)
+            polite_count = int(np.count_nonzero(flags & FLAG_POLITE))
+            politeness_ratio = polite_count / user_count
             
-            if politeness_ratio > 0.3:
-                patterns['politeness_level'] = 'high'
-            elif politeness_ratio > 0.1:
-                patterns['politeness_level'] = 'medium'
-            else:
-                patterns['politeness_level'] = 'low'
+            patterns['politeness_level'] = POLITENESS_TIERS[(politeness_ratio > 0.1) + (politeness_ratio > 0.3)]
         
         return patterns
     
-    def _calculate_session_duration(self, session_data: Dict[str, Any]) -> float:
+    def _calculate_session_duration(self, session_data: SessionContext) -> float:
         """计算会话时长（分钟）"""
-        try:
-            start_time = datetime.fromisoformat(session_data['start_time'])
-            last_update = datetime.fromisoformat(session_data.get('last_update', session_data['start_time']))
-            duration = (last_update - start_time).total_seconds() / 60
-            return round(duration, 2)
-        except:
-            return 0.0
-    
-    def _get_relevant_history(self, user_id: str, recent_messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """获取相关历史信息"""
+        return round((session_data.last_update - session_data.start_time) / 60, 2)
+    
+    def _get_relevant_history(self, user_id: str, window: int) -> List[Dict[str, Any]]:
+        """获取相关历史信息（最近 window 条消息中用户消息的词项命中的长期记忆）"""
         relevant_history = []
         
-        if user_id not in self.long_memory:
+        if user_id not in self.long_memory or not window:
+            return relevant_history
+        
+        # 最近消息的词项（写入短期记忆时已分词）
+        recent_tokens = set()
+        if user_id in self.short_memory:
+            for tokens in self.short_memory[user_id].recent_tokens(window):
+                recent_tokens.update(tokens)
+        
+        # 倒排索引查找相关的历史记录
+        matched = self._long_memory_index[user_id].search(recent_tokens)
+        if not matched:
             return relevant_history
         
-        # 提取最近消息的关键词
-        recent_keywords = set()
-        for msg in recent_messages:
-            if msg['type'] == 'user':
-                # 简单的关键词提取
-                words = msg['message'].split()
-                recent_keywords.update(words)
-        
-        # 查找相关的历史记录
-        for record in self.long_memory[user_id]:
-            record_text = str(record['info'])
-            if any(keyword in record_text for keyword in recent_keywords):
+        # 从最新记录向前取最近5条相关记录
+        for record in reversed(self.long_memory[user_id]):
+            if record['hash'] in matched:
                 relevant_history.append(record)
+                if len(relevant_history) == 5:
+                    break
+        relevant_history.reverse()
         
-        return relevant_history[-5:]  # 返回最近5条相关记录
+        return relevant_history
     
     def _predict_next_intent(self, user_id: str, session_id: str) -> str:
         """预测下一步意图"""
@@ -398,8 +667,8 @@ class MemoryAgent(BaseAgent):
             return 'information_gathering'
         
         session_data = self.session_context[session_key]
-        topics = session_data.get('topics', [])
-        flow = session_data.get('conversation_flow', [])
+        topics = session_data.topics
+        flow = session_data.flow
         
         # 基于话题和对话流程预测意图
         if 'price' in topics and len(flow) > 3:
@@ -420,18 +689,10 @@ class MemoryAgent(BaseAgent):
         if session_key not in self.session_context:
             return 'greeting'
         
-        session_data = self.session_context[session_key]
-        message_count = session_data.get('message_count', 0)
+        message_count = self.session_context[session_key].message_count
         
-        # 基于消息数量和内容判断对话状态
-        if message_count <= 2:
-            return 'greeting'
-        elif message_count <= 5:
-            return 'information_gathering'
-        elif message_count <= 10:
-            return 'product_recommendation'
-        else:
-            return 'order_processing'
+        # 基于消息数量判断对话状态（查表代替逐级比较）
+        return STATES_BY_MESSAGE_COUNT[bisect.bisect_left(STATE_MESSAGE_BOUNDS, message_count)]
     
     def _get_memory_stats(self, user_id: str) -> Dict[str, Any]:
         """获取记忆统计信息"""
@@ -452,44 +713,65 @@ class MemoryAgent(BaseAgent):
                 stats['oldest_memory'] = self.long_memory[user_id][0]['timestamp']
         
         # 统计会话数量
-        user_sessions = [key for key in self.session_context.keys() if key.startswith(f"{user_id}:")]
+        user_sessions = self._user_sessions.get(user_id, ())
         stats['session_count'] = len(user_sessions)
         
         # 统计总交互次数
         for session_key in user_sessions:
-            stats['total_interactions'] += self.session_context[session_key].get('message_count', 0)
+            stats['total_interactions'] += self.session_context[session_key].message_count
         
         return stats
     
     def clear_expired_memory(self):
         """清理过期记忆"""
-        current_time = datetime.now()
-        expired_threshold = current_time - timedelta(hours=self.memory_decay_hours)
-        
-        # 清理过期的长期记忆
-        for user_id in list(self.long_memory.keys()):
-            valid_memories = []
-            for record in self.long_memory[user_id]:
-                try:
-                    record_time = datetime.fromisoformat(record['timestamp'])
-                    if record_time > expired_threshold:
-                        valid_memories.append(record)
-                except:
-                    continue
+        # 按写入时间（epoch秒）比较，无需解析ISO时间字符串
+        expired_threshold = time.time() - self.memory_decay_hours * 3600
+        
+        # 从过期堆弹出到期的长期记忆，只处理真正过期的记录
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= expired_threshold:
+            created, user_id, record_hash = heapq.heappop(heap)
+            index = self._long_memory_index.get(user_id)
+            if index is None or index.created.get(record_hash) != created:
+                continue  # 已被容量淘汰
             
-            if valid_memories:
-                self.long_memory[user_id] = valid_memories
+            # 记录按写入顺序排列，到期的通常就是最旧的一条
+            records = self.long_memory[user_id]
+            if records[0]['hash'] == record_hash:
+                record = records.popleft()
             else:
+                record = next(record for record in records if record['hash'] == record_hash)
+                records.remove(record)
+            index.remove(record)
+            self._bump_long_memory_version(user_id)
+            
+            if not records:
                 del self.long_memory[user_id]
+                del self._long_memory_index[user_id]
         
         self.logger.info("Expired memory cleared")
     
+    def get_conversation_flow(self, user_id: str, session_id: str) -> List[Dict[str, Any]]:
+        """获取会话的对话流程（最近500条）"""
+        context = self.session_context.get(f"{user_id}:{session_id}")
+        if context is None:
+            return []
+        
+        return [
+            {
+                'type': self._labels[type_id],
+                'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+                'topic': self._labels[topic_id]
+            }
+            for type_id, timestamp, topic_id in context.flow
+        ]
+    
     def get_user_summary(self, user_id: str) -> Dict[str, Any]:
         """获取用户完整摘要"""
         return {
             'user_id': user_id,
             'profile': self._generate_user_profile(user_id),
             'memory_stats': self._get_memory_stats(user_id),
-            'recent_activity': list(self.short_memory.get(user_id, []))[-5:],
-            'important_info': self.long_memory.get(user_id, [])[-10:]
+            'recent_activity': self.short_memory[user_id].recent(5) if user_id in self.short_memory else [],
+            'important_info': list(self.long_memory.get(user_id, []))[-10:]
         } 
\ No newline at end of file
@@ -0,0 +1,454 @@
+"""
+语义缓存
+按文本向量的余弦相似度命中缓存，相近问法（如"价格多少"与"多少钱"、"怎么退货"与"退货流程是什么"）复用同一份结果
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from .batching import Batch, MicroBatcher
+from .utils import TTLCache, normalize_text
+
+logger = logging.getLogger("agent.semantic_cache")
+
+# 尝试导入向量计算依赖
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+# 尝试导入FAISS（逐条向量索引存储，条目多时可量化为IVF-PQ）
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+    logging.warning("faiss not available, semantic cache uses clustered storage")
+
+# 尝试导入ONNX Runtime（int8量化推理）
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+    logging.warning("onnxruntime not available, semantic cache uses fp32 sentence-transformers model")
+
+SEMANTIC_CACHE_AVAILABLE = NUMPY_AVAILABLE and (SENTENCE_TRANSFORMERS_AVAILABLE or ONNX_AVAILABLE)
+if not SEMANTIC_CACHE_AVAILABLE:
+    logging.warning("numpy/sentence-transformers not available, semantic cache disabled")
+
+# 向量模型按(模型名, 设备, ONNX模型路径)在进程内共享，多个缓存实例只加载一次
+_models: Dict[Tuple[str, Optional[str], Optional[str]], Any] = {}
+_model_lock = asyncio.Lock()
+
+
+async def _load_model(model_name: str, device: Optional[str], onnx_model: Optional[str] = None,
+                      onnx_threads: int = 2):
+    """首次使用时在线程中加载向量模型（配置了ONNX模型且ONNX Runtime可用时加载int8量化模型）"""
+    if onnx_model and not ONNX_AVAILABLE:
+        onnx_model = None
+    if not onnx_model and not SENTENCE_TRANSFORMERS_AVAILABLE:
+        raise RuntimeError("sentence-transformers not available and no ONNX embedding model configured")
+    key = (model_name, device, onnx_model)
+    if key not in _models:
+        async with _model_lock:
+            if key not in _models:
+                if onnx_model:
+                    _models[key] = await asyncio.to_thread(_OnnxEmbedder, onnx_model, model_name, onnx_threads)
+                else:
+                    # device为None时由sentence-transformers自动选择（有GPU则用GPU）
+                    _models[key] = await asyncio.to_thread(SentenceTransformer, model_name, device=device)
+                logger.info(f"Semantic cache model loaded: {onnx_model or model_name}")
+    return _models[key]
+
+
+class _OnnxEmbedder:
+    """
+    ONNX Runtime int8动态量化向量模型，encode接口与SentenceTransformer一致（均值池化）
+    
+    onnx_model为导出的fp32模型文件（如 optimum-cli export onnx --model sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2 导出的model.onnx），
+    首次加载时在同目录生成权重int8量化的 *_int8.onnx 并复用。
+    """
+    
+    def __init__(self, onnx_model: str, model_name: str, threads: int = 2):
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            self._quantized_path(onnx_model), options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        output_names = [item.name for item in self.session.get_outputs()]
+        self.output_name = 'last_hidden_state' if 'last_hidden_state' in output_names else output_names[0]
+        
+        # 分词器优先使用与ONNX模型一同导出的文件
+        model_dir = os.path.dirname(onnx_model)
+        if os.path.exists(os.path.join(model_dir, 'tokenizer_config.json')):
+            self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        else:
+            if '/' not in model_name and not os.path.isdir(model_name):
+                model_name = f'sentence-transformers/{model_name}'
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+    
+    @staticmethod
+    def _quantized_path(onnx_model: str) -> str:
+        """返回int8量化模型路径，不存在时生成（先写临时文件再替换，多进程同时生成互不影响）"""
+        root, ext = os.path.splitext(onnx_model)
+        if root.endswith('_int8'):
+            return onnx_model
+        quantized = f"{root}_int8{ext}"
+        if not os.path.exists(quantized):
+            temp_path = f"{quantized}.{os.getpid()}.tmp"
+            quantize_dynamic(onnx_model, temp_path, weight_type=QuantType.QInt8)
+            os.replace(temp_path, quantized)
+            logger.info(f"Quantized embedding model written: {quantized}")
+        return quantized
+    
+    def encode(self, texts: List[str], batch_size: int = 32, normalize_embeddings: bool = True,
+               convert_to_numpy: bool = True) -> 'np.ndarray':
+        """批量计算句向量（按注意力掩码对最后一层隐藏状态取均值）"""
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True, return_tensors='np'
+            )
+            feeds = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+            hidden = self.session.run([self.output_name], feeds)[0]
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        
+        embeddings = np.vstack(batches)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+
+class _IndexSpace:
+    """单个命名空间的FAISS向量索引和缓存条目（每次写入一条）"""
+    
+    def __init__(self, dim: int):
+        self.dim = dim
+        # 初始为精确内积索引，条目增多后切换为IVF-PQ量化索引
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.quantize_started = False
+        # 条目ID -> (过期时间, 缓存值)，按最近使用排序
+        self.entries: OrderedDict = OrderedDict()
+        self._next_id = 0
+        # 最近一次写入的过期时间，过期后整个命名空间可回收
+        self.latest_expiry = 0.0
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def lookup(self, embedding: 'np.ndarray', threshold: float) -> Optional[Any]:
+        """查找最相似的条目，相似度达到阈值且未过期时返回其缓存值"""
+        if self.index.ntotal == 0:
+            return None
+        
+        scores, ids = self.index.search(embedding[None], 1)
+        entry_id = int(ids[0][0])
+        if entry_id < 0 or scores[0][0] < threshold:
+            return None
+        
+        entry = self.entries.get(entry_id)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self.remove(entry_id)
+            return None
+        
+        self.entries.move_to_end(entry_id)
+        return value
+    
+    def store(self, embedding: 'np.ndarray', value: Any, expires_at: float, max_entries: int):
+        """写入一条，超出容量时淘汰最久未使用的条目"""
+        entry_id = self._next_id
+        self._next_id += 1
+        self.index.add_with_ids(embedding[None], np.array([entry_id], dtype=np.int64))
+        self.entries[entry_id] = (expires_at, value)
+        
+        while len(self.entries) > max_entries:
+            self.remove(next(iter(self.entries)))
+    
+    def remove(self, entry_id: int):
+        """删除条目及其向量"""
+        self.entries.pop(entry_id, None)
+        self.index.remove_ids(np.array([entry_id], dtype=np.int64))
+    
+    def snapshot(self):
+        """导出精确索引中的全部向量及其条目ID"""
+        flat = faiss.downcast_index(self.index.index)
+        return flat.reconstruct_n(0, flat.ntotal), faiss.vector_to_array(self.index.id_map).copy()
+
+
+class _ClusterSpace:
+    """
+    单个命名空间的在线聚类存储
+    
+    相近问法并为一个簇，只保存簇中心向量和最新的缓存值，存储大小随问题类别数而不是写入次数增长。
+    """
+    
+    def __init__(self, dim: int, ema_decay: float, capacity: int = 4):
+        # 簇中心按行连续存放，只有前size行有效，容量不足时倍增
+        self.centroids = np.empty((capacity, dim), dtype=np.float32)
+        self.size = 0
+        self.values: List[Any] = []
+        self.expires_at: List[float] = []
+        self.last_hit = np.empty(capacity, dtype=np.float64)
+        # 簇中心更新：c = decay * c + (1 - decay) * emb，再归一化
+        self.ema_decay = ema_decay
+        # 最近一次写入的过期时间，过期后整个命名空间可回收
+        self.latest_expiry = 0.0
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def nearest(self, embedding: 'np.ndarray') -> Tuple[int, float]:
+        """返回最相似的簇及其相似度（单次矩阵向量乘）"""
+        if self.size == 0:
+            return -1, -1.0
+        scores = self.centroids[:self.size] @ embedding
+        index = int(scores.argmax())
+        return index, float(scores[index])
+    
+    def lookup(self, embedding: 'np.ndarray', threshold: float) -> Optional[Any]:
+        """与最近簇中心的相似度达到阈值且未过期时返回该簇的缓存值"""
+        index, score = self.nearest(embedding)
+        if index < 0 or score < threshold:
+            return None
+        
+        # 过期的簇保留中心向量，下次写入时刷新缓存值
+        if self.expires_at[index] < time.monotonic():
+            return None
+        
+        self.last_hit[index] = time.monotonic()
+        return self.values[index]
+    
+    def store(self, embedding: 'np.ndarray', value: Any, expires_at: float, max_entries: int, threshold: float):
+        """
+        写入缓存
+        
+        与最近簇中心的相似度达到阈值时并入该簇：中心向量按滑动平均靠近新向量，缓存值替换为新值；
+        否则以该向量为中心新建簇，簇数超出上限时淘汰最久未命中的簇。
+        """
+        index, score = self.nearest(embedding)
+        if index >= 0 and score >= threshold:
+            centroid = self.centroids[index]
+            centroid *= self.ema_decay
+            centroid += (1.0 - self.ema_decay) * embedding
+            centroid /= np.linalg.norm(centroid)
+            self.values[index] = value
+            self.expires_at[index] = expires_at
+            self.last_hit[index] = time.monotonic()
+            return
+        
+        self.add(embedding, expires_at, value)
+        while self.size > max_entries:
+            self.remove_least_recent()
+    
+    def add(self, embedding: 'np.ndarray', expires_at: float, value: Any):
+        """新建簇"""
+        if self.size == len(self.centroids):
+            capacity = 2 * len(self.centroids)
+            self.centroids = np.resize(self.centroids, (capacity, self.centroids.shape[1]))
+            self.last_hit = np.resize(self.last_hit, capacity)
+        self.centroids[self.size] = embedding
+        self.last_hit[self.size] = time.monotonic()
+        self.values.append(value)
+        self.expires_at.append(expires_at)
+        self.size += 1
+    
+    def remove_least_recent(self):
+        """淘汰最久未命中的簇（用最后一个簇填补空位）"""
+        index = int(self.last_hit[:self.size].argmin())
+        last = self.size - 1
+        if index != last:
+            self.centroids[index] = self.centroids[last]
+            self.last_hit[index] = self.last_hit[last]
+            self.values[index] = self.values[last]
+            self.expires_at[index] = self.expires_at[last]
+        self.values.pop()
+        self.expires_at.pop()
+        self.size = last
+
+
+def _train_ivfpq(vectors: 'np.ndarray', ids: 'np.ndarray', nlist: int, pq_m: int, nprobe: int):
+    """训练IVF-PQ内积索引并写入向量（在线程中执行）"""
+    dim = vectors.shape[1]
+    quantizer = faiss.IndexFlatIP(dim)
+    index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    index.nprobe = nprobe
+    return index
+
+
+class SemanticCache:
+    """
+    语义缓存（向量已L2归一化，内积即余弦相似度）
+    
+    clustered为False时每次写入一条，存放在FAISS内积索引中（条目多时后台量化为IVF-PQ），用于知识检索结果；
+    clustered为True时相近问法在线聚类为一个簇，只保存簇中心和最新值，用于生成的回复。
+    未安装faiss时统一使用聚类存储。并发到达的文本合批编码。
+    """
+    
+    def __init__(self, model_name: str = 'paraphrase-multilingual-MiniLM-L12-v2', threshold: float = 0.85,
+                 ttl: float = 300, max_entries: int = 10000, device: Optional[str] = None,
+                 embedding_cache_size: int = 2048, clustered: bool = False, ema_decay: float = 0.9,
+                 max_namespaces: int = 1024,
+                 quantize_threshold: int = 10000, nlist: int = 256, pq_m: int = 48, nprobe: int = 8,
+                 max_batch: int = 32, max_wait_ms: float = 0.0,
+                 onnx_model: Optional[str] = None, onnx_threads: int = 2):
+        self.model_name = model_name
+        self.device = device
+        # 配置ONNX模型文件时使用int8量化推理（CPU上吞吐更高）
+        self.onnx_model = onnx_model
+        self.onnx_threads = onnx_threads
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        # 命名空间数上限，超出时淘汰最久未使用的命名空间
+        self.max_namespaces = max(1, max_namespaces)
+        self.clustered = clustered or not FAISS_AVAILABLE
+        self.ema_decay = ema_decay
+        # 量化参数：条目数达到阈值后后台训练IVF-PQ索引（0表示不量化）
+        self.quantize_threshold = quantize_threshold
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+        
+        # 命名空间 -> 存储，按最近使用排序
+        self._namespaces: OrderedDict = OrderedDict()
+        # 文本 -> 向量，相同文本重复出现时免去编码
+        self._embeddings = TTLCache(maxsize=embedding_cache_size, ttl=3600)
+        self._batcher = MicroBatcher(self._encode_pending, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        self._tasks: set = set()
+    
+    async def embed(self, text: str) -> 'np.ndarray':
+        """计算文本的归一化向量（并发请求合批编码）"""
+        key = normalize_text(text)
+        embedding = self._embeddings.get(key)
+        if embedding is not None:
+            return embedding
+        
+        embedding = await self._batcher.submit(text)
+        self._embeddings.set(key, embedding)
+        return embedding
+    
+    async def _encode_pending(self, batch: Batch):
+        """批量编码一批文本并回填各自的向量；编码期间到达的文本直接组成下一批"""
+        MicroBatcher.resolve(batch, await self._encode_batch([text for text, _ in batch]))
+    
+    async def _encode_batch(self, texts: List[str]) -> 'np.ndarray':
+        """批量计算归一化向量"""
+        model = await _load_model(self.model_name, self.device, self.onnx_model, self.onnx_threads)
+        embeddings = await asyncio.to_thread(
+            model.encode, texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    
+    def lookup(self, namespace: Hashable, embedding: 'np.ndarray') -> Optional[Any]:
+        """
+        查找相似文本的缓存值
+        
+        Args:
+            namespace: 命名空间（不同命名空间互不命中）
+            embedding: 文本向量
+        
+        Returns:
+            命中时返回缓存值，否则返回None
+        """
+        space = self._namespaces.get(namespace)
+        if space is None:
+            return None
+        if space.latest_expiry < time.monotonic():
+            # 命名空间内的条目已全部过期，整体回收
+            del self._namespaces[namespace]
+            return None
+        
+        self._namespaces.move_to_end(namespace)
+        return space.lookup(embedding, self.threshold)
+    
+    def store(self, namespace: Hashable, embedding: 'np.ndarray', value: Any):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        space = self._namespaces.get(namespace)
+        if space is None:
+            self._reserve_namespace()
+            space = self._namespaces[namespace] = self._new_space(embedding.shape[0])
+        else:
+            self._namespaces.move_to_end(namespace)
+        
+        expires_at = time.monotonic() + self.ttl
+        space.latest_expiry = expires_at
+        if self.clustered:
+            space.store(embedding, value, expires_at, self.max_entries, self.threshold)
+            return
+        
+        space.store(embedding, value, expires_at, self.max_entries)
+        if (self.quantize_threshold > 0 and not space.quantize_started
+                and space.index.ntotal >= self.quantize_threshold and space.dim % self.pq_m == 0):
+            space.quantize_started = True
+            task = asyncio.get_running_loop().create_task(self._quantize(space))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    def _reserve_namespace(self):
+        """命名空间数达到上限时先回收已全部过期的命名空间，仍不足时淘汰最久未使用的命名空间"""
+        if len(self._namespaces) < self.max_namespaces:
+            return
+        now = time.monotonic()
+        for namespace in [key for key, space in self._namespaces.items() if space.latest_expiry < now]:
+            del self._namespaces[namespace]
+        while len(self._namespaces) >= self.max_namespaces:
+            self._namespaces.popitem(last=False)
+    
+    def _new_space(self, dim: int):
+        """创建命名空间的存储"""
+        if self.clustered:
+            return _ClusterSpace(dim, self.ema_decay)
+        return _IndexSpace(dim)
+    
+    async def _quantize(self, space: _IndexSpace):
+        """后台训练量化索引，完成后替换精确索引"""
+        try:
+            vectors, ids = space.snapshot()
+            index = await asyncio.to_thread(_train_ivfpq, vectors, ids, self.nlist, self.pq_m, self.nprobe)
+            
+            # 训练期间新增的条目补写入新索引，已淘汰的条目从新索引删除
+            snapshot_ids = set(ids.tolist())
+            added = [entry_id for entry_id in space.entries if entry_id not in snapshot_ids]
+            if added:
+                added_ids = np.array(added, dtype=np.int64)
+                index.add_with_ids(np.vstack([space.index.reconstruct(entry_id) for entry_id in added]), added_ids)
+            removed = [entry_id for entry_id in snapshot_ids if entry_id not in space.entries]
+            if removed:
+                index.remove_ids(np.array(removed, dtype=np.int64))
+            
+            space.index = index
+            logger.info(f"Semantic cache index quantized: {index.ntotal} vectors")
+        except Exception as e:
+            # 失败后保持精确索引，不再重试
+            logger.error(f"Semantic cache quantization failed: {e}")
+    
+    def clear(self):
+        """清空缓存"""
+        self._namespaces.clear()
+        self._embeddings.clear()
+    
+    async def close(self):
+        """停止向量批处理"""
+        await self._batcher.close()
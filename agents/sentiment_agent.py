@@ -4,16 +4,26 @@
 """
 
 import re
-import jieba
-from typing import Dict, Any, List, Tuple
-from datetime import datetime
+import asyncio
+import numpy as np
+from enum import IntEnum
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Tuple
 import json
 
+# VADER优先使用Rust实现（接口与vaderSentiment相同），不可用时回退到纯Python实现
 try:
-    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    from vader_sentimental import SentimentIntensityAnalyzer
     VADER_AVAILABLE = True
+    VADER_BACKEND = 'rust'
 except ImportError:
-    VADER_AVAILABLE = False
+    try:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        VADER_AVAILABLE = True
+        VADER_BACKEND = 'py'
+    except ImportError:
+        VADER_AVAILABLE = False
+        VADER_BACKEND = None
 
 try:
     from snownlp import SnowNLP
@@ -21,45 +31,129 @@ try:
 except ImportError:
     SNOWNLP_AVAILABLE = False
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 from .base_agent import BaseAgent
+from .context import cut_words, get_analysis_context
+from .utils import KeywordMatcher, iso_now
+
+# 词典条目类型
+LEX_POSITIVE = 0
+LEX_NEGATIVE = 1
+LEX_INTENSIFY = 2
+LEX_NEGATE = 3
+LEX_UNKNOWN = (-1, 0.0)
+
+
+def _polarity_scan(kinds, values):
+    """按分词后的词典类型序列累计正负面得分（未登录词类型为-1）"""
+    positive_score = 0.0
+    negative_score = 0.0
+    intensity_multiplier = 1.0
+    negation_flag = False
+    
+    for i in range(len(kinds)):
+        kind = kinds[i]
+        
+        # 检查强度修饰词
+        if kind == LEX_INTENSIFY:
+            intensity_multiplier = values[i]
+            continue
+        
+        # 检查否定词
+        if kind == LEX_NEGATE:
+            negation_flag = True
+            continue
+        
+        # 计算情感分数（否定词反转极性）
+        if kind == LEX_POSITIVE or kind == LEX_NEGATIVE:
+            score = 1.0 * intensity_multiplier
+            if (kind == LEX_POSITIVE) != negation_flag:
+                positive_score += score
+            else:
+                negative_score += score
+        
+        # 重置修饰符
+        intensity_multiplier = 1.0
+        negation_flag = False
+    
+    return positive_score, negative_score
+
+
+if NUMBA_AVAILABLE:
+    _polarity_scan = njit(cache=True)(_polarity_scan)
+
+
+class SentimentLabel(IntEnum):
+    """内部使用的情感标签编码，对外输出时转为字符串"""
+    NEGATIVE = -1
+    NEUTRAL = 0
+    POSITIVE = 1
+
+
+# 标签编码 -> 字符串（按编码下标取值，-1取末位）
+LABEL_NAMES = ('neutral', 'positive', 'negative')
+LABEL_CODES = {
+    'negative': SentimentLabel.NEGATIVE,
+    'neutral': SentimentLabel.NEUTRAL,
+    'positive': SentimentLabel.POSITIVE
+}
 
 
 class SentimentAgent(BaseAgent):
     """情感判断智能体"""
     
+    __slots__ = (
+        'vader_analyzer', 'positive_words', 'negative_words', 'neutral_words',
+        'intensity_modifiers', 'negation_words', 'emotion_patterns', '_lex',
+        '_emotion_matcher', '_emotion_regexes', '_n_analyzers', '_combine', '_confidence'
+    )
+    
     def __init__(self, config: Dict[str, Any] = None):
         super().__init__("sentiment_agent", config)
         
         # 初始化情感分析器
         if VADER_AVAILABLE:
             self.vader_analyzer = SentimentIntensityAnalyzer()
+            self.logger.info(f"VADER backend: {VADER_BACKEND}")
         
-        # 中文情感词典
-        self.positive_words = {
+        # 中文情感词典（初始化后只读，合并词典据此构建）
+        self.positive_words = frozenset({
             '好', '棒', '不错', '满意', '喜欢', '开心', '高兴', '赞', '优秀', '完美',
             '太好了', '太棒了', '很好', '非常好', '特别好', '真好', '真棒', '真不错',
             '谢谢', '感谢', '惊喜', '超赞', '给力', '牛', '厉害', '优质', '精彩'
-        }
+        })
         
-        self.negative_words = {
+        self.negative_words = frozenset({
             '差', '烂', '不好', '失望', '生气', '愤怒', '讨厌', '糟糕', '垃圾', '恶心',
             '太差了', '太烂了', '很差', '非常差', '特别差', '真差', '真烂', '真不好',
             '投诉', '退货', '退款', '问题', '麻烦', '坑爹', '黑心', '欺骗', '骗人'
-        }
+        })
         
-        self.neutral_words = {
+        self.neutral_words = frozenset({
             '一般', '还行', '凑合', '普通', '平常', '常规', '标准', '正常', '可以'
-        }
+        })
         
         # 情感强度词
-        self.intensity_modifiers = {
+        self.intensity_modifiers = MappingProxyType({
             '非常': 1.5, '特别': 1.5, '超级': 1.5, '极其': 1.8, '超': 1.3,
             '很': 1.2, '太': 1.4, '真': 1.2, '好': 1.1, '挺': 1.1,
             '有点': 0.8, '稍微': 0.7, '略': 0.7, '还': 0.9
-        }
+        })
         
         # 否定词
-        self.negation_words = {'不', '没', '无', '非', '未', '否', '别', '莫'}
+        self.negation_words = frozenset({'不', '没', '无', '非', '未', '否', '别', '莫'})
+        
+        # 合并词典：词 -> (类型, 值)，每个词只需一次查找（热路径，保留普通dict）
+        # 按优先级从低到高写入，同时属于多类的词（如"好"）以强度词为准
+        self._lex: Dict[str, Tuple[int, float]] = {word: (LEX_POSITIVE, 1.0) for word in self.positive_words}
+        self._lex.update((word, (LEX_NEGATIVE, -1.0)) for word in self.negative_words)
+        self._lex.update((word, (LEX_NEGATE, 0.0)) for word in self.negation_words)
+        self._lex.update((word, (LEX_INTENSIFY, value)) for word, value in self.intensity_modifiers.items())
         
         # 情感模式
         self.emotion_patterns = {
@@ -71,6 +165,27 @@ class SentimentAgent(BaseAgent):
             'satisfied': [r'满意', r'舒心', r'放心', r'安心', r'称心'],
             'disappointed': [r'失望', r'遗憾', r'可惜', r'无语', r'郁闷']
         }
+        
+        # 纯文本模式构建关键词自动机一次扫描计数，含正则语法的模式预编译
+        self._emotion_matcher = KeywordMatcher({
+            emotion: [pattern for pattern in patterns if re.escape(pattern) == pattern]
+            for emotion, patterns in self.emotion_patterns.items()
+        })
+        self._emotion_regexes = [
+            (emotion, re.compile(pattern))
+            for emotion, patterns in self.emotion_patterns.items()
+            for pattern in patterns
+            if re.escape(pattern) != pattern
+        ]
+        
+        # 只有词典分析可用时无需投票和求平均，绑定单分析器快速路径
+        self._n_analyzers = 1 + int(VADER_AVAILABLE) + int(SNOWNLP_AVAILABLE)
+        if self._n_analyzers == 1:
+            self._combine = self._combine_single
+            self._confidence = self._confidence_single
+        else:
+            self._combine = self._combine_sentiment_results
+            self._confidence = self._calculate_confidence
     
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """验证输入数据"""
@@ -82,12 +197,13 @@ class SentimentAgent(BaseAgent):
         user_id = input_data['user_id']
         message = input_data['message']
         context = input_data.get('context', {})
+        analysis_context = get_analysis_context(input_data)
         
         # 多种情感分析方法
         sentiment_results = {}
         
-        # 1. 基于词典的中文情感分析
-        chinese_sentiment = self._analyze_chinese_sentiment(message)
+        # 1. 基于词典的中文情感分析（复用共享的分词结果）
+        chinese_sentiment = self._analyze_chinese_sentiment(message, analysis_context.tokens)
         sentiment_results['chinese'] = chinese_sentiment
         
         # 2. SnowNLP情感分析（如果可用）
@@ -104,63 +220,89 @@ class SentimentAgent(BaseAgent):
         emotion_patterns = self._match_emotion_patterns(message)
         sentiment_results['emotions'] = emotion_patterns
         
+        return self._build_result(user_id, message, context, sentiment_results)
+    
+    async def process_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量分析多条消息的情感
+        
+        词典分析和模式匹配整批在一个工作线程中完成，SnowNLP/VADER逐条提交到线程池并发执行，
+        避免逐条处理时事件循环被分词等计算阻塞。
+        
+        Args:
+            items: 输入数据列表，格式与process相同
+            
+        Returns:
+            与输入顺序一致的分析结果列表
+        """
+        if not items:
+            return []
+        
+        messages = [item['message'] for item in items]
+        
+        # 词典分析与模式匹配（整批分词，一次线程切换）
+        lexicon_task = asyncio.to_thread(
+            lambda: [(self._analyze_chinese_sentiment(item['message'], get_analysis_context(item).tokens),
+                      self._match_emotion_patterns(item['message']))
+                     for item in items]
+        )
+        analyzers = []
+        if SNOWNLP_AVAILABLE:
+            analyzers.append(('snownlp', self._analyze_with_snownlp))
+        if VADER_AVAILABLE:
+            analyzers.append(('vader', self._analyze_with_vader))
+        analyzer_tasks = [
+            asyncio.gather(*[asyncio.to_thread(analyze, message) for message in messages])
+            for _, analyze in analyzers
+        ]
+        lexicon_results, *analyzer_results = await asyncio.gather(lexicon_task, *analyzer_tasks)
+        
+        results = []
+        for i, item in enumerate(items):
+            chinese_sentiment, emotion_patterns = lexicon_results[i]
+            sentiment_results = {'chinese': chinese_sentiment}
+            for (method, _), method_results in zip(analyzers, analyzer_results):
+                sentiment_results[method] = method_results[i]
+            sentiment_results['emotions'] = emotion_patterns
+            results.append(self._build_result(item['user_id'], item['message'],
+                                              item.get('context', {}), sentiment_results))
+        return results
+    
+    def _build_result(self, user_id: str, message: str, context: Dict[str, Any],
+                      sentiment_results: Dict[str, Any]) -> Dict[str, Any]:
+        """综合各方法结果并结合上下文生成最终结果"""
         # 5. 综合情感分析
-        final_sentiment = self._combine_sentiment_results(sentiment_results)
+        final_sentiment = self._combine(sentiment_results)
         
         # 6. 上下文调整
         adjusted_sentiment = self._adjust_with_context(final_sentiment, context)
+        adjusted_sentiment['label'] = LABEL_NAMES[adjusted_sentiment['label']]
         
         result = {
             'user_id': user_id,
             'message': message,
             'sentiment': adjusted_sentiment,
             'detailed_results': sentiment_results,
-            'confidence': self._calculate_confidence(sentiment_results),
-            'analysis_time': datetime.now().isoformat()
+            'confidence': self._confidence(sentiment_results),
+            'analysis_time': iso_now()
         }
         
         self.logger.info(f"Sentiment analysis for user {user_id}: {adjusted_sentiment['label']} ({adjusted_sentiment['score']:.2f})")
         
         return result
     
-    def _analyze_chinese_sentiment(self, text: str) -> Dict[str, Any]:
+    def _analyze_chinese_sentiment(self, text: str, tokens: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
         """基于中文词典的情感分析"""
-        words = list(jieba.cut(text))
-        
-        positive_score = 0
-        negative_score = 0
-        intensity_multiplier = 1.0
-        negation_flag = False
-        
-        for i, word in enumerate(words):
-            # 检查强度修饰词
-            if word in self.intensity_modifiers:
-                intensity_multiplier = self.intensity_modifiers[word]
-                continue
-            
-            # 检查否定词
-            if word in self.negation_words:
-                negation_flag = True
-                continue
-            
-            # 计算情感分数
-            if word in self.positive_words:
-                score = 1.0 * intensity_multiplier
-                if negation_flag:
-                    negative_score += score
-                else:
-                    positive_score += score
-            elif word in self.negative_words:
-                score = 1.0 * intensity_multiplier
-                if negation_flag:
-                    positive_score += score
-                else:
-                    negative_score += score
-            
-            # 重置修饰符
-            if word not in self.intensity_modifiers and word not in self.negation_words:
-                intensity_multiplier = 1.0
-                negation_flag = False
+        if tokens is None:
+            tokens = cut_words(text)
+        entries = [self._lex.get(word, LEX_UNKNOWN) for word in tokens]
+        kinds = [kind for kind, _ in entries]
+        values = [value for _, value in entries]
+        if NUMBA_AVAILABLE:
+            # 编译后的扫描函数需要定长数值数组
+            kinds = np.array(kinds, dtype=np.int8)
+            values = np.array(values, dtype=np.float64)
+        positive_score, negative_score = _polarity_scan(kinds, values)
         
         # 计算最终分数
         total_score = positive_score + negative_score
@@ -233,12 +375,19 @@ class SentimentAgent(BaseAgent):
         """情感模式匹配"""
         emotions = {}
         
+        # 统计各情感的模式命中次数
+        scores: Dict[str, int] = {}
+        for order, count in self._emotion_matcher.counts(text).items():
+            emotion = self._emotion_matcher.keywords[order][0]
+            scores[emotion] = scores.get(emotion, 0) + count
+        for emotion, regex in self._emotion_regexes:
+            # 逐个迭代计数，不生成匹配列表
+            matches = sum(1 for _ in regex.finditer(text))
+            if matches:
+                scores[emotion] = scores.get(emotion, 0) + matches
+        
         for emotion, patterns in self.emotion_patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = len(re.findall(pattern, text))
-                score += matches
-            
+            score = scores.get(emotion, 0)
             if score > 0:
                 emotions[emotion] = min(score / len(patterns), 1.0)
         
@@ -246,31 +395,28 @@ class SentimentAgent(BaseAgent):
     
     def _combine_sentiment_results(self, results: Dict[str, Any]) -> Dict[str, Any]:
         """综合多种情感分析结果"""
-        labels = []
-        scores = []
-        confidences = []
-        
         # 收集所有结果
-        for method, result in results.items():
-            if method == 'emotions':
-                continue
-            
-            if isinstance(result, dict) and 'label' in result:
-                labels.append(result['label'])
-                scores.append(result.get('score', 0))
-                confidences.append(result.get('confidence', 0))
+        method_results = [
+            result for method, result in results.items()
+            if method != 'emotions' and isinstance(result, dict) and 'label' in result
+        ]
         
-        if not labels:
-            return {'label': 'neutral', 'score': 0.0, 'confidence': 0.0}
+        if not method_results:
+            return {'label': SentimentLabel.NEUTRAL, 'score': 0.0, 'confidence': 0.0}
         
-        # 投票决定最终标签
-        from collections import Counter
-        label_counts = Counter(labels)
-        final_label = label_counts.most_common(1)[0][0]
+        # 投票决定最终标签（票数相同时取先出现的方法）
+        label_counts: Dict[SentimentLabel, int] = {}
+        for result in method_results:
+            code = LABEL_CODES.get(result['label'], SentimentLabel.NEUTRAL)
+            label_counts[code] = label_counts.get(code, 0) + 1
+        final_label = max(label_counts, key=label_counts.get)
         
         # 计算平均分数和置信度
-        final_score = sum(scores) / len(scores) if scores else 0.0
-        final_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        count = len(method_results)
+        scores = np.fromiter((result.get('score', 0) for result in method_results), dtype=np.float64, count=count)
+        confidences = np.fromiter((result.get('confidence', 0) for result in method_results), dtype=np.float64, count=count)
+        final_score = float(scores.mean())
+        final_confidence = float(confidences.mean())
         
         return {
             'label': final_label,
@@ -279,34 +425,47 @@ class SentimentAgent(BaseAgent):
             'emotions': results.get('emotions', {})
         }
     
+    def _combine_single(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        """只有词典分析结果时直接采用其标签和分数"""
+        chinese = results['chinese']
+        return {
+            'label': LABEL_CODES.get(chinese['label'], SentimentLabel.NEUTRAL),
+            'score': float(chinese['score']),
+            'confidence': float(chinese['confidence']),
+            'emotions': results.get('emotions', {})
+        }
+    
     def _adjust_with_context(self, sentiment: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
-        """基于上下文调整情感分析结果"""
+        """基于上下文调整情感分析结果（标签为SentimentLabel编码）"""
         adjusted_sentiment = sentiment.copy()
+        label = sentiment['label']
         
         # 历史情感趋势
         if 'recent_sentiments' in context:
             recent_sentiments = context['recent_sentiments']
             if len(recent_sentiments) >= 3:
-                # 检查情感急剧变化
-                if all(s['label'] == 'negative' for s in recent_sentiments[-3:]):
-                    if sentiment['label'] == 'neutral':
-                        adjusted_sentiment['label'] = 'negative'
+                # 检查情感急剧变化：最近3条编码之和为±3即全部为负面/正面
+                recent_total = sum(LABEL_CODES.get(s['label'], SentimentLabel.NEUTRAL)
+                                   for s in recent_sentiments[-3:])
+                if recent_total == -3:
+                    if label == SentimentLabel.NEUTRAL:
+                        adjusted_sentiment['label'] = SentimentLabel.NEGATIVE
                         adjusted_sentiment['confidence'] *= 0.8
                 
-                elif all(s['label'] == 'positive' for s in recent_sentiments[-3:]):
-                    if sentiment['label'] == 'neutral':
-                        adjusted_sentiment['label'] = 'positive'
+                elif recent_total == 3:
+                    if label == SentimentLabel.NEUTRAL:
+                        adjusted_sentiment['label'] = SentimentLabel.POSITIVE
                         adjusted_sentiment['confidence'] *= 0.8
         
         # 会话阶段调整
         conversation_stage = context.get('conversation_stage', 'unknown')
         if conversation_stage == 'complaint_handling':
             # 投诉处理阶段，负面情感权重增加
-            if sentiment['label'] == 'negative':
+            if label == SentimentLabel.NEGATIVE:
                 adjusted_sentiment['confidence'] *= 1.2
         elif conversation_stage == 'order_confirmation':
             # 订单确认阶段，正面情感权重增加
-            if sentiment['label'] == 'positive':
+            if label == SentimentLabel.POSITIVE:
                 adjusted_sentiment['confidence'] *= 1.2
         
         return adjusted_sentiment
@@ -328,6 +487,10 @@ class SentimentAgent(BaseAgent):
         # 使用加权平均，更多方法同意的结果置信度更高
         return sum(confidences) / len(confidences)
     
+    def _confidence_single(self, results: Dict[str, Any]) -> float:
+        """只有词典分析结果时整体置信度即其置信度"""
+        return float(results['chinese']['confidence'])
+    
     def analyze_sentiment_trend(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
         """分析情感趋势"""
         if not messages:
@@ -342,12 +505,10 @@ class SentimentAgent(BaseAgent):
         if len(sentiments) < 2:
             return {'trend': 'insufficient_data', 'overall_sentiment': 'neutral'}
         
-        # 计算趋势
-        recent_scores = [s.get('score', 0) for s in sentiments[-5:]]
-        early_scores = [s.get('score', 0) for s in sentiments[:5]]
-        
-        recent_avg = sum(recent_scores) / len(recent_scores)
-        early_avg = sum(early_scores) / len(early_scores)
+        # 计算趋势（分数转为数组一次，首尾各5条取切片视图求均值）
+        scores = np.fromiter((s.get('score', 0) for s in sentiments), dtype=np.float64, count=len(sentiments))
+        recent_avg = float(scores[-5:].mean())
+        early_avg = float(scores[:5].mean())
         
         if recent_avg - early_avg > 0.2:
             trend = 'improving'
@@ -357,8 +518,7 @@ class SentimentAgent(BaseAgent):
             trend = 'stable'
         
         # 整体情感
-        all_scores = [s.get('score', 0) for s in sentiments]
-        overall_avg = sum(all_scores) / len(all_scores)
+        overall_avg = float(scores.mean())
         
         if overall_avg > 0.1:
             overall_sentiment = 'positive'
@@ -4,17 +4,36 @@
 """
 
 import re
-import jieba
-from typing import Dict, Any, List, Set
-from datetime import datetime, timedelta
+import heapq
+import asyncio
+import logging
+import threading
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Collection, Dict, Any, List, Optional, Set
 import json
 
 from .base_agent import BaseAgent
+from .context import get_analysis_context
+from .utils import KeywordMatcher, iso_now
+
+# 尝试导入Hyperscan（多正则一次扫描）
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+    logging.warning("hyperscan not available, using re for tag pattern matching")
 
 
 class TagAgent(BaseAgent):
     """用户打标签智能体"""
     
+    __slots__ = (
+        'tag_rules', 'behavior_weights', '_conflict_map', '_keyword_matcher', '_tag_patterns',
+        '_tag_pattern_union', '_pattern_tag_names', '_pattern_database', '_hs_local'
+    )
+    
     def __init__(self, config: Dict[str, Any] = None):
         super().__init__("tag_agent", config)
         
@@ -82,14 +101,97 @@ class TagAgent(BaseAgent):
         }
         
         # 行为权重配置
-        self.behavior_weights = {
+        self.behavior_weights = MappingProxyType({
             'message_count': 0.1,        # 消息数量
             'session_duration': 0.15,    # 会话时长
             'quick_response': 0.1,       # 快速回复
             'product_inquiry': 0.2,      # 产品询问
             'price_inquiry': 0.15,       # 价格询问
             'purchase_action': 0.3       # 购买行为
+        })
+        
+        # 冲突标签：同时出现时去掉前者，保留后者
+        self._conflict_map = MappingProxyType({
+            'low_intent': 'high_intent',
+            'price_insensitive': 'price_sensitive',
+            'hesitant': 'decisive',
+            'direct': 'polite'
+        })
+        
+        self._compile_tag_rules()
+    
+    def _compile_tag_rules(self):
+        """编译标签规则：全部关键词构建一个自动机，正则模式预编译（规则变化后需重新编译）"""
+        self._keyword_matcher = KeywordMatcher({
+            tag_name: rule['keywords'] for tag_name, rule in self.tag_rules.items()
+        })
+        self._tag_patterns = {
+            tag_name: [re.compile(pattern) for pattern in rule.get('patterns', [])]
+            for tag_name, rule in self.tag_rules.items()
+        }
+        # 每个标签的全部模式合并为一个分支正则，判断是否命中只需一次搜索
+        self._tag_pattern_union = {
+            tag_name: re.compile('|'.join(f'(?:{pattern})' for pattern in rule['patterns']))
+            for tag_name, rule in self.tag_rules.items()
+            if rule.get('patterns')
         }
+        self._compile_pattern_database()
+    
+    def _compile_pattern_database(self):
+        """
+        将全部标签的正则模式编译为一个Hyperscan数据库
+        
+        使用预过滤模式，一次扫描得到可能命中的标签（精确结果的超集），
+        再只对这些标签执行re确认，结果与逐个re.search一致。
+        """
+        self._pattern_tag_names = list(self._tag_pattern_union)
+        self._pattern_database = None
+        self._hs_local = threading.local()
+        if not HYPERSCAN_AVAILABLE or not self._pattern_tag_names:
+            return
+        
+        expressions, ids = [], []
+        for tag_id, tag_name in enumerate(self._pattern_tag_names):
+            for pattern in self.tag_rules[tag_name]['patterns']:
+                expressions.append(pattern.encode('utf-8'))
+                ids.append(tag_id)
+        try:
+            database = hyperscan.Database()
+            flags = (hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+                     | hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_SINGLEMATCH)
+            database.compile(expressions=expressions, ids=ids, elements=len(expressions),
+                             flags=[flags] * len(expressions))
+            self._pattern_database = database
+        except hyperscan.error as e:
+            self.logger.warning(f"Hyperscan compile failed, using re for tag pattern matching: {e}")
+    
+    def _pattern_candidates(self, message: str) -> Collection[str]:
+        """可能命中正则模式的标签"""
+        database = self._pattern_database
+        if database is None:
+            return self._tag_pattern_union.keys()
+        
+        # scratch不可跨线程共用，批量处理时每个工作线程各自分配
+        local = self._hs_local
+        if getattr(local, 'database', None) is not database:
+            local.database = database
+            local.scratch = hyperscan.Scratch(database)
+        
+        hits = set()
+        
+        def on_match(tag_id, start, end, flags, context):
+            hits.add(self._pattern_tag_names[tag_id])
+        
+        database.scan(message.encode('utf-8'), match_event_handler=on_match, scratch=local.scratch)
+        return hits
+    
+    def _keyword_hits(self, message_lower: str) -> Dict[str, int]:
+        """一次扫描统计各标签命中的关键词个数"""
+        hits: Dict[str, int] = {}
+        for order in {order for _, order, _, _ in self._keyword_matcher.iter(message_lower)}:
+            tag_name = self._keyword_matcher.keywords[order][0]
+            hits[tag_name] = hits.get(tag_name, 0) + 1
+        return hits
     
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """验证输入数据"""
@@ -98,13 +200,37 @@ class TagAgent(BaseAgent):
     
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """处理用户消息并生成标签"""
+        return self._tag_message(input_data)
+    
+    async def process_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量为多条消息生成标签
+        
+        整批在一个工作线程中处理，分词等计算不阻塞事件循环，也省去逐条调度的开销。
+        
+        Args:
+            items: 输入数据列表，格式与process相同
+            
+        Returns:
+            与输入顺序一致的标签结果列表
+        """
+        if not items:
+            return []
+        return await asyncio.to_thread(lambda: [self._tag_message(item) for item in items])
+    
+    def _tag_message(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """分析单条消息并生成标签结果"""
         user_id = input_data['user_id']
         message = input_data['message']
         session_data = input_data.get('session_data', {})
         user_history = input_data.get('user_history', [])
         
+        # 关键词和正则模式各只扫描一次，内容分析和置信度计算共用
+        keyword_hits = self._keyword_hits(get_analysis_context(input_data).message_lower)
+        pattern_candidates = self._pattern_candidates(message)
+        
         # 分析当前消息
-        content_tags = self._analyze_message_content(message)
+        content_tags = self._analyze_message_content(message, keyword_hits, pattern_candidates)
         
         # 分析用户行为
         behavior_tags = self._analyze_user_behavior(session_data, user_history)
@@ -113,7 +239,7 @@ class TagAgent(BaseAgent):
         all_tags = self._merge_tags(content_tags, behavior_tags)
         
         # 计算标签置信度
-        tag_scores = self._calculate_tag_scores(all_tags, message, session_data)
+        tag_scores = self._calculate_tag_scores(all_tags, message, session_data, keyword_hits, pattern_candidates)
         
         # 过滤低置信度标签
         filtered_tags = self._filter_tags(tag_scores)
@@ -124,32 +250,28 @@ class TagAgent(BaseAgent):
             'content_tags': content_tags,
             'behavior_tags': behavior_tags,
             'tag_scores': tag_scores,
-            'analysis_time': datetime.now().isoformat()
+            'analysis_time': iso_now()
         }
         
         self.logger.info(f"Generated tags for user {user_id}: {filtered_tags}")
         
         return result
     
-    def _analyze_message_content(self, message: str) -> List[str]:
+    def _analyze_message_content(self, message: str, keyword_hits: Optional[Dict[str, int]] = None,
+                                 pattern_candidates: Optional[Collection[str]] = None) -> List[str]:
         """分析消息内容生成标签"""
         tags = []
-        message_lower = message.lower()
         
-        # 分词
-        words = list(jieba.cut(message))
+        # 检查关键词（全部标签一次扫描）
+        if keyword_hits is None:
+            keyword_hits = self._keyword_hits(message.lower())
+        if pattern_candidates is None:
+            pattern_candidates = self._pattern_candidates(message)
         
-        for tag_name, rule in self.tag_rules.items():
-            # 检查关键词
-            keyword_matches = sum(1 for keyword in rule['keywords'] 
-                                if keyword in message_lower)
-            
-            # 检查正则模式
-            pattern_matches = sum(1 for pattern in rule.get('patterns', [])
-                                if re.search(pattern, message))
-            
-            # 如果有匹配，添加标签
-            if keyword_matches > 0 or pattern_matches > 0:
+        for tag_name in self.tag_rules:
+            # 关键词或正则模式有匹配，添加标签
+            if tag_name in keyword_hits or (tag_name in pattern_candidates
+                                            and self._tag_pattern_union[tag_name].search(message)):
                 tags.append(tag_name)
         
         return tags
@@ -186,52 +308,54 @@ class TagAgent(BaseAgent):
             if total_sessions > 5:
                 tags.append('frequent_visitor')
             
-            # 分析购买历史
-            purchase_sessions = [s for s in user_history 
-                               if s.get('has_purchase', False)]
-            if purchase_sessions:
+            # 分析购买历史（超过2次即可确定全部标签，提前结束）
+            purchase_count = 0
+            for session in user_history:
+                if session.get('has_purchase', False):
+                    purchase_count += 1
+                    if purchase_count > 2:
+                        break
+            if purchase_count:
                 tags.append('previous_buyer')
-                if len(purchase_sessions) > 2:
+                if purchase_count > 2:
                     tags.append('loyal_customer')
         
         return tags
     
     def _merge_tags(self, content_tags: List[str], behavior_tags: List[str]) -> List[str]:
         """合并内容标签和行为标签"""
-        all_tags = list(set(content_tags + behavior_tags))
-        
-        # 处理冲突标签
-        conflicts = [
-            ('high_intent', 'low_intent'),
-            ('price_sensitive', 'price_insensitive'),
-            ('decisive', 'hesitant'),
-            ('polite', 'direct')
-        ]
-        
-        for tag1, tag2 in conflicts:
-            if tag1 in all_tags and tag2 in all_tags:
-                # 保留出现频率更高的标签，这里简化为保留第一个
-                all_tags.remove(tag2)
-        
-        return all_tags
+        # 按出现顺序去重（内容标签在前）
+        all_tags = dict.fromkeys(content_tags)
+        all_tags.update(dict.fromkeys(behavior_tags))
+        
+        # 处理冲突标签（保留出现频率更高的标签，这里简化为保留第一个）
+        for loser, winner in self._conflict_map.items():
+            if winner in all_tags:
+                all_tags.pop(loser, None)
+        
+        return list(all_tags)
     
     def _calculate_tag_scores(self, tags: List[str], message: str, 
-                            session_data: Dict[str, Any]) -> Dict[str, float]:
+                            session_data: Dict[str, Any],
+                            keyword_hits: Optional[Dict[str, int]] = None,
+                            pattern_candidates: Optional[Collection[str]] = None) -> Dict[str, float]:
         """计算标签置信度分数"""
         scores = {}
+        if keyword_hits is None:
+            keyword_hits = self._keyword_hits(message.lower())
+        if pattern_candidates is None:
+            pattern_candidates = self._pattern_candidates(message)
         
         for tag in tags:
             score = 0.5  # 基础分数
             
             # 基于关键词频率调整分数
             if tag in self.tag_rules:
-                rule = self.tag_rules[tag]
-                keyword_count = sum(1 for keyword in rule['keywords']
-                                  if keyword in message.lower())
+                keyword_count = keyword_hits.get(tag, 0)
                 score += keyword_count * 0.1
                 
-                pattern_count = sum(1 for pattern in rule.get('patterns', [])
-                                  if re.search(pattern, message))
+                pattern_count = sum(1 for pattern in self._tag_patterns[tag]
+                                  if pattern.search(message)) if tag in pattern_candidates else 0
                 score += pattern_count * 0.15
             
             # 基于行为数据调整分数
@@ -256,12 +380,14 @@ class TagAgent(BaseAgent):
             'keywords': keywords,
             'patterns': patterns or []
         }
+        self._compile_tag_rules()
         self.logger.info(f"Added custom tag rule: {tag_name}")
     
     def remove_tag_rule(self, tag_name: str):
         """移除标签规则"""
         if tag_name in self.tag_rules:
             del self.tag_rules[tag_name]
+            self._compile_tag_rules()
             self.logger.info(f"Removed tag rule: {tag_name}")
     
     def get_available_tags(self) -> List[str]:
@@ -287,5 +413,5 @@ class TagAgent(BaseAgent):
             'total_users': total_users,
             'tag_counts': tag_counts,
             'tag_rates': tag_rates,
-            'most_common_tags': sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+            'most_common_tags': heapq.nlargest(10, tag_counts.items(), key=itemgetter(1))
         } 
\ No newline at end of file
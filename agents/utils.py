@@ -0,0 +1,218 @@
+"""
+智能体通用工具函数
+"""
+
+import hashlib
+import json
+import logging
+import sys
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple, Union
+
+# 尝试导入orjson（C实现，序列化速度更快）
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# 尝试导入Aho-Corasick自动机（多关键词单次扫描）
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+    logging.warning("pyahocorasick not available, using per-keyword scan")
+
+# 尝试导入xxhash（非加密哈希，短数据比md5快一个数量级）
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+
+def json_dumps(obj: Any) -> str:
+    """序列化为JSON字符串，保留中文字符"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def json_dumps_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+    """序列化为UTF-8编码的JSON字节串（用于HTTP请求体、上下文摘要），无法序列化的值转为字符串"""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, option=option, default=str)
+    return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, default=str).encode('utf-8')
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """解析JSON（可直接传入响应字节串）"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# 最近一次格式化的时间戳（毫秒, ISO字符串）
+_last_iso = (0, '')
+
+
+def iso_now() -> str:
+    """当前本地时间的ISO字符串（毫秒精度，同一毫秒内复用格式化结果）"""
+    global _last_iso
+    now_ms = time.time_ns() // 1_000_000
+    cached_ms, cached_iso = _last_iso
+    if now_ms != cached_ms:
+        cached_iso = datetime.fromtimestamp(now_ms / 1000).isoformat(timespec='milliseconds')
+        _last_iso = (now_ms, cached_iso)
+    return cached_iso
+
+
+def normalize_text(text: str) -> str:
+    """文本归一化（全半角统一、去首尾空白、小写），用于构造缓存键"""
+    return unicodedata.normalize('NFKC', text).strip().lower()
+
+
+def stable_hash(text: str) -> str:
+    """跨进程稳定的内容哈希"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def content_fingerprint(text: str, prefix: int = 512) -> int:
+    """
+    内容指纹（跨进程稳定），用于结果去重
+    
+    只对前 prefix 个字符取哈希并附加总长度，长文档无需整段哈希。
+    """
+    digest = hashlib.blake2b(text[:prefix].encode('utf-8'), digest_size=8).digest()
+    return (len(text) << 64) | int.from_bytes(digest, 'big')
+
+
+def record_hash(obj: Any) -> str:
+    """对象内容哈希（按键排序的规范JSON），用于记录去重"""
+    if ORJSON_AVAILABLE:
+        data = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+class KeywordMatcher:
+    """多关键词匹配器，按类别组织的关键词表一次扫描找出全部命中"""
+    
+    def __init__(self, keyword_map: Dict[str, List[str]]):
+        # 展开为(类别, 关键词)列表，下标即原表中的先后顺序
+        self.keywords: List[Tuple[str, str]] = [
+            (sys.intern(category), sys.intern(keyword))
+            for category, keywords in keyword_map.items()
+            for keyword in keywords
+            if keyword
+        ]
+        
+        # 首字 -> 关键词序号（无自动机时按文本中出现的字筛选候选关键词）
+        self._by_first_char: Dict[str, List[int]] = {}
+        for order, (_, keyword) in enumerate(self.keywords):
+            self._by_first_char.setdefault(keyword[0], []).append(order)
+        
+        self._automaton = None
+        if AHOCORASICK_AVAILABLE and self.keywords:
+            self._automaton = ahocorasick.Automaton()
+            for order, (category, keyword) in enumerate(self.keywords):
+                # 同一关键词可能属于多个类别
+                entries = self._automaton.get(keyword, ())
+                self._automaton.add_word(keyword, entries + ((order, category, keyword),))
+            self._automaton.make_automaton()
+    
+    def iter(self, text: str) -> Iterator[Tuple[int, int, str, str]]:
+        """
+        扫描文本
+        
+        Yields:
+            (关键词结束位置, 关键词序号, 类别, 关键词)
+        """
+        if self._automaton is not None:
+            for end, entries in self._automaton.iter(text):
+                for order, category, keyword in entries:
+                    yield end, order, category, keyword
+            return
+        
+        for order in self._candidates(text):
+            category, keyword = self.keywords[order]
+            start = text.find(keyword)
+            while start != -1:
+                yield start + len(keyword) - 1, order, category, keyword
+                start = text.find(keyword, start + 1)
+    
+    def _candidates(self, text: str) -> List[int]:
+        """首字出现在文本中的关键词序号（升序）"""
+        return sorted(
+            order
+            for char in self._by_first_char.keys() & set(text)
+            for order in self._by_first_char[char]
+        )
+    
+    def counts(self, text: str) -> Dict[int, int]:
+        """各关键词在文本中不重叠出现的次数（与str.count一致），键为关键词序号"""
+        counts: Dict[int, int] = {}
+        if self._automaton is None:
+            # 无自动机时候选关键词直接用str.count计数
+            for order in self._candidates(text):
+                count = text.count(self.keywords[order][1])
+                if count:
+                    counts[order] = count
+            return counts
+        
+        last_end: Dict[int, int] = {}
+        for end, order, _, keyword in self.iter(text):
+            # 与同一关键词上一次命中重叠的不计数
+            if end - len(keyword) < last_end.get(order, -1):
+                continue
+            last_end[order] = end
+            counts[order] = counts.get(order, 0) + 1
+        return counts
+
+
+class TTLCache:
+    """带过期时间的LRU缓存"""
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，过期条目视为未命中"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if self.maxsize <= 0:
+            return
+        
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def clear(self):
+        """清空缓存"""
+        self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,20 +1,55 @@
 """
 AI智能客服代理核心模块
 """
-import json
+import asyncio
+import hashlib
+import inspect
 import logging
+import os
+import threading
 import time
-from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Tuple, Any
+from dataclasses import dataclass, replace
+from functools import lru_cache
+
+from agents.semantic_cache import SemanticCache, SEMANTIC_CACHE_AVAILABLE
+from agents.utils import TTLCache, json_dumps_bytes
 
 from .knowledge_search import KnowledgeSearchEngine
 from .intent_recognition import IntentRecognizer
 from .sentiment_analysis import SentimentAnalyzer
 from .response_generator import ResponseGenerator
 from .model_providers import ModelProviderFactory
+from .batched_generator import BatchedGenerator
 
 logger = logging.getLogger(__name__)
 
+# 尝试导入分词计数依赖
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    logger.warning("tiktoken not available, token budgets fall back to character counts")
+
+
+@lru_cache(maxsize=None)
+def _load_tokenizer(model_name: str):
+    """按模型名加载tiktoken编码（进程内缓存），未知模型使用cl100k_base；编码文件无法加载（如离线环境）时返回None"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        logger.warning(f"tiktoken编码加载失败，按字符数估算token: {e}")
+        return None
+
 
 @dataclass
 class AgentResponse:
@@ -49,24 +84,160 @@ class SmartTalkAgent:
         self.sentiment_analyzer = SentimentAnalyzer()
         self.response_generator = ResponseGenerator(agent_config)
         
+        # 意图识别、情感分析的同步模型放到线程池执行，不阻塞事件循环（cpu_pool_workers为0时直接调用）
+        # 线程池在首次调用同步方法时创建，组件均为异步实现时不创建
+        self._cpu_workers = agent_config.get('cpu_pool_workers', os.cpu_count() or 1)
+        self._cpu_pool: Optional[ThreadPoolExecutor] = None
+        self._cpu_pool_lock = threading.Lock()
+        self._recognize_intent = self._offloaded(self.intent_recognizer, 'recognize')
+        self._analyze_message_sentiment = self._offloaded(self.sentiment_analyzer, 'analyze')
+        
         # 初始化AI模型提供商
         model_config = agent_config.get('ai_model', {})
         self.model_provider = ModelProviderFactory.create_provider(model_config)
         
+        # 提供商支持批量生成时，并发会话的生成请求在短窗口内合批提交
+        self._generation_provider = self.model_provider
+        if hasattr(self.model_provider, 'generate_batch') and agent_config.get('generation_batch_size', 8) > 1:
+            self._generation_provider = BatchedGenerator(
+                self.model_provider,
+                max_batch=agent_config.get('generation_batch_size', 8),
+                max_wait_ms=agent_config.get('generation_batch_wait_ms', 10.0)
+            )
+        
         # 代理设置
         self.system_prompt = agent_config.get('system_prompt', self._default_system_prompt())
         self.personality = agent_config.get('personality', '')
+        
+        # 系统提示词和人设每轮不变，预先拼成固定前缀，推理服务可复用这段前缀的KV缓存
+        self._system_prefix = '\n\n'.join(part for part in (self.system_prompt, self.personality) if part)
+        self.prefix_id = hashlib.blake2b(self._system_prefix.encode('utf-8'), digest_size=16).hexdigest()
+        self._prefix_handle = None
+        self._prefix_warmed = False
+        self._build_static_context()
         self.max_context_length = agent_config.get('max_context_length', 10)
+        # 对话历史和知识库内容按token预算截断
+        self.max_context_tokens = agent_config.get('max_context_tokens', 2048)
+        self.max_knowledge_tokens = agent_config.get('max_knowledge_tokens', 1024)
+        self._tokenizer = _load_tokenizer(self.model_provider.model_name)
         self.confidence_threshold = agent_config.get('confidence_threshold', 0.8)
         self.temperature = agent_config.get('temperature', 0.7)
+        # 流式输出时每收到多少个片段返回一次部分回复
+        self.stream_chunk_tokens = max(1, agent_config.get('stream_chunk_tokens', 8))
+        self.handover_message = agent_config.get(
+            'handover_message', "您的问题需要人工客服进一步处理，正在为您转接，请稍候。"
+        )
         
         # 功能开关
         self.enable_knowledge_search = agent_config.get('enable_knowledge_search', True)
         self.enable_intent_recognition = agent_config.get('enable_intent_recognition', True)
         self.enable_sentiment_analysis = agent_config.get('enable_sentiment_analysis', True)
         
+        # 回复缓存（涉及敏感信息的流程可通过no_cache关闭）
+        self.no_cache = agent_config.get('no_cache', False)
+        
+        # 精确匹配回复缓存：相同消息+相近上下文直接复用回复（如重复的问候、致谢）
+        self._response_cache = TTLCache(
+            maxsize=agent_config.get('response_cache_size', 2048),
+            ttl=agent_config.get('response_cache_ttl', 300)
+        )
+        # 相同请求并发到达时只处理一次，其余等待缓存结果
+        self._inflight_locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        
+        # 语义回复缓存：同一问题的不同问法复用回复，每个代理实例独立
+        self._semantic_cache = None
+        if SEMANTIC_CACHE_AVAILABLE and agent_config.get('enable_semantic_cache', False):
+            self._semantic_cache = SemanticCache(
+                model_name=agent_config.get('semantic_cache_model', 'paraphrase-multilingual-MiniLM-L12-v2'),
+                threshold=agent_config.get('semantic_cache_threshold', 0.86),
+                ttl=agent_config.get('semantic_cache_ttl', 3600),
+                max_entries=agent_config.get('semantic_cache_max_clusters', 4096),
+                max_namespaces=agent_config.get('semantic_cache_max_namespaces', 1024),
+                clustered=True,
+                max_batch=agent_config.get('embedding_batch_size', 32),
+                max_wait_ms=agent_config.get('embedding_batch_wait_ms', 10.0),
+                onnx_model=agent_config.get('semantic_cache_onnx_model'),
+                onnx_threads=agent_config.get('semantic_cache_onnx_threads', 2)
+            )
+        
+        # 性能指标由实例配置决定，预先构建快照，查询时返回副本
+        self._metrics_snapshot = self._build_metrics_snapshot()
+        
         logger.info(f"AI代理 {self.name} 初始化完成")
     
+    def _offloaded(self, component: Any, method_name: str):
+        """
+        返回组件方法的异步调用入口
+        
+        组件提供同步实现（<method>_sync，或method本身不是协程函数）时放到线程池执行，
+        否则直接使用原异步方法。
+        """
+        method = getattr(component, method_name)
+        sync_method = getattr(component, f'{method_name}_sync', None)
+        if sync_method is None and not inspect.iscoroutinefunction(method):
+            sync_method = method
+        if sync_method is None:
+            return method
+        
+        async def call(*args):
+            pool = self._get_cpu_pool()
+            if pool is None:
+                return sync_method(*args)
+            return await asyncio.get_running_loop().run_in_executor(pool, sync_method, *args)
+        return call
+    
+    def _get_cpu_pool(self) -> Optional[ThreadPoolExecutor]:
+        """返回线程池，首次调用时创建（cpu_pool_workers为0时返回None）"""
+        if self._cpu_pool is None and self._cpu_workers > 0:
+            with self._cpu_pool_lock:
+                if self._cpu_pool is None:
+                    self._cpu_pool = ThreadPoolExecutor(
+                        max_workers=self._cpu_workers, thread_name_prefix='smarttalk-cpu'
+                    )
+        return self._cpu_pool
+    
+    async def close(self):
+        """释放线程池，停止批量生成和语义缓存向量计算的分发任务"""
+        with self._cpu_pool_lock:
+            pool, self._cpu_pool = self._cpu_pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if self._generation_provider is not self.model_provider:
+            await self._generation_provider.close()
+        if self._semantic_cache is not None:
+            await self._semantic_cache.close()
+    
+    def _count_tokens(self, text: str) -> int:
+        """估算文本token数（无tiktoken时按字符数计，中文约一字一token）"""
+        if self._tokenizer is None:
+            return len(text)
+        return len(self._tokenizer.encode_ordinary(text))
+    
+    def _truncate_history(self, history: List[Any]) -> List[Any]:
+        """保留最近的对话：最多max_context_length条（不大于0时不限条数），且内容总token数不超过max_context_tokens"""
+        if self.max_context_length > 0:
+            history = history[-self.max_context_length:]
+        budget = self.max_context_tokens
+        kept = 0
+        for item in reversed(history):
+            content = item.get('content', '') if isinstance(item, dict) else str(item)
+            budget -= self._count_tokens(content or '')
+            if budget < 0:
+                break
+            kept += 1
+        return history[len(history) - kept:] if kept else []
+    
+    def _truncate_knowledge(self, knowledge_results: List[Dict]) -> List[Dict]:
+        """按相关度保留知识条目，最多5条且内容总token数不超过max_knowledge_tokens（至少保留最相关的一条）"""
+        budget = self.max_knowledge_tokens
+        kept = []
+        for item in knowledge_results[:5]:
+            budget -= self._count_tokens(item.get('content') or '')
+            if budget < 0 and kept:
+                break
+            kept.append(item)
+        return kept
+    
     def _default_system_prompt(self) -> str:
         """默认系统提示词"""
         return """你是一个专业的AI客服助手，名字叫SmartTalk。你的任务是：
@@ -92,6 +263,9 @@ class SmartTalkAgent:
         """
         处理客户消息
         
+        相同消息在相同上下文下的回复会在有效期内直接复用，
+        未精确命中时再按语义相似度查找同一问题其他问法的回复。
+        
         Args:
             message: 客户消息内容
             conversation_context: 对话上下文
@@ -100,32 +274,79 @@ class SmartTalkAgent:
         Returns:
             AgentResponse: 代理回复结果
         """
-        start_time = time.time()
+        # 连续失败已达转人工条件时不读缓存，走完整流程转人工
+        if self.no_cache or self._failed_attempts_exceeded(conversation_context):
+            return await self._process_pipeline(message, conversation_context, customer_info)
         
-        try:
-            # 1. 意图识别
-            intent_result = None
-            if self.enable_intent_recognition:
-                intent_result = await self.intent_recognizer.recognize(message)
-                logger.debug(f"意图识别结果: {intent_result}")
+        cache_key = self._response_cache_key(message, conversation_context, customer_info)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached
+        
+        lock = self._inflight_locks.get(cache_key)
+        if lock is None:
+            lock = self._inflight_locks[cache_key] = asyncio.Lock()
+        
+        async with lock:
+            # 等锁期间相同请求可能已处理完成
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                return cached
+            
+            semantic_namespace, embedding, cached = await self._semantic_cache_probe(
+                message, conversation_context, customer_info
+            )
+            if cached is not None:
+                return cached
             
-            # 2. 情感分析
-            sentiment_result = None
-            if self.enable_sentiment_analysis:
-                sentiment_result = await self.sentiment_analyzer.analyze(message)
-                logger.debug(f"情感分析结果: {sentiment_result}")
+            response = await self._process_pipeline(message, conversation_context, customer_info)
+            self._store_response(response, cache_key, semantic_namespace, embedding)
+            return response
+    
+    async def process_message_stream(
+        self,
+        message: str,
+        conversation_context: Dict,
+        customer_info: Optional[Dict] = None
+    ) -> AsyncIterator[AgentResponse]:
+        """
+        流式处理客户消息，回复边生成边返回
+        
+        生成过程中每收到 stream_chunk_tokens 个片段返回一次部分回复
+        （metadata中partial为True，content为已生成的全部文本），最后返回与process_message相同的完整结果。
+        命中缓存或直接转人工时只返回完整结果。
+        
+        Args:
+            message: 客户消息内容
+            conversation_context: 对话上下文
+            customer_info: 客户信息
             
-            # 3. 知识库搜索
-            knowledge_results = []
-            if self.enable_knowledge_search:
-                knowledge_results = await self.knowledge_engine.search(
-                    query=message,
-                    intent=intent_result.get('intent') if intent_result else None,
-                    context=conversation_context
+        Yields:
+            AgentResponse: 部分回复及最终回复
+        """
+        cache_key = semantic_namespace = embedding = None
+        if not self.no_cache and not self._failed_attempts_exceeded(conversation_context):
+            cache_key = self._response_cache_key(message, conversation_context, customer_info)
+            cached = self._cached_response(cache_key)
+            if cached is None:
+                semantic_namespace, embedding, cached = await self._semantic_cache_probe(
+                    message, conversation_context, customer_info
                 )
-                logger.debug(f"知识库搜索结果: {len(knowledge_results)} 条")
+            if cached is not None:
+                yield cached
+                return
+        
+        start_time = time.time()
+        try:
+            intent_result, knowledge_results, sentiment_result = await self._analyze(message, conversation_context)
+            
+            handover = self._pre_llm_handover_response(
+                intent_result, knowledge_results, sentiment_result, start_time, conversation_context
+            )
+            if handover is not None:
+                yield handover
+                return
             
-            # 4. 构建对话上下文
             enhanced_context = self._build_enhanced_context(
                 message=message,
                 conversation_context=conversation_context,
@@ -135,47 +356,307 @@ class SmartTalkAgent:
                 customer_info=customer_info
             )
             
-            # 5. 生成回复
-            response = await self.response_generator.generate(
+            chunks = []
+            result = None
+            async for item in self._generate_stream(message, enhanced_context):
+                # 文本为增量片段，字典为生成结束时的完整结果（含置信度）
+                if isinstance(item, dict):
+                    result = item
+                    continue
+                chunks.append(item)
+                if len(chunks) % self.stream_chunk_tokens == 0:
+                    yield AgentResponse(content=''.join(chunks), confidence=0.0, metadata={'partial': True})
+            
+            response = self._final_response(
+                {'content': ''.join(chunks), **(result or {})},
+                intent_result, knowledge_results, sentiment_result, start_time
+            )
+        except Exception as e:
+            logger.error(f"流式处理消息时发生错误: {str(e)}", exc_info=True)
+            response = self._error_response(e)
+        
+        if cache_key is not None:
+            self._store_response(response, cache_key, semantic_namespace, embedding)
+        yield response
+    
+    async def _generate_stream(self, message: str, enhanced_context: Dict) -> AsyncIterator[Any]:
+        """
+        流式生成回复
+        
+        回复生成器的generate_stream逐个返回文本片段，最后可返回一个与generate结果相同格式的字典（含置信度）；
+        不支持流式时整段生成后一次返回结果字典。
+        """
+        generate_stream = getattr(self.response_generator, 'generate_stream', None)
+        if generate_stream is None:
+            yield await self.response_generator.generate(
                 message=message,
                 context=enhanced_context,
-                model_provider=self.model_provider
+                model_provider=self._generation_provider
             )
+            return
+        
+        async for item in generate_stream(
+            message=message,
+            context=enhanced_context,
+            model_provider=self._generation_provider
+        ):
+            yield item
+    
+    async def _semantic_cache_probe(
+        self,
+        message: str,
+        conversation_context: Dict,
+        customer_info: Optional[Dict]
+    ) -> Tuple[str, Optional[Any], Optional[AgentResponse]]:
+        """查找语义缓存，返回(命名空间, 消息向量, 命中的回复)"""
+        # 语义缓存按最近两轮对话及商品/客户上下文划分命名空间，对话进展或客户、商品不同时互不命中
+        semantic_namespace = self._context_digest(
+            conversation_context.get('conversation_history', [])[-2:],
+            conversation_context.get('product_context'),
+            customer_info
+        )
+        if self._semantic_cache is None:
+            return semantic_namespace, None, None
+        embedding, cached = await self._semantic_lookup(message, semantic_namespace)
+        return semantic_namespace, embedding, cached
+    
+    def _store_response(
+        self,
+        response: AgentResponse,
+        cache_key: Tuple[Any, str, str],
+        semantic_namespace: Optional[str],
+        embedding: Optional[Any]
+    ):
+        """只缓存无需人工接管且置信度达标的回复"""
+        if response.should_handover or response.confidence < self.confidence_threshold:
+            return
+        self._response_cache.set(cache_key, response)
+        if embedding is not None:
+            self._semantic_cache.store(semantic_namespace, embedding, response)
+    
+    async def _semantic_lookup(self, message: str, namespace: str) -> Tuple[Optional[Any], Optional[AgentResponse]]:
+        """计算消息向量并查找语义缓存，返回(向量, 命中的回复)；向量计算失败时不使用语义缓存"""
+        try:
+            embedding = await self._semantic_cache.embed(message)
+        except Exception as e:
+            logger.warning("语义缓存向量计算失败: %s", e)
+            return None, None
+        
+        hit = self._semantic_cache.lookup(namespace, embedding)
+        if hit is None:
+            return embedding, None
+        return embedding, replace(hit, metadata={**(hit.metadata or {}), 'cache': 'semantic'})
+    
+    def _response_cache_key(
+        self,
+        message: str,
+        conversation_context: Dict,
+        customer_info: Optional[Dict]
+    ) -> Tuple[Any, str, str]:
+        """缓存键：代理ID、规范化消息、最近两轮对话及商品/客户上下文的摘要"""
+        normalized = ' '.join(message.lower().split())
+        return self.agent_id, normalized, self._context_digest(
+            conversation_context.get('conversation_history', [])[-2:],
+            conversation_context.get('product_context'),
+            customer_info
+        )
+    
+    @staticmethod
+    def _context_digest(*parts: Any) -> str:
+        """上下文内容摘要"""
+        return hashlib.blake2b(json_dumps_bytes(parts, sort_keys=True), digest_size=16).hexdigest()
+    
+    def _cached_response(self, cache_key: Tuple[Any, str, str]) -> Optional[AgentResponse]:
+        """读取缓存回复（返回标记了命中类型的副本）"""
+        hit = self._response_cache.get(cache_key)
+        if hit is None:
+            return None
+        return replace(hit, metadata={**(hit.metadata or {}), 'cache': 'exact'})
+    
+    async def _process_pipeline(
+        self,
+        message: str,
+        conversation_context: Dict,
+        customer_info: Optional[Dict]
+    ) -> AgentResponse:
+        """执行完整处理流程（意图、情感、知识库、生成）"""
+        start_time = time.time()
+        
+        try:
+            intent_result, knowledge_results, sentiment_result = await self._analyze(message, conversation_context)
             
-            # 6. 判断是否需要人工接管
-            should_handover = self._should_handover_to_human(
+            handover = self._pre_llm_handover_response(
+                intent_result, knowledge_results, sentiment_result, start_time, conversation_context
+            )
+            if handover is not None:
+                return handover
+            
+            # 4. 构建对话上下文
+            enhanced_context = self._build_enhanced_context(
+                message=message,
+                conversation_context=conversation_context,
                 intent_result=intent_result,
                 sentiment_result=sentiment_result,
-                confidence=response.get('confidence', 0.0),
-                conversation_context=conversation_context
+                knowledge_results=knowledge_results,
+                customer_info=customer_info
             )
             
-            execution_time = (time.time() - start_time) * 1000
-            logger.info(f"消息处理完成，耗时: {execution_time:.2f}ms")
-            
-            return AgentResponse(
-                content=response.get('content', ''),
-                confidence=response.get('confidence', 0.0),
-                intent=intent_result.get('intent') if intent_result else None,
-                entities=intent_result.get('entities') if intent_result else None,
-                sentiment=sentiment_result.get('sentiment') if sentiment_result else None,
-                knowledge_used=knowledge_results,
-                should_handover=should_handover,
-                metadata={
-                    'execution_time': execution_time,
-                    'model_used': self.model_provider.model_name,
-                    'knowledge_count': len(knowledge_results)
-                }
+            # 5. 生成回复
+            response = await self.response_generator.generate(
+                message=message,
+                context=enhanced_context,
+                model_provider=self._generation_provider
             )
             
+            return self._final_response(response, intent_result, knowledge_results, sentiment_result, start_time)
+            
         except Exception as e:
             logger.error(f"处理消息时发生错误: {str(e)}", exc_info=True)
-            return AgentResponse(
-                content="抱歉，我遇到了一些技术问题，请稍后再试或联系人工客服。",
-                confidence=0.0,
-                should_handover=True,
-                metadata={'error': str(e)}
+            return self._error_response(e)
+    
+    async def _analyze(
+        self,
+        message: str,
+        conversation_context: Dict
+    ) -> Tuple[Optional[Dict], List[Dict], Optional[Dict]]:
+        """分析消息，返回(意图结果, 知识库结果, 情感结果)"""
+        # 1-3. 意图识别→知识库搜索 与 情感分析 并发执行（知识库搜索只依赖意图结果），同时预热前缀缓存
+        (intent_result, knowledge_results), sentiment_result, _ = await asyncio.gather(
+            self._recognize_and_search(message, conversation_context),
+            self._analyze_sentiment(message),
+            self._prewarm_prefix()
+        )
+        return intent_result, knowledge_results, sentiment_result
+    
+    def _pre_llm_handover_response(
+        self,
+        intent_result: Optional[Dict],
+        knowledge_results: List[Dict],
+        sentiment_result: Optional[Dict],
+        start_time: float,
+        conversation_context: Dict
+    ) -> Optional[AgentResponse]:
+        """意图、情感、失败次数已确定需要人工接管时直接返回转人工回复，不再调用模型生成"""
+        if not self._handover_pre_llm(intent_result, sentiment_result, conversation_context):
+            return None
+        
+        execution_time = (time.time() - start_time) * 1000
+        return AgentResponse(
+            content=self.handover_message,
+            confidence=0.0,
+            intent=intent_result.get('intent') if intent_result else None,
+            entities=intent_result.get('entities') if intent_result else None,
+            sentiment=sentiment_result.get('sentiment') if sentiment_result else None,
+            knowledge_used=knowledge_results,
+            should_handover=True,
+            metadata={
+                'execution_time': execution_time,
+                'handover': 'pre_llm',
+                'knowledge_count': len(knowledge_results)
+            }
+        )
+    
+    def _final_response(
+        self,
+        response: Dict,
+        intent_result: Optional[Dict],
+        knowledge_results: List[Dict],
+        sentiment_result: Optional[Dict],
+        start_time: float
+    ) -> AgentResponse:
+        """根据生成结果组装最终回复"""
+        # 6. 判断回复置信度是否需要人工接管
+        should_handover = self._handover_post_llm(response.get('confidence', 0.0))
+        
+        execution_time = (time.time() - start_time) * 1000
+        # 耗时同时作为结构化字段输出，便于日志采集
+        logger.info("消息处理完成，耗时: %.2fms", execution_time, extra={'execution_time_ms': execution_time})
+        
+        return AgentResponse(
+            content=response.get('content', ''),
+            confidence=response.get('confidence', 0.0),
+            intent=intent_result.get('intent') if intent_result else None,
+            entities=intent_result.get('entities') if intent_result else None,
+            sentiment=sentiment_result.get('sentiment') if sentiment_result else None,
+            knowledge_used=knowledge_results,
+            should_handover=should_handover,
+            metadata={
+                'execution_time': execution_time,
+                'model_used': self.model_provider.model_name,
+                'knowledge_count': len(knowledge_results)
+            }
+        )
+    
+    @staticmethod
+    def _error_response(error: Exception) -> AgentResponse:
+        """处理出错时的转人工回复"""
+        return AgentResponse(
+            content="抱歉，我遇到了一些技术问题，请稍后再试或联系人工客服。",
+            confidence=0.0,
+            should_handover=True,
+            metadata={'error': str(error)}
+        )
+    
+    async def _prewarm_prefix(self):
+        """向支持前缀缓存的模型提供商注册固定前缀（仅执行一次，失败时按普通请求处理）"""
+        if self._prefix_warmed:
+            return
+        self._prefix_warmed = True
+        
+        prewarm = getattr(self.model_provider, 'prewarm_prefix', None)
+        if prewarm is None:
+            return
+        try:
+            handle = prewarm(self._system_prefix)
+            if asyncio.iscoroutine(handle):
+                handle = await handle
+            self._prefix_handle = handle
+            self._build_static_context()
+        except Exception as e:
+            logger.warning(f"前缀缓存预热失败: {e}")
+    
+    async def _recognize_and_search(
+        self,
+        message: str,
+        conversation_context: Dict
+    ) -> Tuple[Optional[Dict], List[Dict]]:
+        """意图识别后按意图搜索知识库"""
+        # 1. 意图识别
+        intent_result = None
+        if self.enable_intent_recognition:
+            intent_result = await self._recognize_intent(message)
+            logger.debug("意图识别结果: %s", intent_result)
+        
+        # 3. 知识库搜索
+        knowledge_results = []
+        if self.enable_knowledge_search:
+            knowledge_results = await self.knowledge_engine.search(
+                query=message,
+                intent=intent_result.get('intent') if intent_result else None,
+                context=conversation_context
             )
+            logger.debug("知识库搜索结果: %d 条", len(knowledge_results))
+        
+        return intent_result, knowledge_results
+    
+    async def _analyze_sentiment(self, message: str) -> Optional[Dict]:
+        """情感分析"""
+        # 2. 情感分析
+        sentiment_result = None
+        if self.enable_sentiment_analysis:
+            sentiment_result = await self._analyze_message_sentiment(message)
+            logger.debug("情感分析结果: %s", sentiment_result)
+        return sentiment_result
+    
+    def _build_static_context(self):
+        """构建上下文中每轮不变的部分（前缀缓存句柄变化时重建）"""
+        self._static_context = {
+            'system_prompt': self.system_prompt,
+            'personality': self.personality,
+            # 预先拼好的固定前缀及其标识，生成时作为首条消息原样发送以命中前缀缓存
+            'system_prefix': self._system_prefix,
+            'prefix_id': self._prefix_handle or self.prefix_id,
+        }
     
     def _build_enhanced_context(
         self,
@@ -186,13 +667,12 @@ class SmartTalkAgent:
         knowledge_results: List[Dict],
         customer_info: Optional[Dict]
     ) -> Dict:
-        """构建增强的对话上下文"""
+        """构建增强的对话上下文（不变部分复用预先构建的字典）"""
         
         enhanced_context = {
-            'system_prompt': self.system_prompt,
-            'personality': self.personality,
+            **self._static_context,
             'current_message': message,
-            'conversation_history': conversation_context.get('conversation_history', []),
+            'conversation_history': self._truncate_history(conversation_context.get('conversation_history', [])),
             'customer_info': customer_info or {},
         }
         
@@ -208,7 +688,7 @@ class SmartTalkAgent:
         
         # 添加知识库信息
         if knowledge_results:
-            enhanced_context['relevant_knowledge'] = knowledge_results[:5]  # 只取前5条最相关的
+            enhanced_context['relevant_knowledge'] = self._truncate_knowledge(knowledge_results)
         
         # 添加商品上下文
         if conversation_context.get('product_context'):
@@ -216,54 +696,66 @@ class SmartTalkAgent:
         
         return enhanced_context
     
-    def _should_handover_to_human(
+    def _handover_pre_llm(
         self,
         intent_result: Optional[Dict],
         sentiment_result: Optional[Dict],
-        confidence: float,
         conversation_context: Dict
     ) -> bool:
-        """判断是否需要转接人工客服"""
+        """判断生成回复前即可确定的转人工条件（情感、意图、连续失败次数）"""
         
-        # 1. 置信度过低
-        if confidence < self.confidence_threshold:
-            logger.info(f"置信度过低 ({confidence:.2f}), 建议转接人工")
-            return True
-        
-        # 2. 负面情感过强
+        # 1. 负面情感过强
         if sentiment_result:
             sentiment = sentiment_result.get('sentiment')
             score = sentiment_result.get('score', 0.0)
             if sentiment == 'negative' and score < -0.7:
-                logger.info(f"客户情感过于负面 ({score:.2f}), 建议转接人工")
+                logger.info("客户情感过于负面 (%.2f), 建议转接人工", score)
                 return True
         
-        # 3. 特定意图需要人工处理
+        # 2. 特定意图需要人工处理
         if intent_result:
             intent = intent_result.get('intent')
             human_required_intents = ['complaint', 'return_refund', 'technical_support']
             if intent in human_required_intents:
-                logger.info(f"意图 {intent} 需要人工处理")
+                logger.info("意图 %s 需要人工处理", intent)
                 return True
         
-        # 4. 连续无法解决问题
-        failed_attempts = conversation_context.get('failed_attempts', 0)
-        if failed_attempts >= 3:
-            logger.info(f"连续 {failed_attempts} 次无法解决问题, 建议转接人工")
+        # 3. 连续无法解决问题
+        if self._failed_attempts_exceeded(conversation_context):
+            logger.info("连续 %s 次无法解决问题, 建议转接人工", conversation_context['failed_attempts'])
             return True
         
         return False
     
+    @staticmethod
+    def _failed_attempts_exceeded(conversation_context: Dict) -> bool:
+        """连续无法解决问题的次数是否已达转人工条件（与消息内容无关，读取缓存前即可判断）"""
+        return conversation_context.get('failed_attempts', 0) >= 3
+    
+    def _handover_post_llm(self, confidence: float) -> bool:
+        """判断生成的回复置信度是否过低需要转接人工客服"""
+        if confidence < self.confidence_threshold:
+            logger.info("置信度过低 (%.2f), 建议转接人工", confidence)
+            return True
+        return False
+    
     async def update_knowledge_base(self, knowledge_base_id: str) -> bool:
         """更新知识库"""
         try:
-            return await self.knowledge_engine.update_knowledge_base(knowledge_base_id)
+            updated = await self.knowledge_engine.update_knowledge_base(knowledge_base_id)
+            self._metrics_snapshot = self._build_metrics_snapshot()
+            return updated
         except Exception as e:
             logger.error(f"更新知识库失败: {str(e)}")
             return False
     
-    def get_performance_metrics(self) -> Dict:
-        """获取代理性能指标"""
+    def get_performance_metrics(self) -> Dict[str, Any]:
+        """获取代理性能指标（返回预构建快照的副本，调用方可修改或直接序列化）"""
+        snapshot = self._metrics_snapshot
+        return {**snapshot, 'features_enabled': dict(snapshot['features_enabled'])}
+    
+    def _build_metrics_snapshot(self) -> Dict[str, Any]:
+        """构建性能指标快照（知识库变化时重建）"""
         return {
             'model_provider': self.model_provider.provider_name,
             'model_name': self.model_provider.model_name,
@@ -281,7 +773,11 @@ class AgentManager:
     """AI代理管理器"""
     
     def __init__(self):
-        self.agents: Dict[str, SmartTalkAgent] = {}
+        # 写时复制：创建/移除时在锁内复制出新字典并整体替换，读取无需加锁
+        self.agents: Mapping[str, SmartTalkAgent] = MappingProxyType({})
+        self._lock = threading.RLock()
+        # 事件循环中发起的代理关闭任务，保留引用直到完成
+        self._closing: set = set()
         logger.info("AI代理管理器初始化完成")
     
     def create_agent(self, agent_config: Dict) -> SmartTalkAgent:
@@ -291,8 +787,13 @@ class AgentManager:
             raise ValueError("代理配置必须包含ID")
         
         agent = SmartTalkAgent(agent_config)
-        self.agents[agent_id] = agent
+        with self._lock:
+            replaced = self.agents.get(agent_id)
+            self.agents = MappingProxyType({**self.agents, agent_id: agent})
         
+        # 同ID重新创建时释放被替换代理的资源
+        if replaced is not None:
+            self._close_agent(replaced)
         logger.info(f"创建AI代理: {agent_id}")
         return agent
     
@@ -302,11 +803,26 @@ class AgentManager:
     
     def remove_agent(self, agent_id: str) -> bool:
         """移除AI代理"""
-        if agent_id in self.agents:
-            del self.agents[agent_id]
-            logger.info(f"移除AI代理: {agent_id}")
-            return True
-        return False
+        with self._lock:
+            if agent_id not in self.agents:
+                return False
+            agents = dict(self.agents)
+            agent = agents.pop(agent_id)
+            self.agents = MappingProxyType(agents)
+        self._close_agent(agent)
+        logger.info(f"移除AI代理: {agent_id}")
+        return True
+    
+    def _close_agent(self, agent: SmartTalkAgent):
+        """关闭代理：在事件循环中调用时后台执行，否则同步等待关闭完成"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(agent.close())
+            return
+        task = loop.create_task(agent.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
     
     def list_agents(self) -> List[str]:
         """列出所有代理ID"""
@@ -0,0 +1,74 @@
+"""
+批处理生成
+将并发会话的单条生成请求在短窗口内汇聚成批次，一次调用模型提供商的批量生成接口
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Tuple
+
+from agents.batching import Batch, MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedGenerator:
+    """
+    模型提供商的批处理包装
+    
+    generate(prompt, **params)与被包装提供商的接口一致，可直接替代提供商传给回复生成器；
+    其他属性和方法原样转发给提供商。只有采样参数完全相同的请求才会合并到同一批次。
+    """
+    
+    def __init__(self, provider: Any, max_batch: int = 8, max_wait_ms: float = 10.0):
+        self.provider = provider
+        self._batcher = MicroBatcher(self._dispatch_batch, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.provider, name)
+    
+    async def generate(self, prompt: Any, **params) -> Any:
+        """提交一条生成请求，返回该请求的生成结果"""
+        return await self.submit(prompt, **params)
+    
+    async def submit(self, prompt: Any, **params) -> Any:
+        """提交一条生成请求，返回该请求的生成结果"""
+        return await self._batcher.submit((prompt, params))
+    
+    async def _dispatch_batch(self, batch: Batch):
+        """按采样参数分组，每组一次批量调用；批次在后台执行，不阻塞下一批的收集"""
+        for params, group in self._group_by_params(batch):
+            self._batcher.spawn(self._complete(group, params))
+    
+    @staticmethod
+    def _group_by_params(batch: Batch):
+        """按采样参数（temperature、max_tokens等）分组"""
+        groups: Dict[str, Tuple[Dict[str, Any], Batch]] = {}
+        for (prompt, params), future in batch:
+            key = json.dumps(params, sort_keys=True, default=str)
+            if key not in groups:
+                groups[key] = (params, [])
+            groups[key][1].append((prompt, future))
+        return groups.values()
+    
+    async def _complete(self, group: Batch, params: Dict[str, Any]):
+        """执行一组请求并按顺序回填结果；提供商不支持批量生成时并发逐条调用"""
+        prompts = [prompt for prompt, _ in group]
+        try:
+            generate_batch = getattr(self.provider, 'generate_batch', None)
+            if generate_batch is not None:
+                results = await generate_batch(prompts, **params)
+            else:
+                results = await asyncio.gather(
+                    *[self.provider.generate(prompt, **params) for prompt in prompts],
+                    return_exceptions=True
+                )
+            logger.debug("批量生成 %d 条请求", len(prompts))
+        except Exception as e:
+            results = [e] * len(group)
+        
+        MicroBatcher.resolve(group, results)
+    
+    async def close(self):
+        """停止分发并等待进行中的批次完成"""
+        await self._batcher.close()
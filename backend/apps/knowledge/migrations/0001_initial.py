@@ -0,0 +1,1404 @@
+# Generated by Django 4.2.21 on 2026-10-18 09:52
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KnowledgeBase",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="知识库名称")),
+                (
+                    "knowledge_type",
+                    models.CharField(
+                        choices=[
+                            ("product", "商品知识库"),
+                            ("faq", "FAQ知识库"),
+                            ("script", "话术知识库"),
+                            ("policy", "政策知识库"),
+                            ("technical", "技术文档"),
+                            ("training", "培训资料"),
+                            ("custom", "自定义知识库"),
+                        ],
+                        max_length=20,
+                        verbose_name="知识库类型",
+                    ),
+                ),
+                ("description", models.TextField(blank=True, verbose_name="描述")),
+                (
+                    "access_level",
+                    models.CharField(
+                        choices=[
+                            ("public", "公开"),
+                            ("internal", "内部"),
+                            ("restricted", "受限"),
+                            ("private", "私有"),
+                        ],
+                        default="internal",
+                        max_length=20,
+                        verbose_name="访问级别",
+                    ),
+                ),
+                (
+                    "is_active",
+                    models.BooleanField(default=True, verbose_name="是否启用"),
+                ),
+                (
+                    "enable_version_control",
+                    models.BooleanField(default=True, verbose_name="启用版本控制"),
+                ),
+                (
+                    "enable_ai_enhancement",
+                    models.BooleanField(default=True, verbose_name="启用AI增强"),
+                ),
+                (
+                    "auto_extract_keywords",
+                    models.BooleanField(default=True, verbose_name="自动提取关键词"),
+                ),
+                (
+                    "ragflow_dataset_id",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="RAGFlow数据集ID"
+                    ),
+                ),
+                (
+                    "ragflow_kb_id",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="RAGFlow知识库ID"
+                    ),
+                ),
+                (
+                    "embedding_model",
+                    models.CharField(
+                        default="BAAI/bge-large-zh-v1.5",
+                        max_length=100,
+                        verbose_name="向量化模型",
+                    ),
+                ),
+                (
+                    "chunk_method",
+                    models.CharField(
+                        default="intelligent", max_length=50, verbose_name="分块方法"
+                    ),
+                ),
+                (
+                    "ragflow_config",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="RAGFlow配置"
+                    ),
+                ),
+                (
+                    "total_documents",
+                    models.IntegerField(default=0, verbose_name="文档总数"),
+                ),
+                (
+                    "total_qa_pairs",
+                    models.IntegerField(default=0, verbose_name="问答对总数"),
+                ),
+                (
+                    "total_views",
+                    models.IntegerField(default=0, verbose_name="总访问次数"),
+                ),
+                (
+                    "search_config",
+                    models.JSONField(blank=True, default=dict, verbose_name="搜索配置"),
+                ),
+                (
+                    "permissions",
+                    models.JSONField(blank=True, default=dict, verbose_name="权限配置"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="knowledge_bases",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "知识库",
+                "verbose_name_plural": "知识库",
+                "db_table": "knowledge_bases",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DocumentTag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, verbose_name="标签名称")),
+                (
+                    "color",
+                    models.CharField(
+                        default="#6c757d", max_length=7, verbose_name="颜色"
+                    ),
+                ),
+                ("description", models.TextField(blank=True, verbose_name="描述")),
+                (
+                    "usage_count",
+                    models.IntegerField(default=0, verbose_name="使用次数"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "knowledge_base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tags",
+                        to="knowledge.knowledgebase",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "文档标签",
+                "verbose_name_plural": "文档标签",
+                "db_table": "document_tags",
+                "ordering": ["-usage_count", "name"],
+                "unique_together": {("knowledge_base", "name")},
+            },
+        ),
+        migrations.CreateModel(
+            name="DocumentCategory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="分类名称")),
+                ("description", models.TextField(blank=True, verbose_name="描述")),
+                (
+                    "color",
+                    models.CharField(
+                        default="#007bff", max_length=7, verbose_name="颜色标识"
+                    ),
+                ),
+                ("sort_order", models.IntegerField(default=0, verbose_name="排序")),
+                (
+                    "is_active",
+                    models.BooleanField(default=True, verbose_name="是否启用"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "knowledge_base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="categories",
+                        to="knowledge.knowledgebase",
+                    ),
+                ),
+                (
+                    "parent",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="children",
+                        to="knowledge.documentcategory",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "文档分类",
+                "verbose_name_plural": "文档分类",
+                "db_table": "document_categories",
+                "ordering": ["sort_order", "name"],
+                "unique_together": {("knowledge_base", "name", "parent")},
+            },
+        ),
+        migrations.CreateModel(
+            name="Script",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="话术名称")),
+                (
+                    "script_type",
+                    models.CharField(
+                        choices=[
+                            ("greeting", "问候语"),
+                            ("product_intro", "商品介绍"),
+                            ("price_negotiation", "价格协商"),
+                            ("order_confirmation", "订单确认"),
+                            ("after_sales", "售后服务"),
+                            ("objection_handling", "异议处理"),
+                            ("closing", "结束语"),
+                            ("upselling", "追加销售"),
+                            ("cross_selling", "交叉销售"),
+                        ],
+                        max_length=20,
+                        verbose_name="话术类型",
+                    ),
+                ),
+                ("content", models.TextField(verbose_name="话术内容")),
+                (
+                    "ragflow_document_id",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="RAGFlow文档ID"
+                    ),
+                ),
+                (
+                    "ragflow_chunk_ids",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="RAGFlow块ID列表"
+                    ),
+                ),
+                (
+                    "vector_synced",
+                    models.BooleanField(default=False, verbose_name="向量已同步"),
+                ),
+                (
+                    "last_sync_time",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="最后同步时间"
+                    ),
+                ),
+                (
+                    "variables",
+                    models.JSONField(blank=True, default=dict, verbose_name="变量定义"),
+                ),
+                (
+                    "placeholders",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="占位符说明"
+                    ),
+                ),
+                (
+                    "conditions",
+                    models.JSONField(blank=True, default=dict, verbose_name="使用条件"),
+                ),
+                (
+                    "triggers",
+                    models.JSONField(blank=True, default=list, verbose_name="触发条件"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "草稿"),
+                            ("active", "启用"),
+                            ("testing", "测试中"),
+                            ("archived", "已归档"),
+                        ],
+                        default="draft",
+                        max_length=20,
+                        verbose_name="状态",
+                    ),
+                ),
+                ("priority", models.IntegerField(default=0, verbose_name="优先级")),
+                (
+                    "is_active",
+                    models.BooleanField(default=True, verbose_name="是否启用"),
+                ),
+                (
+                    "usage_count",
+                    models.IntegerField(default=0, verbose_name="使用次数"),
+                ),
+                (
+                    "success_rate",
+                    models.FloatField(
+                        default=0.0,
+                        validators=[
+                            django.core.validators.MinValueValidator(0.0),
+                            django.core.validators.MaxValueValidator(100.0),
+                        ],
+                        verbose_name="成功率",
+                    ),
+                ),
+                (
+                    "ai_optimized",
+                    models.BooleanField(default=False, verbose_name="AI优化"),
+                ),
+                (
+                    "sentiment_score",
+                    models.FloatField(default=0.0, verbose_name="情感评分"),
+                ),
+                (
+                    "effectiveness_score",
+                    models.FloatField(default=0.0, verbose_name="效果评分"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="knowledge.documentcategory",
+                    ),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scripts",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "knowledge_base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scripts",
+                        to="knowledge.knowledgebase",
+                    ),
+                ),
+                (
+                    "tags",
+                    models.ManyToManyField(blank=True, to="knowledge.documenttag"),
+                ),
+                (
+                    "updated_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="updated_scripts",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "话术模板",
+                "verbose_name_plural": "话术模板",
+                "db_table": "scripts",
+                "ordering": ["-priority", "-usage_count"],
+                "indexes": [
+                    models.Index(
+                        fields=["script_type"], name="scripts_script__8972ca_idx"
+                    ),
+                    models.Index(fields=["status"], name="scripts_status_bad4f5_idx"),
+                    models.Index(
+                        fields=["priority"], name="scripts_priorit_46725e_idx"
+                    ),
+                    models.Index(
+                        fields=["is_active"], name="scripts_is_acti_8b126d_idx"
+                    ),
+                    models.Index(
+                        fields=["usage_count"], name="scripts_usage_c_01efee_idx"
+                    ),
+                    models.Index(
+                        fields=["vector_synced"], name="scripts_vector__73a678_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="Product",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sku",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="商品SKU"
+                    ),
+                ),
+                ("name", models.CharField(max_length=200, verbose_name="商品名称")),
+                (
+                    "product_category",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="商品分类"
+                    ),
+                ),
+                (
+                    "brand",
+                    models.CharField(blank=True, max_length=100, verbose_name="品牌"),
+                ),
+                (
+                    "price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="价格"
+                    ),
+                ),
+                (
+                    "original_price",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="原价",
+                    ),
+                ),
+                (
+                    "cost_price",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="成本价",
+                    ),
+                ),
+                (
+                    "stock_quantity",
+                    models.IntegerField(default=0, verbose_name="库存数量"),
+                ),
+                (
+                    "min_stock_level",
+                    models.IntegerField(default=0, verbose_name="最小库存"),
+                ),
+                (
+                    "max_stock_level",
+                    models.IntegerField(default=0, verbose_name="最大库存"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("active", "在售"),
+                            ("inactive", "下架"),
+                            ("out_of_stock", "缺货"),
+                            ("discontinued", "停产"),
+                        ],
+                        default="active",
+                        max_length=20,
+                        verbose_name="状态",
+                    ),
+                ),
+                ("description", models.TextField(blank=True, verbose_name="商品描述")),
+                (
+                    "short_description",
+                    models.CharField(
+                        blank=True, max_length=500, verbose_name="简短描述"
+                    ),
+                ),
+                (
+                    "specifications",
+                    models.JSONField(blank=True, default=dict, verbose_name="规格参数"),
+                ),
+                (
+                    "attributes",
+                    models.JSONField(blank=True, default=dict, verbose_name="商品属性"),
+                ),
+                (
+                    "variants",
+                    models.JSONField(blank=True, default=list, verbose_name="规格变体"),
+                ),
+                (
+                    "images",
+                    models.JSONField(blank=True, default=list, verbose_name="商品图片"),
+                ),
+                (
+                    "videos",
+                    models.JSONField(blank=True, default=list, verbose_name="商品视频"),
+                ),
+                (
+                    "documents",
+                    models.JSONField(blank=True, default=list, verbose_name="相关文档"),
+                ),
+                (
+                    "sales_points",
+                    models.JSONField(blank=True, default=list, verbose_name="卖点"),
+                ),
+                (
+                    "keywords",
+                    models.JSONField(blank=True, default=list, verbose_name="关键词"),
+                ),
+                (
+                    "sales_count",
+                    models.IntegerField(default=0, verbose_name="销售数量"),
+                ),
+                ("view_count", models.IntegerField(default=0, verbose_name="查看次数")),
+                (
+                    "meta_title",
+                    models.CharField(
+                        blank=True, max_length=200, verbose_name="SEO标题"
+                    ),
+                ),
+                (
+                    "meta_description",
+                    models.TextField(blank=True, verbose_name="SEO描述"),
+                ),
+                (
+                    "meta_keywords",
+                    models.CharField(
+                        blank=True, max_length=500, verbose_name="SEO关键词"
+                    ),
+                ),
+                (
+                    "ragflow_document_id",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="RAGFlow文档ID"
+                    ),
+                ),
+                (
+                    "ragflow_chunk_ids",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="RAGFlow块ID列表"
+                    ),
+                ),
+                (
+                    "vector_synced",
+                    models.BooleanField(default=False, verbose_name="向量已同步"),
+                ),
+                (
+                    "last_sync_time",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="最后同步时间"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="knowledge.documentcategory",
+                    ),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="products",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "knowledge_base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="products",
+                        to="knowledge.knowledgebase",
+                    ),
+                ),
+                (
+                    "tags",
+                    models.ManyToManyField(blank=True, to="knowledge.documenttag"),
+                ),
+                (
+                    "updated_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="updated_products",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "商品",
+                "verbose_name_plural": "商品",
+                "db_table": "products",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(fields=["sku"], name="products_sku_fe2039_idx"),
+                    models.Index(
+                        fields=["product_category"], name="products_product_449a4e_idx"
+                    ),
+                    models.Index(fields=["brand"], name="products_brand_b2547a_idx"),
+                    models.Index(fields=["status"], name="products_status_a30e64_idx"),
+                    models.Index(fields=["price"], name="products_price_fe467e_idx"),
+                    models.Index(
+                        fields=["stock_quantity"], name="products_stock_q_5d82ff_idx"
+                    ),
+                    models.Index(
+                        fields=["vector_synced"], name="products_vector__58ea39_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="KnowledgeVector",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_type",
+                    models.CharField(max_length=20, verbose_name="内容类型"),
+                ),
+                ("content_id", models.IntegerField(verbose_name="内容ID")),
+                ("text_chunk", models.TextField(verbose_name="文本片段")),
+                (
+                    "chunk_index",
+                    models.IntegerField(default=0, verbose_name="片段索引"),
+                ),
+                ("chunk_size", models.IntegerField(default=0, verbose_name="片段大小")),
+                (
+                    "embedding_model",
+                    models.CharField(max_length=100, verbose_name="向量模型"),
+                ),
+                ("vector_data", models.JSONField(verbose_name="向量数据")),
+                ("vector_dimension", models.IntegerField(verbose_name="向量维度")),
+                (
+                    "metadata",
+                    models.JSONField(blank=True, default=dict, verbose_name="元数据"),
+                ),
+                (
+                    "keywords",
+                    models.JSONField(blank=True, default=list, verbose_name="关键词"),
+                ),
+                (
+                    "language",
+                    models.CharField(
+                        default="zh-cn", max_length=10, verbose_name="语言"
+                    ),
+                ),
+                (
+                    "quality_score",
+                    models.FloatField(default=0.0, verbose_name="质量评分"),
+                ),
+                (
+                    "relevance_score",
+                    models.FloatField(default=0.0, verbose_name="相关性评分"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "knowledge_base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="vectors",
+                        to="knowledge.knowledgebase",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "知识向量",
+                "verbose_name_plural": "知识向量",
+                "db_table": "knowledge_vectors",
+                "indexes": [
+                    models.Index(
+                        fields=["content_type", "content_id"],
+                        name="knowledge_v_content_0c3ded_idx",
+                    ),
+                    models.Index(
+                        fields=["knowledge_base"], name="knowledge_v_knowled_0a334e_idx"
+                    ),
+                    models.Index(
+                        fields=["embedding_model"],
+                        name="knowledge_v_embeddi_f4be98_idx",
+                    ),
+                    models.Index(
+                        fields=["quality_score"], name="knowledge_v_quality_e95efc_idx"
+                    ),
+                ],
+                "unique_together": {
+                    ("knowledge_base", "content_type", "content_id", "chunk_index")
+                },
+            },
+        ),
+        migrations.CreateModel(
+            name="KnowledgeRecommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source_content_type",
+                    models.CharField(max_length=20, verbose_name="源内容类型"),
+                ),
+                ("source_content_id", models.IntegerField(verbose_name="源内容ID")),
+                (
+                    "target_content_type",
+                    models.CharField(max_length=20, verbose_name="目标内容类型"),
+                ),
+                ("target_content_id", models.IntegerField(verbose_name="目标内容ID")),
+                (
+                    "recommendation_type",
+                    models.CharField(
+                        choices=[
+                            ("similar", "相似内容"),
+                            ("related", "相关内容"),
+                            ("popular", "热门内容"),
+                            ("personalized", "个性化推荐"),
+                            ("ai_generated", "AI生成推荐"),
+                        ],
+                        max_length=20,
+                        verbose_name="推荐类型",
+                    ),
+                ),
+                (
+                    "similarity_score",
+                    models.FloatField(
+                        validators=[
+                            django.core.validators.MinValueValidator(0.0),
+                            django.core.validators.MaxValueValidator(1.0),
+                        ],
+                        verbose_name="相似度评分",
+                    ),
+                ),
+                (
+                    "confidence_score",
+                    models.FloatField(
+                        validators=[
+                            django.core.validators.MinValueValidator(0.0),
+                            django.core.validators.MaxValueValidator(1.0),
+                        ],
+                        verbose_name="置信度",
+                    ),
+                ),
+                (
+                    "algorithm",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="推荐算法"
+                    ),
+                ),
+                (
+                    "features_used",
+                    models.JSONField(blank=True, default=list, verbose_name="使用特征"),
+                ),
+                ("view_count", models.IntegerField(default=0, verbose_name="查看次数")),
+                (
+                    "click_count",
+                    models.IntegerField(default=0, verbose_name="点击次数"),
+                ),
+                (
+                    "conversion_count",
+                    models.IntegerField(default=0, verbose_name="转化次数"),
+                ),
+                (
+                    "is_active",
+                    models.BooleanField(default=True, verbose_name="是否启用"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "knowledge_base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recommendations",
+                        to="knowledge.knowledgebase",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "知识推荐",
+                "verbose_name_plural": "知识推荐",
+                "db_table": "knowledge_recommendations",
+                "ordering": ["-similarity_score", "-confidence_score"],
+                "indexes": [
+                    models.Index(
+                        fields=["source_content_type", "source_content_id"],
+                        name="knowledge_r_source__086c08_idx",
+                    ),
+                    models.Index(
+                        fields=["target_content_type", "target_content_id"],
+                        name="knowledge_r_target__ed1e4f_idx",
+                    ),
+                    models.Index(
+                        fields=["recommendation_type"],
+                        name="knowledge_r_recomme_134b5d_idx",
+                    ),
+                    models.Index(
+                        fields=["similarity_score"],
+                        name="knowledge_r_similar_da665c_idx",
+                    ),
+                    models.Index(
+                        fields=["is_active"], name="knowledge_r_is_acti_7bb399_idx"
+                    ),
+                ],
+                "unique_together": {
+                    (
+                        "knowledge_base",
+                        "source_content_type",
+                        "source_content_id",
+                        "target_content_type",
+                        "target_content_id",
+                        "recommendation_type",
+                    )
+                },
+            },
+        ),
+        migrations.CreateModel(
+            name="KnowledgeAccessRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_type",
+                    models.CharField(
+                        blank=True, max_length=20, verbose_name="内容类型"
+                    ),
+                ),
+                (
+                    "content_id",
+                    models.IntegerField(blank=True, null=True, verbose_name="内容ID"),
+                ),
+                (
+                    "session_id",
+                    models.CharField(blank=True, max_length=100, verbose_name="会话ID"),
+                ),
+                (
+                    "ip_address",
+                    models.GenericIPAddressField(
+                        blank=True, null=True, verbose_name="IP地址"
+                    ),
+                ),
+                ("user_agent", models.TextField(blank=True, verbose_name="用户代理")),
+                (
+                    "access_type",
+                    models.CharField(
+                        choices=[
+                            ("view", "查看"),
+                            ("search", "搜索"),
+                            ("download", "下载"),
+                            ("share", "分享"),
+                            ("feedback", "反馈"),
+                        ],
+                        max_length=20,
+                        verbose_name="访问类型",
+                    ),
+                ),
+                ("query_text", models.TextField(blank=True, verbose_name="查询文本")),
+                (
+                    "search_results_count",
+                    models.IntegerField(default=0, verbose_name="搜索结果数"),
+                ),
+                (
+                    "response_time",
+                    models.FloatField(default=0.0, verbose_name="响应时间(秒)"),
+                ),
+                ("success", models.BooleanField(default=True, verbose_name="是否成功")),
+                (
+                    "error_message",
+                    models.TextField(blank=True, verbose_name="错误信息"),
+                ),
+                (
+                    "time_spent",
+                    models.IntegerField(default=0, verbose_name="停留时间(秒)"),
+                ),
+                (
+                    "scroll_depth",
+                    models.FloatField(default=0.0, verbose_name="滚动深度"),
+                ),
+                (
+                    "feedback_rating",
+                    models.IntegerField(
+                        blank=True,
+                        null=True,
+                        validators=[
+                            django.core.validators.MinValueValidator(1),
+                            django.core.validators.MaxValueValidator(5),
+                        ],
+                        verbose_name="反馈评分",
+                    ),
+                ),
+                (
+                    "feedback_comment",
+                    models.TextField(blank=True, verbose_name="反馈意见"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="访问时间"),
+                ),
+                (
+                    "knowledge_base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="access_records",
+                        to="knowledge.knowledgebase",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "知识访问记录",
+                "verbose_name_plural": "知识访问记录",
+                "db_table": "knowledge_access_records",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["knowledge_base", "created_at"],
+                        name="knowledge_a_knowled_7974d9_idx",
+                    ),
+                    models.Index(
+                        fields=["content_type", "content_id"],
+                        name="knowledge_a_content_e61c2f_idx",
+                    ),
+                    models.Index(
+                        fields=["user", "created_at"],
+                        name="knowledge_a_user_id_7066be_idx",
+                    ),
+                    models.Index(
+                        fields=["access_type"], name="knowledge_a_access__c4c6ac_idx"
+                    ),
+                    models.Index(
+                        fields=["session_id"], name="knowledge_a_session_123346_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="FAQ",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("question", models.TextField(verbose_name="问题")),
+                ("answer", models.TextField(verbose_name="答案")),
+                ("answer_html", models.TextField(blank=True, verbose_name="答案HTML")),
+                (
+                    "faq_category",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="FAQ分类"
+                    ),
+                ),
+                (
+                    "keywords",
+                    models.JSONField(blank=True, default=list, verbose_name="关键词"),
+                ),
+                (
+                    "related_questions",
+                    models.JSONField(blank=True, default=list, verbose_name="相关问题"),
+                ),
+                ("priority", models.IntegerField(default=0, verbose_name="优先级")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "草稿"),
+                            ("published", "已发布"),
+                            ("archived", "已归档"),
+                        ],
+                        default="draft",
+                        max_length=20,
+                        verbose_name="状态",
+                    ),
+                ),
+                (
+                    "is_active",
+                    models.BooleanField(default=True, verbose_name="是否启用"),
+                ),
+                (
+                    "is_featured",
+                    models.BooleanField(default=False, verbose_name="是否推荐"),
+                ),
+                ("view_count", models.IntegerField(default=0, verbose_name="查看次数")),
+                (
+                    "helpful_count",
+                    models.IntegerField(default=0, verbose_name="有用次数"),
+                ),
+                (
+                    "unhelpful_count",
+                    models.IntegerField(default=0, verbose_name="无用次数"),
+                ),
+                (
+                    "auto_generated",
+                    models.BooleanField(default=False, verbose_name="AI自动生成"),
+                ),
+                (
+                    "confidence_score",
+                    models.FloatField(
+                        default=0.0,
+                        validators=[
+                            django.core.validators.MinValueValidator(0.0),
+                            django.core.validators.MaxValueValidator(1.0),
+                        ],
+                        verbose_name="置信度",
+                    ),
+                ),
+                (
+                    "source_documents",
+                    models.JSONField(blank=True, default=list, verbose_name="来源文档"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="knowledge.documentcategory",
+                    ),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="faqs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "knowledge_base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="faqs",
+                        to="knowledge.knowledgebase",
+                    ),
+                ),
+                (
+                    "tags",
+                    models.ManyToManyField(blank=True, to="knowledge.documenttag"),
+                ),
+                (
+                    "updated_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="updated_faqs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "常见问题",
+                "verbose_name_plural": "常见问题",
+                "db_table": "faqs",
+                "ordering": ["-priority", "-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["faq_category"], name="faqs_faq_cat_c2a8c0_idx"
+                    ),
+                    models.Index(fields=["priority"], name="faqs_priorit_46598c_idx"),
+                    models.Index(fields=["status"], name="faqs_status_aa4469_idx"),
+                    models.Index(fields=["is_active"], name="faqs_is_acti_3459f3_idx"),
+                    models.Index(fields=["view_count"], name="faqs_view_co_1b9dd1_idx"),
+                    models.Index(
+                        fields=["confidence_score"], name="faqs_confide_507b54_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="Document",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("title", models.CharField(max_length=200, verbose_name="文档标题")),
+                (
+                    "slug",
+                    models.SlugField(
+                        blank=True, max_length=200, verbose_name="URL别名"
+                    ),
+                ),
+                (
+                    "document_type",
+                    models.CharField(
+                        choices=[
+                            ("text", "文本文档"),
+                            ("markdown", "Markdown文档"),
+                            ("html", "HTML文档"),
+                            ("pdf", "PDF文档"),
+                            ("word", "Word文档"),
+                            ("excel", "Excel文档"),
+                            ("image", "图片"),
+                            ("video", "视频"),
+                            ("audio", "音频"),
+                        ],
+                        max_length=20,
+                        verbose_name="文档类型",
+                    ),
+                ),
+                (
+                    "file_path",
+                    models.FileField(
+                        blank=True,
+                        upload_to="knowledge/documents/",
+                        verbose_name="文件路径",
+                    ),
+                ),
+                ("content", models.TextField(blank=True, verbose_name="文档内容")),
+                ("summary", models.TextField(blank=True, verbose_name="文档摘要")),
+                (
+                    "file_size",
+                    models.BigIntegerField(default=0, verbose_name="文件大小(字节)"),
+                ),
+                (
+                    "file_hash",
+                    models.CharField(
+                        blank=True, max_length=64, verbose_name="文件哈希"
+                    ),
+                ),
+                (
+                    "language",
+                    models.CharField(
+                        default="zh-cn", max_length=10, verbose_name="语言"
+                    ),
+                ),
+                (
+                    "keywords",
+                    models.JSONField(blank=True, default=list, verbose_name="关键词"),
+                ),
+                (
+                    "metadata",
+                    models.JSONField(blank=True, default=dict, verbose_name="元数据"),
+                ),
+                (
+                    "process_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "待处理"),
+                            ("processing", "处理中"),
+                            ("completed", "已完成"),
+                            ("failed", "处理失败"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                        verbose_name="处理状态",
+                    ),
+                ),
+                (
+                    "process_message",
+                    models.TextField(blank=True, verbose_name="处理信息"),
+                ),
+                (
+                    "extracted_text",
+                    models.TextField(blank=True, verbose_name="提取的文本"),
+                ),
+                ("view_count", models.IntegerField(default=0, verbose_name="查看次数")),
+                (
+                    "download_count",
+                    models.IntegerField(default=0, verbose_name="下载次数"),
+                ),
+                (
+                    "rating",
+                    models.FloatField(
+                        default=0.0,
+                        validators=[
+                            django.core.validators.MinValueValidator(0.0),
+                            django.core.validators.MaxValueValidator(5.0),
+                        ],
+                        verbose_name="评分",
+                    ),
+                ),
+                (
+                    "rating_count",
+                    models.IntegerField(default=0, verbose_name="评分次数"),
+                ),
+                (
+                    "is_active",
+                    models.BooleanField(default=True, verbose_name="是否启用"),
+                ),
+                (
+                    "is_featured",
+                    models.BooleanField(default=False, verbose_name="是否推荐"),
+                ),
+                (
+                    "is_public",
+                    models.BooleanField(default=False, verbose_name="是否公开"),
+                ),
+                (
+                    "version",
+                    models.CharField(
+                        default="1.0", max_length=20, verbose_name="版本号"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="knowledge.documentcategory",
+                    ),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="documents",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "knowledge_base",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="documents",
+                        to="knowledge.knowledgebase",
+                    ),
+                ),
+                (
+                    "parent_document",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="versions",
+                        to="knowledge.document",
+                    ),
+                ),
+                (
+                    "tags",
+                    models.ManyToManyField(blank=True, to="knowledge.documenttag"),
+                ),
+                (
+                    "updated_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="updated_documents",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "文档",
+                "verbose_name_plural": "文档",
+                "db_table": "documents",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["document_type"], name="documents_documen_fc21d0_idx"
+                    ),
+                    models.Index(
+                        fields=["process_status"], name="documents_process_c4eef9_idx"
+                    ),
+                    models.Index(
+                        fields=["is_active"], name="documents_is_acti_a803bb_idx"
+                    ),
+                    models.Index(
+                        fields=["created_at"], name="documents_created_3c6eaa_idx"
+                    ),
+                    models.Index(
+                        fields=["view_count"], name="documents_view_co_92fb27_idx"
+                    ),
+                    models.Index(fields=["rating"], name="documents_rating_abbce8_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.21 on 2026-10-18 09:52
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+try:
+    import jieba
+except ImportError:
+    jieba = None
+
+BATCH_SIZE = 500
+
+
+def segment_for_search(*texts):
+    """生成全文检索用的分词文本（迁移内的固定副本，不随模型代码变化）"""
+    text = " ".join(t for t in texts if t)
+    if not jieba:
+        return text
+    return " ".join(word for word in jieba.cut_for_search(text) if word.strip())
+
+
+def backfill_search_vectors(apps, schema_editor):
+    """为已有FAQ和商品回填全文检索向量，每500行批量更新一次"""
+    for model_name, fields in (
+        ("FAQ", ("question", "answer")),
+        ("Product", ("name", "description")),
+    ):
+        model = apps.get_model("knowledge", model_name)
+        batch = []
+        for obj in model.objects.only("pk", *fields).iterator(chunk_size=BATCH_SIZE):
+            obj.search_vector = SearchVector(
+                Value(segment_for_search(*(getattr(obj, f) for f in fields))),
+                config="simple",
+            )
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, ["search_vector"])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ["search_vector"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("knowledge", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="faq",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="全文检索向量"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="全文检索向量"
+            ),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="faq",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="faqs_search__d5b120_gin"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="products_search__7bdc4d_gin"
+            ),
+        ),
+    ]
@@ -1,12 +1,32 @@
 from django.db import models
+from django.db.models import Value
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 import json
 
+try:
+    import jieba
+except ImportError:
+    jieba = None
+
 User = get_user_model()
 
 
+def segment_for_search(*texts) -> str:
+    """
+    生成全文检索用的分词文本
+    
+    PostgreSQL的simple配置只按空白和标点切词，中文需先用jieba分词再以空格连接。
+    """
+    text = ' '.join(t for t in texts if t)
+    if not jieba:
+        return text
+    return ' '.join(word for word in jieba.cut_for_search(text) if word.strip())
+
+
 class KnowledgeBase(models.Model):
     """知识库"""
     
@@ -251,6 +271,9 @@ class FAQ(models.Model):
     confidence_score = models.FloatField('置信度', default=0.0, validators=[MinValueValidator(0.0), MaxValueValidator(1.0)])
     source_documents = models.JSONField('来源文档', default=list, blank=True)
     
+    # 全文检索（问题+答案分词后的tsvector）
+    search_vector = SearchVectorField('全文检索向量', null=True, editable=False)
+    
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='faqs')
     updated_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='updated_faqs', null=True, blank=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
@@ -267,11 +290,27 @@ class FAQ(models.Model):
             models.Index(fields=['is_active']),
             models.Index(fields=['view_count']),
             models.Index(fields=['confidence_score']),
+            GinIndex(fields=['search_vector']),
         ]
         ordering = ['-priority', '-created_at']
     
     def __str__(self):
         return self.question[:100]
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'question', 'answer'} & set(update_fields):
+            # 检索向量随本次保存一并写入，不再额外发UPDATE
+            self.search_vector = self.build_search_vector()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_vector'}
+        super().save(*args, **kwargs)
+        # 实例上残留的是SQL表达式，丢弃后访问时按延迟字段重新加载
+        self.__dict__.pop('search_vector', None)
+    
+    def build_search_vector(self):
+        """构造全文检索向量表达式"""
+        return SearchVector(Value(segment_for_search(self.question, self.answer)), config='simple')
 
     def increment_view_count(self):
         self.view_count += 1
@@ -350,6 +389,9 @@ class Product(models.Model):
     vector_synced = models.BooleanField('向量已同步', default=False)
     last_sync_time = models.DateTimeField('最后同步时间', null=True, blank=True)
     
+    # 全文检索（名称+描述分词后的tsvector）
+    search_vector = SearchVectorField('全文检索向量', null=True, editable=False)
+    
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
     updated_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='updated_products', null=True, blank=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
@@ -367,11 +409,27 @@ class Product(models.Model):
             models.Index(fields=['price']),
             models.Index(fields=['stock_quantity']),
             models.Index(fields=['vector_synced']),
+            GinIndex(fields=['search_vector']),
         ]
         ordering = ['-created_at']
     
     def __str__(self):
         return f"{self.sku} - {self.name}"
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'name', 'description'} & set(update_fields):
+            # 检索向量随本次保存一并写入，不再额外发UPDATE
+            self.search_vector = self.build_search_vector()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_vector'}
+        super().save(*args, **kwargs)
+        # 实例上残留的是SQL表达式，丢弃后访问时按延迟字段重新加载
+        self.__dict__.pop('search_vector', None)
+    
+    def build_search_vector(self):
+        """构造全文检索向量表达式"""
+        return SearchVector(Value(segment_for_search(self.name, self.description)), config='simple')
 
     @property
     def is_in_stock(self):
@@ -3,6 +3,7 @@ Celery配置文件
 """
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 # 设置Django设置模块
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -16,6 +17,15 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def enable_jieba_parallel(**kwargs):
+    """工作进程启动时按配置开启jieba多进程分词，供批量情感分析使用"""
+    from configs.agents import get_agent_config
+    from agents.context import enable_parallel_cut
+    
+    enable_parallel_cut(get_agent_config('sentiment_agent').get('jieba_parallel_workers', 0))
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}') 
\ No newline at end of file
@@ -49,6 +49,7 @@ AGENT_CONFIG: Dict[str, Any] = {
         'enable_emotion_detection': get_env_bool('SENTIMENT_EMOTION_DETECTION', True),
         'context_window': get_env_int('SENTIMENT_CONTEXT_WINDOW', 3),
         'sentiment_history_length': get_env_int('SENTIMENT_HISTORY_LENGTH', 10),
+        'jieba_parallel_workers': get_env_int('SENTIMENT_JIEBA_PARALLEL_WORKERS', 0),  # Celery工作进程启动时开启的分词进程数（0为不开启）
         'custom_emotions': {
             'excited': [r'太棒了', r'真的吗', r'太好了', r'惊喜'],
             'confused': [r'不明白', r'搞不懂', r'什么意思', r'confused'],
@@ -64,7 +65,8 @@ AGENT_CONFIG: Dict[str, Any] = {
         'memory_decay_hours': get_env_int('MEMORY_AGENT_DECAY_HOURS', 48),
         'importance_threshold': get_env_float('MEMORY_IMPORTANCE_THRESHOLD', 0.7),
         'enable_user_profiling': get_env_bool('MEMORY_USER_PROFILING', True),
-        'profile_update_frequency': get_env_int('MEMORY_PROFILE_UPDATE_FREQ', 5)
+        'profile_update_frequency': get_env_int('MEMORY_PROFILE_UPDATE_FREQ', 5),
+        'profile_cache_size': get_env_int('MEMORY_PROFILE_CACHE_SIZE', 1024)
     },
     
     # 知识库智能体配置
@@ -81,6 +83,22 @@ AGENT_CONFIG: Dict[str, Any] = {
         'enable_local_fallback': get_env_bool('KNOWLEDGE_LOCAL_FALLBACK', True),
         'cache_results': get_env_bool('KNOWLEDGE_CACHE_RESULTS', True),
         'cache_ttl': get_env_int('KNOWLEDGE_CACHE_TTL', 3600),
+        'history_max': get_env_int('KNOWLEDGE_HISTORY_MAX', 10000),
+        'cpu_pool_workers': get_env_int('KNOWLEDGE_CPU_POOL_WORKERS', 0),  # 0表示不启用进程池
+        'cpu_offload_min_results': get_env_int('KNOWLEDGE_CPU_OFFLOAD_MIN_RESULTS', 200),
+        'semantic_cache': {
+            'enabled': get_env_bool('KNOWLEDGE_SEMANTIC_CACHE', False),
+            'model': os.getenv('KNOWLEDGE_SEMANTIC_CACHE_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2'),
+            'threshold': get_env_float('KNOWLEDGE_SEMANTIC_CACHE_THRESHOLD', 0.85),
+            'ttl': get_env_int('KNOWLEDGE_SEMANTIC_CACHE_TTL', 300),
+            'max_entries': get_env_int('KNOWLEDGE_SEMANTIC_CACHE_MAX_ENTRIES', 10000),
+            'device': os.getenv('KNOWLEDGE_SEMANTIC_CACHE_DEVICE', ''),  # 为空时自动选择
+            'embedding_cache_size': get_env_int('KNOWLEDGE_SEMANTIC_CACHE_EMBEDDINGS', 2048),
+            'quantize_threshold': get_env_int('KNOWLEDGE_SEMANTIC_CACHE_QUANTIZE_AT', 10000),  # 0表示不量化
+            'nlist': get_env_int('KNOWLEDGE_SEMANTIC_CACHE_NLIST', 256),
+            'pq_m': get_env_int('KNOWLEDGE_SEMANTIC_CACHE_PQ_M', 48),
+            'nprobe': get_env_int('KNOWLEDGE_SEMANTIC_CACHE_NPROBE', 8)
+        },
         'knowledge_bases': {
             'product': {'weight': 1.0, 'boost': 1.2},
             'faq': {'weight': 0.9, 'boost': 1.1},
@@ -95,14 +113,25 @@ AGENT_CONFIG: Dict[str, Any] = {
             'endpoint': os.getenv('LANGFLOW_ENDPOINT', 'http://localhost:7860'),
             'api_key': os.getenv('LANGFLOW_API_KEY', ''),
             'flow_id': os.getenv('LANGFLOW_FLOW_ID', ''),
-            'timeout': get_env_int('LANGFLOW_TIMEOUT', 60)
+            'timeout': get_env_int('LANGFLOW_TIMEOUT', 60),
+            'keepalive_interval': get_env_int('LANGFLOW_KEEPALIVE_INTERVAL', 300)  # 0表示不保活
         },
         'llm': {
             'model': os.getenv('LLM_MODEL', 'gpt-3.5-turbo'),
             'temperature': get_env_float('LLM_TEMPERATURE', 0.7),
             'max_tokens': get_env_int('LLM_MAX_TOKENS', 1000),
             'api_key': os.getenv('OPENAI_API_KEY', ''),
-            'base_url': os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+            'base_url': os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1'),
+            # 自建推理服务的量化部署（见docker-compose中的vllm服务）
+            'quantization': os.getenv('LLM_QUANTIZATION', 'fp8'),
+            'quantized_model': os.getenv('LLM_QUANTIZED_MODEL', ''),
+            # 连续批处理：将并发会话的请求发送到vLLM等OpenAI兼容服务，由服务端合批
+            # max_wait_ms为0时请求直接发出；仅当服务端不做连续批处理时才需要客户端等待窗口
+            'batching': {
+                'enabled': get_env_bool('LLM_BATCHING_ENABLED', False),
+                'max_batch': get_env_int('LLM_BATCHING_MAX_BATCH', 32),
+                'max_wait_ms': get_env_float('LLM_BATCHING_MAX_WAIT_MS', 0.0)
+            }
         },
         'conversation_flow': {
             'max_turns': get_env_int('CHAT_MAX_TURNS', 50),
@@ -110,6 +139,11 @@ AGENT_CONFIG: Dict[str, Any] = {
             'enable_context_compression': get_env_bool('CHAT_CONTEXT_COMPRESSION', True),
             'fallback_responses': get_env_bool('CHAT_FALLBACK_RESPONSES', True)
         },
+        'agent_timeout': get_env_float('CHAT_AGENT_TIMEOUT', 3.0),  # 单个分析智能体的超时（秒）
+        'knowledge_cache': {
+            'maxsize': get_env_int('CHAT_KNOWLEDGE_CACHE_SIZE', 10000),  # 0表示关闭缓存
+            'ttl': get_env_int('CHAT_KNOWLEDGE_CACHE_TTL', 900)
+        },
         'personalization': {
             'adapt_to_user_style': get_env_bool('CHAT_ADAPT_STYLE', True),
             'remember_preferences': get_env_bool('CHAT_REMEMBER_PREFS', True),
@@ -122,6 +156,8 @@ AGENT_CONFIG: Dict[str, Any] = {
 GLOBAL_AGENT_CONFIG = {
     'enable_parallel_processing': get_env_bool('AGENT_PARALLEL_PROCESSING', True),
     'max_concurrent_agents': get_env_int('AGENT_MAX_CONCURRENT', 4),
+    'max_concurrency': get_env_int('AGENT_MAX_CONCURRENCY', 8),      # 管理器并发槽位数
+    'micro_batch_size': get_env_int('AGENT_MICRO_BATCH_SIZE', 8),    # 批处理滑动窗口大小
     'default_timeout': get_env_int('AGENT_DEFAULT_TIMEOUT', 30),
     'retry_attempts': get_env_int('AGENT_RETRY_ATTEMPTS', 3),
     'enable_metrics': get_env_bool('AGENT_ENABLE_METRICS', True),
@@ -0,0 +1,91 @@
+"""
+批处理生成测试
+"""
+
+import asyncio
+
+import pytest
+
+from ai_engine.batched_generator import BatchedGenerator
+
+
+class BatchProvider:
+    model_name = "fake-model"
+
+    def __init__(self, drop=0):
+        self.calls = []
+        self.drop = drop
+
+    async def generate_batch(self, prompts, **params):
+        self.calls.append((list(prompts), params))
+        results = [f"{params.get('temperature')}:{prompt}" for prompt in prompts]
+        return results[:len(results) - self.drop]
+
+
+class SingleProvider:
+    async def generate(self, prompt, **params):
+        if prompt == "bad":
+            raise ValueError(prompt)
+        return f"single:{prompt}"
+
+
+def run_generator(generator, requests):
+    async def run():
+        results = await asyncio.gather(
+            *[generator.generate(prompt, **params) for prompt, params in requests],
+            return_exceptions=True
+        )
+        await generator.close()
+        return results
+
+    return asyncio.run(run())
+
+
+def test_requests_are_grouped_by_sampling_params():
+    provider = BatchProvider()
+    generator = BatchedGenerator(provider, max_batch=8, max_wait_ms=5)
+    results = run_generator(generator, [
+        ("a", {"temperature": 0.2}),
+        ("b", {"temperature": 0.7}),
+        ("c", {"temperature": 0.2}),
+    ])
+
+    assert results == ["0.2:a", "0.7:b", "0.2:c"]
+    assert sorted(provider.calls, key=lambda call: call[1]["temperature"]) == [
+        (["a", "c"], {"temperature": 0.2}),
+        (["b"], {"temperature": 0.7}),
+    ]
+
+
+def test_short_batch_results_fail_remaining_requests():
+    generator = BatchedGenerator(BatchProvider(drop=1), max_batch=8, max_wait_ms=5)
+    results = run_generator(generator, [("a", {}), ("b", {}), ("c", {})])
+
+    assert results[:2] == ["None:a", "None:b"]
+    assert isinstance(results[2], RuntimeError)
+
+
+def test_falls_back_to_single_generation():
+    generator = BatchedGenerator(SingleProvider(), max_batch=8, max_wait_ms=5)
+    results = run_generator(generator, [("a", {}), ("bad", {}), ("c", {})])
+
+    assert results[0] == "single:a" and results[2] == "single:c"
+    assert isinstance(results[1], ValueError)
+
+
+def test_provider_attributes_are_forwarded():
+    assert BatchedGenerator(BatchProvider()).model_name == "fake-model"
+
+
+def test_close_without_requests():
+    asyncio.run(BatchedGenerator(BatchProvider()).close())
+
+
+@pytest.mark.parametrize("error", [RuntimeError("down"), ValueError("bad params")])
+def test_batch_call_failure_fails_the_group(error):
+    class FailingProvider:
+        async def generate_batch(self, prompts, **params):
+            raise error
+
+    results = run_generator(BatchedGenerator(FailingProvider(), max_wait_ms=5), [("a", {}), ("b", {})])
+    assert results == [error, error]
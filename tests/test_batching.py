@@ -0,0 +1,149 @@
+"""
+微批处理测试
+"""
+
+import asyncio
+
+import pytest
+
+from agents.batching import MicroBatcher
+
+
+def test_results_follow_submission_order():
+    sizes = []
+
+    async def handler(batch):
+        sizes.append(len(batch))
+        MicroBatcher.resolve(batch, [item * 2 for item, _ in batch])
+
+    async def run():
+        batcher = MicroBatcher(handler, max_batch=2, max_wait_ms=5)
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(5)])
+        await batcher.close()
+        return results
+
+    assert asyncio.run(run()) == [0, 2, 4, 6, 8]
+    assert sizes == [2, 2, 1]
+
+
+def test_exception_results_fail_only_their_request():
+    async def handler(batch):
+        MicroBatcher.resolve(batch, [ValueError(item) if item == 1 else item for item, _ in batch])
+
+    async def run():
+        batcher = MicroBatcher(handler, max_batch=4, max_wait_ms=5)
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(3)], return_exceptions=True)
+        await batcher.close()
+        return results
+
+    first, second, third = asyncio.run(run())
+    assert (first, third) == (0, 2)
+    assert isinstance(second, ValueError)
+
+
+def test_handler_failure_fails_batch_and_keeps_dispatching():
+    calls = []
+
+    async def handler(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise ValueError("boom")
+        MicroBatcher.resolve(batch, [item for item, _ in batch])
+
+    async def run():
+        batcher = MicroBatcher(handler, max_batch=4, max_wait_ms=5)
+        failed = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        recovered = await batcher.submit(3)
+        await batcher.close()
+        return failed, recovered
+
+    failed, recovered = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in failed)
+    assert recovered == 3
+
+
+def test_short_results_fail_remaining_requests():
+    async def handler(batch):
+        MicroBatcher.resolve(batch, ["only-one"])
+
+    async def run():
+        batcher = MicroBatcher(handler, max_batch=3, max_wait_ms=5)
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(3)], return_exceptions=True)
+        await batcher.close()
+        return results
+
+    results = asyncio.run(run())
+    assert results[0] == "only-one"
+    assert all(isinstance(result, RuntimeError) for result in results[1:])
+
+
+def test_close_cancels_running_and_queued_requests():
+    async def run():
+        entered = asyncio.Event()
+
+        async def handler(batch):
+            entered.set()
+            await asyncio.sleep(3600)
+
+        batcher = MicroBatcher(handler, max_batch=1)
+        tasks = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        await entered.wait()
+        await batcher.close()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(asyncio.wait_for(run(), 5))
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+def test_close_cancels_requests_still_being_collected():
+    async def handler(batch):
+        MicroBatcher.resolve(batch, [item for item, _ in batch])
+
+    async def run():
+        batcher = MicroBatcher(handler, max_batch=8, max_wait_ms=3600_000)
+        task = asyncio.ensure_future(batcher.submit("x"))
+        await asyncio.sleep(0.01)
+        await batcher.close()
+        return await asyncio.gather(task, return_exceptions=True)
+
+    (result,) = asyncio.run(asyncio.wait_for(run(), 5))
+    assert isinstance(result, asyncio.CancelledError)
+
+
+def test_spawned_batches_are_awaited_on_close():
+    done = []
+
+    async def complete(batch):
+        await asyncio.sleep(0.01)
+        done.append(len(batch))
+        MicroBatcher.resolve(batch, [item for item, _ in batch])
+
+    async def run():
+        batcher = MicroBatcher(None, max_batch=1)
+
+        async def handler(batch):
+            batcher.spawn(complete(batch))
+
+        batcher.handler = handler
+        future = asyncio.ensure_future(batcher.submit("x"))
+        while not batcher._inflight:
+            await asyncio.sleep(0.001)
+        await batcher.close()
+        return await future
+
+    assert asyncio.run(run()) == "x"
+    assert done == [1]
+
+
+def test_rebinds_to_a_new_event_loop():
+    async def handler(batch):
+        MicroBatcher.resolve(batch, [item for item, _ in batch])
+
+    batcher = MicroBatcher(handler, max_batch=2)
+    assert asyncio.run(batcher.submit("first")) == "first"
+    assert asyncio.run(batcher.submit("second")) == "second"
+
+
+@pytest.mark.parametrize("max_batch", [0, -1])
+def test_batch_size_is_at_least_one(max_batch):
+    assert MicroBatcher(None, max_batch=max_batch).max_batch == 1
@@ -0,0 +1,161 @@
+"""
+语义缓存测试（直接写入向量，不加载向量模型）
+"""
+
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import agents.semantic_cache as semantic_cache
+from agents.semantic_cache import SemanticCache
+
+requires_faiss = pytest.mark.skipif(not semantic_cache.FAISS_AVAILABLE, reason="faiss not installed")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(semantic_cache, "time", fake)
+    return fake
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture(params=[
+    pytest.param(False, id="index", marks=requires_faiss),
+    pytest.param(True, id="clustered"),
+])
+def cache(request, clock):
+    return SemanticCache(threshold=0.9, ttl=60, clustered=request.param)
+
+
+def test_hit_and_miss(cache):
+    cache.store("ns", unit(1, 0, 0, 0), "refund")
+
+    assert cache.lookup("ns", unit(1, 0.1, 0, 0)) == "refund"
+    assert cache.lookup("ns", unit(0, 1, 0, 0)) is None
+    assert cache.lookup("other", unit(1, 0, 0, 0)) is None
+
+
+def test_entries_expire(cache, clock):
+    cache.store("ns", unit(1, 0, 0, 0), "refund")
+    clock.now += 61
+
+    assert cache.lookup("ns", unit(1, 0, 0, 0)) is None
+    assert "ns" not in cache._namespaces
+
+
+def test_least_recently_used_namespace_is_evicted(clock):
+    cache = SemanticCache(ttl=60, clustered=True, max_namespaces=2)
+    cache.store("a", unit(1, 0), "a")
+    cache.store("b", unit(1, 0), "b")
+    assert cache.lookup("a", unit(1, 0)) == "a"
+
+    cache.store("c", unit(1, 0), "c")
+
+    assert list(cache._namespaces) == ["a", "c"]
+    assert cache.lookup("b", unit(1, 0)) is None
+
+
+def test_expired_namespaces_are_reclaimed_before_eviction(clock):
+    cache = SemanticCache(ttl=60, clustered=True, max_namespaces=2)
+    cache.store("stale", unit(1, 0), "stale")
+    clock.now += 30
+    cache.store("fresh", unit(1, 0), "fresh")
+    clock.now += 31
+
+    cache.store("new", unit(1, 0), "new")
+
+    assert list(cache._namespaces) == ["fresh", "new"]
+
+
+def test_similar_questions_share_a_cluster(clock):
+    cache = SemanticCache(threshold=0.9, ttl=60, clustered=True, ema_decay=0.9)
+    first, similar = unit(1, 0, 0), unit(1, 0.3, 0)
+    cache.store("ns", first, "old answer")
+    cache.store("ns", similar, "new answer")
+
+    space = cache._namespaces["ns"]
+    assert len(space) == 1
+    expected = 0.9 * first + 0.1 * similar
+    np.testing.assert_allclose(space.centroids[0], expected / np.linalg.norm(expected), rtol=1e-6)
+    assert cache.lookup("ns", first) == "new answer"
+
+
+def test_cluster_count_is_bounded_by_least_recent_hit(clock):
+    cache = SemanticCache(threshold=0.9, ttl=60, clustered=True, max_entries=2)
+    cache.store("ns", unit(1, 0, 0), "x")
+    clock.now += 1
+    cache.store("ns", unit(0, 1, 0), "y")
+    clock.now += 1
+    assert cache.lookup("ns", unit(1, 0, 0)) == "x"
+    clock.now += 1
+
+    cache.store("ns", unit(0, 0, 1), "z")
+
+    assert len(cache._namespaces["ns"]) == 2
+    assert cache.lookup("ns", unit(0, 1, 0)) is None
+    assert cache.lookup("ns", unit(1, 0, 0)) == "x"
+    assert cache.lookup("ns", unit(0, 0, 1)) == "z"
+
+
+@requires_faiss
+def test_index_switches_to_ivfpq(clock):
+    faiss = semantic_cache.faiss
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((301, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    cache = SemanticCache(threshold=0.5, ttl=60, quantize_threshold=300, nlist=4, pq_m=2, nprobe=4)
+
+    async def run():
+        for i, vector in enumerate(vectors[:300]):
+            cache.store("ns", vector, i)
+        # 训练期间写入的条目也要进入量化索引
+        cache.store("ns", vectors[300], 300)
+        await asyncio.gather(*cache._tasks)
+
+    asyncio.run(run())
+
+    space = cache._namespaces["ns"]
+    assert isinstance(space.index, faiss.IndexIVFPQ)
+    assert space.index.ntotal == 301
+    assert cache.lookup("ns", vectors[300]) is not None
+
+
+def test_embed_batches_concurrent_texts(monkeypatch):
+    batches = []
+
+    class FakeModel:
+        def encode(self, texts, **kwargs):
+            batches.append(list(texts))
+            return np.stack([unit(len(text), 1) for text in texts])
+
+    async def load_model(*args):
+        return FakeModel()
+
+    monkeypatch.setattr(semantic_cache, "_load_model", load_model)
+    cache = SemanticCache(max_batch=8, max_wait_ms=5)
+
+    async def run():
+        embeddings = await asyncio.gather(*[cache.embed(text) for text in ("a", "bb", "a ")])
+        again = await cache.embed("A")
+        await cache.close()
+        return embeddings, again
+
+    embeddings, again = asyncio.run(run())
+    assert batches == [["a", "bb", "a "]]
+    np.testing.assert_allclose(embeddings[1], unit(2, 1))
+    np.testing.assert_allclose(again, embeddings[2])